@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+COMPILED TREE INFERENCE BENCHMARK
+=================================
+
+Times a horizon's tree members through their native predict and through
+CompiledTrees, the flattened node arrays the trainers store with every
+model artifact:
+
+1. Fit      - the horizon's tree roster (random_forest, gradient_boosting,
+              xgboost and, for 1M/6M, lightgbm) is trained through its Cloud
+              Function on synthetic factors, or taken from a local artifact
+2. Compile  - all tree members become one CompiledTrees, one output row each
+3. Time     - native predict of every member vs one compiled traversal, for
+              each batch size, with the largest difference between the two
+
+predict_batch uses the compiled trees up to COMPILED_TREES_MAX_ROWS rows;
+the table shows where that crossover sits for the horizon's roster.
+
+Usage:
+    python benchmark_tree_inference.py --horizon 6M
+    python benchmark_tree_inference.py --horizon 1W --rows 1 50 256 1000 5000
+    python benchmark_tree_inference.py --horizon 1M --artifact 1M_20250101_000000.pkl
+"""
+
+import os
+import sys
+import time
+import pickle
+import argparse
+import importlib.util
+from typing import Dict, List, Any
+import logging
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+TREE_MODELS = ['random_forest', 'gradient_boosting', 'xgboost', 'lightgbm']
+DEFAULT_ROWS = [1, 50, 256, 1000, 5000]
+
+
+def load_training_module(horizon: str):
+    path = os.path.join(REPO_ROOT, f"cloud_functions_{horizon.lower()}", 'main.py')
+    spec = importlib.util.spec_from_file_location(f"uptrendr_train_{horizon.lower()}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    # Deployed artifacts pickle CompiledTrees from the function's own module, 'main'
+    sys.modules.setdefault('main', module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_factors(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    factors = pd.DataFrame({name: rng.uniform(0, 1, rows) for name in ['fundamental', 'technical', 'sentiment', 'macro', 'esg']})
+    factors['volatility'] = rng.uniform(5, 60, rows)
+    return factors
+
+
+def fit_tree_members(module, horizon: str, samples: int) -> Dict[str, Any]:
+    """model_data-like dict with the horizon's tree roster fitted on synthetic factors"""
+    X = synthetic_factors(samples)
+    rng = np.random.default_rng(7)
+    y = pd.Series(0.04 * (X['technical'] - 0.5) + 0.02 * np.sin(6 * X['sentiment']) + rng.normal(0, 0.02, samples))
+    roster = [name for name in TREE_MODELS if name != 'lightgbm' or hasattr(module, 'lgb')]
+    result = module.ml_engine.train_models(X, y, horizon, model_names=roster)
+    return {'trained_models': result['trained_models'], 'scaler': result['scaler'],
+            'feature_selector': result['feature_selector'], 'horizon': horizon}
+
+
+def benchmark(module, model_data: Dict[str, Any], rows: List[int], repeats: int = 5) -> List[Dict[str, Any]]:
+    """Native vs compiled latency of all tree members for each batch size"""
+    members = [model for model in model_data['trained_models'].values() if isinstance(model, module.COMPILED_TREE_TYPES)]
+    started = time.perf_counter()
+    compiled = module.CompiledTrees(members)
+    logger.info(f"🔧 Compiled {len(members)} members, {len(compiled.roots)} trees, {len(compiled.feature):,} nodes "
+                f"in {time.perf_counter() - started:.2f}s")
+
+    X = synthetic_factors(max(rows), seed=0)
+    X_scaled = model_data['scaler'].transform(model_data['feature_selector'].transform(
+        module.ml_engine.engineer_features(X, model_data['horizon'])))
+
+    def timed(predict, batch):
+        best = float('inf')
+        for _ in range(repeats):
+            started = time.perf_counter()
+            predictions = predict(batch)
+            best = min(best, time.perf_counter() - started)
+        return predictions, best * 1000
+
+    results = []
+    for n in rows:
+        batch = X_scaled[:n]
+        native, native_ms = timed(lambda b: np.array([member.predict(b) for member in members]), batch)
+        flat, compiled_ms = timed(compiled.predict, batch)
+        results.append({'rows': n, 'native_ms': native_ms, 'compiled_ms': compiled_ms,
+                        'speedup': native_ms / compiled_ms, 'max_abs_diff': float(np.max(np.abs(native - flat)))})
+        logger.info(f"⚡ {n:>6} rows: native {native_ms:8.2f}ms  compiled {compiled_ms:8.2f}ms  "
+                    f"×{native_ms / compiled_ms:6.2f}  max |Δ| {results[-1]['max_abs_diff']:.1e}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compiled tree inference against native predict")
+    parser.add_argument('--horizon', choices=['1W', '1M', '6M'], default='6M')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Batch sizes to time")
+    parser.add_argument('--samples', type=int, default=3000, help="Synthetic training rows")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--artifact', help="Local model_data pickle saved by save_model_to_gcs instead of a synthetic fit")
+    args = parser.parse_args()
+
+    module = load_training_module(args.horizon)
+    if args.artifact:
+        with open(args.artifact, 'rb') as f:
+            model_data = pickle.load(f)
+    else:
+        model_data = fit_tree_members(module, args.horizon, args.samples)
+    benchmark(module, model_data, args.rows, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,7 @@ def main():
         # Import Firebase modules
         from google.cloud import firestore
         from firebase_admin import initialize_app, credentials
+        from collection_inventory import CollectionInventory, print_report, format_bytes
         
         print("✅ Firebase modules imported successfully")
         
@@ -44,49 +45,21 @@ def main():
         db = firestore.Client()
         print("✅ Firestore client created")
         
-        # List all collections
+        # Inventory all collections: exact counts, freshness and size in one concurrent pass
         print("\n📊 CHECKING FIRESTORE COLLECTIONS")
         print("-" * 40)
         
-        collections = db.collections()
-        collection_list = []
-        
-        for collection in collections:
-            collection_name = collection.id
-            collection_list.append(collection_name)
-            
-            # Count documents in each collection
-            try:
-                docs = list(collection.limit(10).stream())
-                doc_count = len(docs)
-                
-                if doc_count > 0:
-                    # Get first document to show sample data
-                    first_doc = docs[0]
-                    sample_data = first_doc.to_dict()
-                    
-                    print(f"📁 {collection_name}")
-                    print(f"   📄 Documents: {doc_count}+ (showing first 10)")
-                    print(f"   🔑 Sample keys: {list(sample_data.keys())[:5]}")
-                    
-                    # Show timestamp if available
-                    if 'timestamp' in sample_data:
-                        print(f"   ⏰ Latest: {sample_data['timestamp']}")
-                    elif 'updated' in sample_data:
-                        print(f"   ⏰ Latest: {sample_data['updated']}")
-                    
-                    print()
-                else:
-                    print(f"📁 {collection_name} (EMPTY)")
-                    
-            except Exception as e:
-                print(f"📁 {collection_name} (ERROR: {e})")
+        inventory = CollectionInventory(db).run()
+        print_report(inventory)
+        collection_list = list(inventory['collections'])
         
         # Summary
         print("=" * 50)
         print("📋 SUMMARY")
         print("=" * 50)
         print(f"📊 Total Collections: {len(collection_list)}")
+        print(f"📄 Total Documents: {inventory['total_documents']:,}")
+        print(f"💾 Estimated Storage: {format_bytes(inventory['total_estimated_bytes'])}")
         
         if collection_list:
             print("📁 Collections found:")
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+TRAINING NUMERICS SELF-CHECK
+============================
+
+Asserts the shortcuts the 1W / 1M / 6M trainers take against the reference
+computation they replace, on small synthetic data and without Firestore or
+GCS:
+
+1. Solvers   - Ridge, Lasso, ElasticNet and (1M/6M) BayesianRidge solved
+               from sufficient statistics match the sklearn estimators' fits
+2. Linear CV - train_linear_family's per-fold Gram scores match
+               cross_validate refitting every fold through sklearn
+3. Selection - per-fold masks and full-data scores built from cached column
+               moments match SelectKBest(f_regression) on the same rows
+4. Coverage  - dispersion-scaled conformal intervals cover INTERVAL_COVERAGE
+               of the calibration rows and of fresh rows from the same process
+5. Quantiles - P(up) read off predicted quantiles matches the normal CDF, and
+               the conformalized booster interval covers its out-of-fold rows
+6. Compiled  - CompiledTrees for every tree member and the ensemble matches
+               native predict, below and above COMPILED_TREES_MAX_ROWS
+7. Skips     - the input fingerprint skips a run only when the probe or the
+               row content is unchanged, whatever order the rows stream in,
+               and a category is republished only when what clients render changed
+
+Each horizon's Cloud Function is loaded on its own, since the trainers are
+deployed as separate copies of the same code.
+
+Usage:
+    python check_training_numerics.py
+    python check_training_numerics.py --horizons 1W 6M
+"""
+
+import os
+import sys
+import argparse
+import importlib.util
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import VotingRegressor
+from sklearn.feature_selection import SelectKBest, f_regression
+from sklearn.preprocessing import StandardScaler
+from scipy.stats import norm
+from sklearn.linear_model import Ridge, Lasso, ElasticNet, BayesianRidge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+HORIZONS = ['1W', '1M', '6M']
+
+# name -> (sklearn reference, max |coefficient difference|)
+SOLVER_CASES = {
+    'ridge': (Ridge(alpha=1.0), 1e-10),
+    'lasso': (Lasso(alpha=0.01), 1e-4),
+    'elastic_net': (ElasticNet(alpha=0.01, l1_ratio=0.5), 1e-4),
+    'bayesian_ridge': (BayesianRidge(), 1e-4)
+}
+# Evidence maximisation stops at the same 1e-3 coefficient tolerance as sklearn's, not at one optimum
+COMPILED_TOLERANCE = 1e-6  # xgboost sums leaves in float32, the compiled trees in float64
+LINEAR_CV_TOLERANCE = {'ridge': 1e-7, 'lasso': 1e-4, 'elastic_net': 1e-4, 'bayesian_ridge': 1e-3}
+
+
+def load_training_module(horizon: str):
+    path = os.path.join(REPO_ROOT, f"cloud_functions_{horizon.lower()}", 'main.py')
+    spec = importlib.util.spec_from_file_location(f"uptrendr_train_{horizon.lower()}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_factors(rows: int, seed: int = 42):
+    """Core factor frame and a return that depends on a few of its columns"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({name: rng.uniform(0, 1, rows) for name in ['fundamental', 'technical', 'sentiment', 'macro', 'esg']})
+    X['volatility'] = rng.uniform(5, 60, rows)
+    y = 0.04 * (X['technical'] - 0.5) + 0.02 * (X['sentiment'] - 0.5) - 0.0004 * X['volatility'] + rng.normal(0, 0.01, rows)
+    return X, y.to_numpy()
+
+
+def check_solvers(module) -> None:
+    """Coefficients solved from _sufficient_statistics against the sklearn fit on the same rows"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 8))
+    y = X @ rng.normal(size=8) + rng.normal(0, 0.5, 400)
+    stats = module._sufficient_statistics(X, y)
+    for name in module.SUFFICIENT_STAT_MODELS:
+        reference, tolerance = SOLVER_CASES[name]
+        expected = clone(reference).fit(X, y)
+        solved = clone(reference)
+        module.ml_engine._fit_from_statistics(name, solved, stats)
+        diff = max(np.max(np.abs(solved.coef_ - expected.coef_)), abs(solved.intercept_ - expected.intercept_))
+        assert diff <= tolerance, f"{name} solved from statistics differs from sklearn by {diff:.2e}"
+        logger.info(f"  ✅ {name:<15} max |Δcoef| {diff:.1e}")
+
+
+def check_linear_cv(module, horizon: str) -> None:
+    """Per-fold Gram CV scores against refitting each fold's selected, standardized rows"""
+    X, y = synthetic_factors(600)
+    selection = module.ml_engine.select_features(module.ml_engine.engineer_features(X, horizon), y, k=8, cv=5)
+    models = {name: clone(SOLVER_CASES[name][0]) for name in module.SUFFICIENT_STAT_MODELS}
+    family = module.ml_engine.train_linear_family(models, selection, y)
+    for name, model in models.items():
+        expected = module.ml_engine.cross_validate(clone(model), selection, y)
+        diff = float(np.max(np.abs(family['cv_scores'][name] - expected)))
+        assert diff <= LINEAR_CV_TOLERANCE[name], f"{name} Gram CV R² differs from refitted folds by {diff:.2e}"
+        logger.info(f"  ✅ {name:<15} max |ΔR²| {diff:.1e}")
+
+
+def check_fold_selection(module, horizon: str, k: int = 8) -> None:
+    """Moment-based f_regression selection against SelectKBest refitted on every fold's training rows"""
+    X, y = synthetic_factors(600)
+    X_engineered = module.ml_engine.engineer_features(X, horizon)
+    # Scored twice so the second pass is served from the moment cache
+    for _ in range(2):
+        selection = module.ml_engine.select_features(X_engineered, y, k=k, cv=5)
+        X_values = selection['X_values']
+        for i, ((train, _), mask) in enumerate(zip(selection['folds'], selection['fold_masks'])):
+            expected = SelectKBest(f_regression, k=k).fit(X_values[train], y[train]).get_support()
+            assert np.array_equal(mask, expected), f"fold {i} selected {np.flatnonzero(mask)}, expected {np.flatnonzero(expected)}"
+        expected_scores, _ = f_regression(X_values, y)
+        assert np.allclose(selection['selector'].scores_, expected_scores, rtol=1e-8, atol=1e-8), \
+            "full-data selection scores differ from f_regression"
+    logger.info(f"  ✅ {len(selection['folds'])} fold masks and full-data scores match SelectKBest")
+
+
+def _dispersed_predictions(rng, rows: int):
+    """Returns whose noise grows with the spread of three member predictions"""
+    signal = rng.normal(0, 0.02, rows)
+    spread = rng.uniform(0.002, 0.03, rows)
+    member_oof = signal + spread * rng.normal(size=(3, rows))
+    return signal + spread * rng.normal(size=rows), member_oof
+
+
+def check_conformal_coverage(module, tolerance: float = 0.01) -> None:
+    """Interval half-widths from _conformal_calibration, applied as predict_batch applies them"""
+    rng = np.random.default_rng(3)
+    y, member_oof = _dispersed_predictions(rng, 2000)
+    calibration = module._conformal_calibration(y, member_oof, member_oof.mean(axis=0))
+
+    def coverage(y, member_oof) -> float:
+        half_width = calibration['interval_quantile'] * (member_oof.std(axis=0) + calibration['dispersion_floor'])
+        return float(np.mean(np.abs(y - member_oof.mean(axis=0)) <= half_width))
+
+    calibrated = coverage(y, member_oof)
+    fresh = coverage(*_dispersed_predictions(rng, 50000))
+    assert calibrated >= module.INTERVAL_COVERAGE, f"calibration rows covered {calibrated:.3f} < {module.INTERVAL_COVERAGE}"
+    assert fresh >= module.INTERVAL_COVERAGE - tolerance, f"fresh rows covered {fresh:.3f} < {module.INTERVAL_COVERAGE}"
+    logger.info(f"  ✅ coverage {calibrated:.3f} on calibration rows, {fresh:.3f} on fresh rows "
+                f"(target {module.INTERVAL_COVERAGE})")
+
+
+def check_quantile_booster(module, horizon: str) -> None:
+    """P(up) interpolation on exact normal quantiles, then the CQR margin on a fitted booster"""
+    levels = module.QUANTILE_LEVELS
+    means = np.linspace(-0.8, 0.8, 33)
+    quantiles = means[:, None] + norm.ppf(levels)[None, :]
+    prob_up = 1 - module._quantile_cdf_at_zero(quantiles, levels)
+    diff = float(np.max(np.abs(prob_up - norm.cdf(means))))
+    assert diff <= 0.03, f"P(up) from quantiles differs from the normal CDF by {diff:.3f}"
+
+    X, y = synthetic_factors(600)
+    selection = module.ml_engine.select_features(module.ml_engine.engineer_features(X, horizon), y, k=8, cv=5)
+    X_scaled = StandardScaler().fit_transform(selection['X_values'][:, selection['selector'].get_support()])
+    metrics = module.ml_engine.train_quantile_model(selection, X_scaled, y)['cv_metrics']
+    assert metrics['interval_coverage'] >= module.INTERVAL_COVERAGE, \
+        f"conformalized booster covered {metrics['interval_coverage']:.3f} of out-of-fold rows"
+    logger.info(f"  ✅ P(up) within {diff:.3f} of the normal CDF, booster coverage {metrics['interval_coverage']:.3f}")
+
+
+def check_compiled_trees(module, horizon: str) -> None:
+    """compile_tree_models output against each member's native predict"""
+    X, y = synthetic_factors(2000)
+    X_scaled = StandardScaler().fit_transform(module.ml_engine.engineer_features(X, horizon))
+    members = {
+        'random_forest': module.RandomForestRegressor(n_estimators=30, max_depth=8, random_state=42),
+        'gradient_boosting': module.GradientBoostingRegressor(n_estimators=50, max_depth=4, random_state=42),
+        'xgboost': module.xgb.XGBRegressor(n_estimators=50, max_depth=5, random_state=42)
+    }
+    if hasattr(module, 'lgb'):
+        members['lightgbm'] = module.lgb.LGBMRegressor(n_estimators=50, max_depth=5, random_state=42, verbose=-1)
+    trained_models = {name: model.fit(X_scaled, y) for name, model in members.items()}
+    trained_models['ensemble'] = VotingRegressor(list(members.items())).fit(X_scaled, y)
+
+    compiled = module.compile_tree_models(trained_models)
+    assert set(compiled) == set(trained_models), f"only {sorted(compiled)} were compiled"
+    batch_rows = [1, 50, module.COMPILED_TREES_MAX_ROWS, len(X_scaled)]
+    for name, model in trained_models.items():
+        estimators = model.estimators_ if name == 'ensemble' else [model]
+        diff = max(float(np.max(np.abs(compiled[name].predict(X_scaled[:rows])
+                                       - np.array([estimator.predict(X_scaled[:rows]) for estimator in estimators]))))
+                   for rows in batch_rows)
+        assert diff <= COMPILED_TOLERANCE, f"compiled {name} differs from native predict by {diff:.2e}"
+        logger.info(f"  ✅ {name:<17} max |Δ| {diff:.1e} over batches of {batch_rows}")
+
+
+def check_input_fingerprint(module) -> None:
+    """factor_content_hash and fingerprint_matches as train_*_models combines them"""
+    X, y = synthetic_factors(200)
+    rows = X.assign(symbol=[f"SYN{i % 20:04d}" for i in range(len(X))], actual_return=y,
+                    timestamp=pd.Timestamp('2026-01-01', tz='UTC') + pd.to_timedelta(np.arange(len(X)) // 20, unit='D'))
+    feature_cols = list(X.columns)
+    content_hash = module.factor_content_hash(rows, feature_cols)
+    assert module.factor_content_hash(rows.sample(frac=1, random_state=1), feature_cols) == content_hash, \
+        "content hash depends on the order rows were streamed in"
+    corrected = rows.copy()
+    corrected.loc[17, 'sentiment'] += 1e-9
+    assert module.factor_content_hash(corrected, feature_cols) != content_hash, "content hash missed an in-place correction"
+
+    config = {'shard_by': 'pooled', 'selection_scorer': 'f_regression', 'quantiles': False, 'models': None}
+    probe = {'scope': '1M', 'row_count': len(rows), 'max_timestamp': rows['timestamp'].max(),
+             'max_updated_at': pd.Timestamp('2026-01-11', tz='UTC'), 'config': config}
+    previous = {**probe, 'content_hash': content_hash}
+    matches = module.fingerprint_matches
+    assert matches(previous, probe, module.INPUT_PROBE_KEYS), "identical probe did not skip"
+    assert not matches(previous, {**probe, 'max_updated_at': pd.Timestamp('2026-01-12', tz='UTC')},
+                       module.INPUT_PROBE_KEYS), "a rewrite (newer updated_at) skipped on the probe"
+    assert not matches(previous, {**probe, 'config': {**config, 'quantiles': True}}, module.INPUT_PROBE_KEYS), \
+        "changed training options skipped on the probe"
+    assert not matches({key: value for key, value in previous.items() if key != 'max_updated_at'}, probe,
+                       module.INPUT_PROBE_KEYS), "a fingerprint missing a probe key skipped"
+    assert not matches({}, probe, module.INPUT_PROBE_KEYS), "a model without a fingerprint skipped"
+    assert matches(previous, {**probe, 'row_count': len(rows) + 1, 'content_hash': content_hash}, module.CONTENT_KEYS), \
+        "identical content did not skip once the probe moved"
+    logger.info("  ✅ content hash is order-free and sees corrections; probe and content keys skip only unchanged inputs")
+
+
+def check_prediction_manifest(module) -> None:
+    """prediction_content_hash, which decides whether run_batch_predictions rewrites a category"""
+    data_through = pd.Timestamp('2026-01-10', tz='UTC').to_pydatetime()
+    doc = {
+        'status': 'success', 'category': 'us_stocks', 'horizon': '1M',
+        'overview': {'average_score': 61.2, 'trend': '▲', 'total_assets': 1, 'bullish_count': 1, 'bearish_count': 0},
+        'predictions': {'AAPL': {'score': 61.2, 'trend': '▲', 'return': 0.012, 'confidence': 0.71, 'prob_up': 0.66}},
+        'metadata': {'timestamp': data_through, 'data_source': 'uptrendr_ml_batch', 'data_through': data_through}
+    }
+    content_hash = module.prediction_content_hash(doc)
+    republished = {**doc, 'metadata': {**doc['metadata'], 'timestamp': pd.Timestamp('2026-01-11', tz='UTC').to_pydatetime()}}
+    assert module.prediction_content_hash(republished) == content_hash, "publish timestamp changed the content hash"
+    moved = {**doc, 'predictions': {'AAPL': {**doc['predictions']['AAPL'], 'prob_up': 0.67}}}
+    assert module.prediction_content_hash(moved) != content_hash, "a changed prediction kept the content hash"
+    later = {**doc, 'metadata': {**doc['metadata'], 'data_through': pd.Timestamp('2026-01-11', tz='UTC').to_pydatetime()}}
+    assert module.prediction_content_hash(later) != content_hash, "newer data_through kept the content hash"
+    logger.info("  ✅ category content hash ignores the publish time and sees predictions and data_through")
+
+
+def run_checks(horizon: str) -> None:
+    module = load_training_module(horizon)
+    logger.info(f"🧪 {horizon}: solvers from sufficient statistics")
+    check_solvers(module)
+    logger.info(f"🧪 {horizon}: linear family CV")
+    check_linear_cv(module, horizon)
+    logger.info(f"🧪 {horizon}: per-fold feature selection")
+    check_fold_selection(module, horizon)
+    logger.info(f"🧪 {horizon}: conformal interval coverage")
+    check_conformal_coverage(module)
+    logger.info(f"🧪 {horizon}: quantile booster")
+    check_quantile_booster(module, horizon)
+    logger.info(f"🧪 {horizon}: compiled tree inference")
+    check_compiled_trees(module, horizon)
+    logger.info(f"🧪 {horizon}: input fingerprint skips")
+    check_input_fingerprint(module)
+    check_prediction_manifest(module)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the trainers' numerical shortcuts against their references")
+    parser.add_argument('--horizons', nargs='+', choices=HORIZONS, default=HORIZONS)
+    args = parser.parse_args()
+
+    for horizon in args.horizons:
+        run_checks(horizon)
+    logger.info(f"✅ Training numerics match their references for {', '.join(args.horizons)}")
+
+
+if __name__ == "__main__":
+    main()
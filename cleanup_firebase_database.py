@@ -28,6 +28,7 @@ def main():
         # Import Firebase modules
         from google.cloud import firestore
         from firebase_admin import initialize_app, credentials
+        from firestore_bulk_delete import BulkDeleter
         
         print("✅ Firebase modules imported")
         
@@ -78,40 +79,8 @@ def main():
         print(f"\n🗑️  DELETING {len(collections_to_delete)} COLLECTIONS")
         print("-" * 50)
         
-        for collection_name in collections_to_delete:
-            try:
-                print(f"🗑️  Deleting collection: {collection_name}")
-                
-                # Get all documents in the collection
-                collection_ref = db.collection(collection_name)
-                docs = collection_ref.stream()
-                
-                # Delete all documents in batches
-                batch = db.batch()
-                batch_count = 0
-                deleted_docs = 0
-                
-                for doc in docs:
-                    batch.delete(doc.reference)
-                    batch_count += 1
-                    deleted_docs += 1
-                    
-                    # Commit batch when it reaches 450 (Firebase limit is 500)
-                    if batch_count >= 450:
-                        batch.commit()
-                        print(f"   📄 Deleted {batch_count} documents...")
-                        batch = db.batch()
-                        batch_count = 0
-                
-                # Commit remaining documents
-                if batch_count > 0:
-                    batch.commit()
-                    print(f"   📄 Deleted {batch_count} documents...")
-                
-                print(f"   ✅ Deleted collection '{collection_name}' ({deleted_docs} documents)")
-                
-            except Exception as e:
-                print(f"   ❌ Error deleting {collection_name}: {e}")
+        # Keys-only, partitioned and concurrent; subcollections go with their parents
+        BulkDeleter(db).delete_collections(collections_to_delete)
         
         print(f"\n🧹 CLEANUP COMPLETE")
         print("=" * 50)
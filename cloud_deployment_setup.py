@@ -18,71 +18,117 @@ import json
 from datetime import datetime, timezone
 
 # Cloud Functions deployment configuration
+# "schedule" functions get a Cloud Scheduler job; "pipeline" functions are
+# invoked by run_pipeline as soon as their upstream stages complete
 CLOUD_FUNCTIONS_CONFIG = {
     "functions": [
         {
-            "name": "train_ml_models_daily",
-            "schedule": "0 2 * * *",  # 2:00 AM UTC daily
-            "description": "Train sophisticated ML models using historical factors",
-            "memory": "2GB",
-            "timeout": "540s",
+            "name": "run_pipeline",
+            "schedule": "0 1 * * *",  # 1:00 AM UTC daily, the only nightly pipeline trigger
+            "description": "Run the nightly pipeline DAG, starting each stage when its dependencies complete",
+            "memory": "512MB",
+            "timeout": "3600s",  # Above the 540s cap of 1st gen HTTP functions
+            "generation": 2,
             "trigger": "schedule"
         },
         {
-            "name": "fetch_market_data_daily", 
-            "schedule": "0 1 * * *",  # 1:00 AM UTC daily
+            "name": "fetch_market_data_daily",
             "description": "Fetch comprehensive market data from multiple sources",
-            "memory": "1GB", 
+            "memory": "1GB",
             "timeout": "300s",
-            "trigger": "schedule"
+            "trigger": "pipeline"
         },
         {
             "name": "fetch_sentiment_data_daily",
-            "schedule": "15 1 * * *",  # 1:15 AM UTC daily
             "description": "Analyze news sentiment for market prediction",
             "memory": "1GB",
-            "timeout": "300s", 
-            "trigger": "schedule"
+            "timeout": "300s",
+            "trigger": "pipeline"
         },
         {
             "name": "fetch_macro_data_daily",
-            "schedule": "30 1 * * *",  # 1:30 AM UTC daily
             "description": "Fetch macroeconomic indicators and analysis",
             "memory": "512MB",
             "timeout": "180s",
-            "trigger": "schedule"
+            "trigger": "pipeline"
         },
         {
             "name": "fetch_esg_data_daily",
-            "schedule": "45 1 * * *",  # 1:45 AM UTC daily  
             "description": "Fetch ESG scores for sustainable investing",
             "memory": "512MB",
             "timeout": "180s",
-            "trigger": "schedule"
+            "trigger": "pipeline"
         },
         {
             "name": "create_historical_factors_daily",
-            "schedule": "30 0 * * *",  # 12:30 AM UTC daily
             "description": "Create consolidated ML training data",
             "memory": "1GB",
             "timeout": "300s",
-            "trigger": "schedule"
+            "trigger": "pipeline"
         },
         {
             "name": "fetch_japanese_data_daily",
             "schedule": "0 7 * * *",  # 7:00 AM UTC daily
             "description": "Fetch Japanese market data and news",
-            "memory": "512MB", 
+            "memory": "512MB",
             "timeout": "240s",
             "trigger": "schedule"
         },
         {
-            "name": "generate_market_predictions_daily",
-            "schedule": "30 2 * * *",  # 2:30 AM UTC daily (after ML training)
-            "description": "Generate market predictions using trained models",
+            "name": "train_1w_models",
+            "description": "Train 1W horizon ML models using historical factors",
+            "memory": "2GB",
+            "timeout": "540s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "train_1m_models",
+            "description": "Train 1M horizon ML models using historical factors",
+            "memory": "2GB",
+            "timeout": "540s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "train_6m_models",
+            "description": "Train 6M horizon ML models using historical factors",
+            "memory": "2GB",
+            "timeout": "540s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "predict_1w_models",
+            "description": "Generate 1W market predictions using trained models",
             "memory": "1GB",
-            "timeout": "300s", 
-            "trigger": "schedule"
+            "timeout": "300s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "predict_1m_models",
+            "description": "Generate 1M market predictions using trained models",
+            "memory": "1GB",
+            "timeout": "300s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "predict_6m_models",
+            "description": "Generate 6M market predictions using trained models",
+            "memory": "1GB",
+            "timeout": "300s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "materialize_app_snapshots",
+            "description": "Build denormalized app snapshots and per-user picks digests from predictions",
+            "memory": "512MB",
+            "timeout": "300s",
+            "trigger": "pipeline"
+        },
+        {
+            "name": "apply_retention_policies",
+            "description": "Roll up raw time-series older than each hot window and expire the raw rows",
+            "memory": "1GB",
+            "timeout": "540s",
+            "trigger": "pipeline"
         }
     ]
 }
@@ -107,8 +153,16 @@ FIRESTORE_COLLECTIONS = {
         "ml_training_status",
         "forecast_weights"
     ],
+    "rollup_collections": [
+        "market_data_rollups",
+        "technical_analysis_rollups",
+        "fundamental_analysis_rollups",
+        "sentiment_analysis_rollups",
+        "historical_factors_rollups"
+    ],
     "app_collections": [
         "calendar",
+        "app_snapshots",
         "users",
         "config",
         "pipeline_executions",
@@ -170,6 +224,8 @@ def create_deployment_files():
     }
     
     for func in CLOUD_FUNCTIONS_CONFIG["functions"]:
+        if func["trigger"] != "schedule":
+            continue
         job = {
             "name": f"scheduler-{func['name'].replace('_', '-')}",
             "description": func["description"],
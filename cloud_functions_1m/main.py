@@ -3,6 +3,13 @@ Complete 1M Model Training Function - Balanced Approach
 Goldman Sachs-level medium-term trend analysis
 """
 
+import os
+import re
+import json
+import time
+import hashlib
+import resource
+import multiprocessing
 import logging
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Any, Optional
@@ -11,6 +18,7 @@ import numpy as np
 from google.cloud import firestore, storage
 import pickle
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 import functions_framework
 
 # ML libraries (balanced for 1M)
@@ -19,7 +27,9 @@ from sklearn.neural_network import MLPRegressor
 from sklearn.linear_model import Ridge, Lasso, ElasticNet, BayesianRidge
 from sklearn.feature_selection import SelectKBest, f_regression
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import cross_val_score
+from sklearn.model_selection import KFold
+from sklearn.base import clone
+from scipy.stats import f as f_distribution
 from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error, explained_variance_score
 import xgboost as xgb
 import lightgbm as lgb
@@ -36,12 +46,498 @@ except Exception as e:
     logger.error(f"❌ Failed to initialize Firestore: {e}")
     db = None
 
+# Incremental training: linear members are refit exactly from accumulated
+# sufficient statistics, boosted members continue with extra trees on new rows
+SUFFICIENT_STAT_MODELS = ('ridge', 'lasso', 'elastic_net', 'bayesian_ridge')
+BOOSTED_MODELS = ('xgboost', 'lightgbm')
+INCREMENTAL_TREES = 20
+FEATURE_DRIFT_THRESHOLD = 0.75  # Max standardized mean shift of any selected feature
+ERROR_DRIFT_THRESHOLD = 2.0     # New-data MSE relative to training MSE
+
+# Regularisation paths evaluated from the shared per-fold Gram matrices
+ALPHA_PATHS = {
+    'ridge': np.logspace(-3, 3, 13),
+    'lasso': np.logspace(-4, 0, 9),
+    'elastic_net': np.logspace(-4, 0, 9)
+}
+
+# Sharded training: one roster per asset class or per symbol, fitted in a process pool
+SHARD_MODES = ('pooled', 'asset_class', 'symbol')
+MIN_SHARD_SAMPLES = 20
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', os.cpu_count() or 1))
+
+# Low-memory training: float32 matrices, in-place transforms and chunked scaling
+LOW_MEMORY_TRAINING = os.environ.get('LOW_MEMORY_TRAINING', '').lower() in ('1', 'true')
+SCALING_CHUNK_ROWS = 65536
+
+# Prediction intervals: split-conformal on out-of-fold residuals, scaled by member dispersion
+INTERVAL_COVERAGE = 0.8
+CONFORMAL_GRID = np.linspace(0, 1, 201)
+RISK_LEVELS = np.array(['low', 'moderate', 'high'])
+TREND_DEADBAND = 0.1           # |prediction| / target std below which the trend is flat
+PREDICTION_LOOKBACK_DAYS = 14
+FACTOR_NAMES = ['fundamental', 'technical', 'sentiment', 'macro', 'esg']
+PREDICTION_CATEGORIES = {
+    'index': 'global_indices',
+    'fx': 'fx_pairs',
+    'us_equity': 'us_sectors',
+    'jp_equity': 'japanese_sectors'
+}
+
+# Multi-quantile booster: one xgboost fit yields the median, interval bounds and P(up)
+QUANTILE_LEVELS = np.array([0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95])
+QUANTILE_INTERVAL = (0.1, 0.9)  # Bounds conformalized to INTERVAL_COVERAGE
+
+# Compiled tree inference: fitted tree members flattened into node arrays and scored level by level
+# for the whole batch. Up to COMPILED_TREES_MAX_ROWS rows this skips native predict's per-tree and
+# per-call overhead; larger batches amortize that overhead and stay on the native predictors
+COMPILED_TREES_MAX_ROWS = 256
+COMPILED_CHUNK_ROWS = 1024
+COMPILED_TREE_TYPES = (RandomForestRegressor, GradientBoostingRegressor, xgb.XGBRegressor, lgb.LGBMRegressor)
+XGBOOST_IDENTITY_OBJECTIVES = ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror', 'reg:quantileerror')
+LIGHTGBM_IDENTITY_OBJECTIVES = ('regression', 'regression_l1', 'huber', 'fair', 'quantile')
+
+# Change-data triggers: a run skips itself when its input fingerprint matches the last one
+INPUT_PROBE_KEYS = ('scope', 'row_count', 'max_timestamp', 'max_updated_at', 'config')  # Checked before any factor row is read
+CONTENT_KEYS = ('content_hash', 'config')                              # Checked once the rows are loaded
+
+def _sufficient_statistics(X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+    """Moments needed to refit least-squares models without the raw rows"""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return {
+        'n': int(X.shape[0]),
+        'sum_x': X.sum(axis=0),
+        'sum_y': float(y.sum()),
+        'xtx': X.T @ X,
+        'xty': X.T @ y,
+        'yty': float(y @ y)
+    }
+
+def _merge_statistics(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: a[key] + b[key] for key in a}
+
+def _subtract_statistics(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: a[key] - b[key] for key in a}
+
+def _centered_gram(stats: Dict[str, Any]):
+    """Centered XᵀX, Xᵀy and yᵀy so intercepts can be recovered after solving"""
+    n = stats['n']
+    x_mean = stats['sum_x'] / n
+    y_mean = stats['sum_y'] / n
+    gram = stats['xtx'] - n * np.outer(x_mean, x_mean)
+    xty = stats['xty'] - n * x_mean * y_mean
+    yty = stats['yty'] - n * y_mean ** 2
+    return gram, xty, yty, x_mean, y_mean
+
+def _solve_ridge(stats: Dict[str, Any], alpha: float):
+    gram, xty, _, x_mean, y_mean = _centered_gram(stats)
+    coef = np.linalg.solve(gram + alpha * np.eye(len(xty)), xty)
+    return coef, float(y_mean - x_mean @ coef)
+
+def _ridge_path(stats: Dict[str, Any], alphas):
+    """Ridge solutions for every alpha from a single eigendecomposition"""
+    gram, xty, _, x_mean, y_mean = _centered_gram(stats)
+    eigen_vals, eigen_vecs = np.linalg.eigh(gram)
+    projected = eigen_vecs.T @ xty
+    for alpha in alphas:
+        coef = eigen_vecs @ (projected / (eigen_vals + alpha))
+        yield float(alpha), coef, float(y_mean - x_mean @ coef)
+
+def _solve_elastic_net(stats: Dict[str, Any], alpha: float, l1_ratio: float,
+                       coef_init: Optional[np.ndarray] = None, max_iter: int = 1000, tol: float = 1e-4):
+    """Coordinate descent on the Gram matrix (sklearn ElasticNet objective, Lasso when l1_ratio=1)"""
+    gram, xty, _, x_mean, y_mean = _centered_gram(stats)
+    n = stats['n']
+    l1_penalty = n * alpha * l1_ratio
+    l2_penalty = n * alpha * (1 - l1_ratio)
+    coef = np.zeros(len(xty)) if coef_init is None else np.array(coef_init, dtype=np.float64)
+
+    for _ in range(max_iter):
+        max_step = 0.0
+        for j in range(len(coef)):
+            if gram[j, j] == 0:
+                continue
+            rho = xty[j] - gram[j] @ coef + gram[j, j] * coef[j]
+            new_value = np.sign(rho) * max(abs(rho) - l1_penalty, 0.0) / (gram[j, j] + l2_penalty)
+            max_step = max(max_step, abs(new_value - coef[j]))
+            coef[j] = new_value
+        if max_step < tol * max(np.max(np.abs(coef)), 1e-12):
+            break
+
+    return coef, float(y_mean - x_mean @ coef)
+
+def _elastic_net_path(stats: Dict[str, Any], alphas, l1_ratio: float):
+    """Elastic net solutions along a decreasing alpha path, warm-starting each solve"""
+    coef = None
+    for alpha in sorted(alphas, reverse=True):
+        coef, intercept = _solve_elastic_net(stats, alpha, l1_ratio, coef)
+        yield float(alpha), coef, intercept
+
+def _solve_bayesian_ridge(stats: Dict[str, Any], max_iter: int = 300, tol: float = 1e-3):
+    """Evidence maximisation as in sklearn's BayesianRidge, from the Gram eigendecomposition"""
+    gram, xty, yty, x_mean, y_mean = _centered_gram(stats)
+    n = stats['n']
+    eigen_vals, eigen_vecs = np.linalg.eigh(gram)
+    eigen_vals = np.clip(eigen_vals, 0, None)
+    alpha_ = 1.0 / (yty / n + np.finfo(np.float64).eps)
+    lambda_ = 1.0
+    coef = np.zeros(len(xty))
+
+    for _ in range(max_iter):
+        coef_old = coef
+        coef = eigen_vecs @ ((eigen_vecs.T @ xty) / (eigen_vals + lambda_ / alpha_))
+        rmse = max(yty - 2 * coef @ xty + coef @ gram @ coef, 0.0)
+        gamma = np.sum((alpha_ * eigen_vals) / (lambda_ + alpha_ * eigen_vals))
+        lambda_ = (gamma + 2e-6) / (np.sum(coef ** 2) + 2e-6)
+        alpha_ = (n - gamma + 2e-6) / (rmse + 2e-6)
+        if np.sum(np.abs(coef_old - coef)) < tol:
+            break
+
+    sigma = eigen_vecs @ np.diag(1.0 / (alpha_ * eigen_vals + lambda_)) @ eigen_vecs.T
+    return coef, float(y_mean - x_mean @ coef), float(alpha_), float(lambda_), sigma
+
+# Feature selection scores are computed per CV fold from cached column moments
+SELECTION_SCORERS = ('f_regression', 'mutual_info', 'stability')
+MI_BINS = 16
+STABILITY_TIME_BUDGET = 2.0  # Seconds per selection call, split across folds
+STABILITY_MIN_ROUNDS = 10
+STABILITY_MAX_ROUNDS = 200
+
+def _standardize_statistics(stats: Dict[str, Any], mask: np.ndarray):
+    """Statistics of the selected columns after StandardScaler, derived without the rows"""
+    gram, xty, _, x_mean, _ = _centered_gram(stats)
+    n = stats['n']
+    scale = np.sqrt(np.clip(np.diag(gram)[mask], 0, None) / n)
+    scale[scale == 0] = 1.0
+    scaled = {
+        'n': n,
+        'sum_x': np.zeros(int(mask.sum())),
+        'sum_y': stats['sum_y'],
+        'xtx': gram[np.ix_(mask, mask)] / np.outer(scale, scale),
+        'xty': xty[mask] / scale,
+        'yty': stats['yty']
+    }
+    return scaled, x_mean[mask], scale
+
+def _top_k_mask(scores: np.ndarray, k: int) -> np.ndarray:
+    """Same tie-breaking as SelectKBest"""
+    scores = np.nan_to_num(scores, nan=0.0)
+    mask = np.zeros(len(scores), dtype=bool)
+    mask[np.argsort(scores, kind='mergesort')[-k:]] = True
+    return mask
+
+def _f_scores(moments: np.ndarray, y_moments: np.ndarray) -> np.ndarray:
+    """Univariate F statistics (as f_regression) from per-column n, Σx, Σx², Σxy and Σy, Σy²"""
+    n, sum_x, sum_xx, sum_xy = moments.T
+    _, sum_y, sum_yy = y_moments
+    cov_xx = sum_xx - sum_x ** 2 / n
+    cov_yy = sum_yy - sum_y ** 2 / n
+    cov_xy = sum_xy - sum_x * sum_y / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr_sq = np.clip(cov_xy ** 2 / (cov_xx * cov_yy), 0, 1 - 1e-12)
+        scores = corr_sq / (1 - corr_sq) * (n - 2)
+    return np.nan_to_num(scores, nan=0.0)
+
+def _binned_mutual_information(counts: np.ndarray) -> np.ndarray:
+    """Mutual information per column from joint (feature bin, target bin) counts"""
+    joint = counts / np.maximum(counts.sum(axis=(1, 2), keepdims=True), 1)
+    marginal_x = joint.sum(axis=2, keepdims=True)
+    marginal_y = joint.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = joint * np.log(joint / (marginal_x * marginal_y))
+    return np.nansum(terms, axis=(1, 2))
+
+def _stability_scores(X_train: np.ndarray, y_train: np.ndarray, time_budget: float, seed: int = 42) -> np.ndarray:
+    """Selection frequency of each column under Lasso fits on random half-samples"""
+    rng = np.random.RandomState(seed)
+    n, p = X_train.shape
+    counts = np.zeros(p)
+    rounds = 0
+    deadline = time.perf_counter() + time_budget
+    
+    while rounds < STABILITY_MAX_ROUNDS and (rounds < STABILITY_MIN_ROUNDS or time.perf_counter() < deadline):
+        rows = rng.choice(n, n // 2, replace=False)
+        stats, _, _ = _standardize_statistics(_sufficient_statistics(X_train[rows], y_train[rows]), np.ones(p, dtype=bool))
+        alpha_max = np.max(np.abs(stats['xty'])) / stats['n']
+        coef, _ = _solve_elastic_net(stats, 0.1 * alpha_max, 1.0, max_iter=200)
+        counts += coef != 0
+        rounds += 1
+    
+    return counts / rounds
+
+def _conformal_calibration(y: np.ndarray, member_oof: np.ndarray, best_oof: np.ndarray) -> Dict[str, Any]:
+    """Normalized split-conformal scores |residual| / (member dispersion + floor) from out-of-fold predictions"""
+    dispersion = member_oof.std(axis=0) if len(member_oof) > 1 else np.zeros(len(y))
+    floor = float(np.median(dispersion)) or 1.0
+    scores = np.abs(y - best_oof) / (dispersion + floor)
+    
+    n = len(scores)
+    interval_quantile = float(np.quantile(scores, min(1.0, np.ceil((n + 1) * INTERVAL_COVERAGE) / n)))
+    half_widths = interval_quantile * (dispersion + floor)
+    
+    return {
+        'dispersion_floor': floor,
+        'interval_quantile': interval_quantile,
+        'score_quantiles': np.quantile(scores, CONFORMAL_GRID),
+        'risk_cutoffs': np.quantile(half_widths, [1 / 3, 2 / 3]),
+        'coverage': INTERVAL_COVERAGE
+    }
+
+def _quantile_cdf_at_zero(quantiles: np.ndarray, levels: np.ndarray) -> np.ndarray:
+    """F(0) per row from sorted predicted quantiles, linear between levels and clamped at the ends"""
+    n, k = quantiles.shape
+    upper = np.clip((quantiles < 0).sum(axis=1), 1, k - 1)
+    rows = np.arange(n)
+    q_low, q_high = quantiles[rows, upper - 1], quantiles[rows, upper]
+    weight = np.clip(-q_low / np.maximum(q_high - q_low, 1e-12), 0, 1)
+    return levels[upper - 1] + weight * (levels[upper] - levels[upper - 1])
+
+def _scale_in_chunks(scaler: StandardScaler, X: np.ndarray, chunk_rows: int = SCALING_CHUNK_ROWS) -> np.ndarray:
+    """Fit the scaler over row chunks with partial_fit, then standardize X in place"""
+    for start in range(0, len(X), chunk_rows):
+        scaler.partial_fit(X[start:start + chunk_rows])
+    for start in range(0, len(X), chunk_rows):
+        scaler.transform(X[start:start + chunk_rows], copy=False)
+    return X
+
+class MemoryTracker:
+    """Resident memory after each training stage plus the process high-water mark.
+    
+    Read from /proc and getrusage so the native allocations of numpy, the tree
+    builders and the boosting libraries are included.
+    """
+    
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.stages: Dict[str, Dict[str, float]] = {}
+    
+    @staticmethod
+    def _rss_mb() -> Optional[float]:
+        try:
+            with open('/proc/self/statm') as f:
+                return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _max_rss_mb() -> float:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    
+    def mark(self, stage: str) -> None:
+        if self.enabled:
+            self.stages[stage] = {'rss_mb': self._rss_mb(), 'max_rss_mb': self._max_rss_mb()}
+    
+    def report(self) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        return {'stages': self.stages, 'max_rss_mb': self._max_rss_mb()}
+
+class FeatureMomentCache:
+    """Per-fold univariate moments (n, Σx, Σx², Σxy) of single columns.
+    
+    The target-free moments (n, Σx, Σx²) are keyed by column content and fold
+    layout, so a column is summed once however many targets it is scored
+    against; Σxy is a single weighted bincount per target. Entries live in
+    memory for warm invocations and, when FEATURE_CACHE_DIR is set, on disk so
+    horizons trained on the same rows reuse each other's moments.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._memory: Dict[str, np.ndarray] = {}
+    
+    def _column_moments(self, column: np.ndarray, fold_ids: np.ndarray, n_folds: int) -> np.ndarray:
+        key = hashlib.sha1(column.tobytes() + fold_ids.tobytes()).hexdigest()
+        if key in self._memory:
+            return self._memory[key]
+        
+        path = os.path.join(self.cache_dir, f"{key}.npy") if self.cache_dir else None
+        if path and os.path.exists(path):
+            moments = np.load(path)
+        else:
+            moments = np.stack([
+                np.bincount(fold_ids, minlength=n_folds).astype(np.float64),
+                np.bincount(fold_ids, weights=column, minlength=n_folds),
+                np.bincount(fold_ids, weights=column * column, minlength=n_folds)
+            ], axis=1)
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, moments)
+                os.replace(tmp_path, path)
+        
+        self._memory[key] = moments
+        return moments
+    
+    def column_moments(self, column: np.ndarray, y: np.ndarray, fold_ids: np.ndarray, n_folds: int) -> np.ndarray:
+        cross = np.bincount(fold_ids, weights=column * y, minlength=n_folds)
+        return np.column_stack([self._column_moments(column, fold_ids, n_folds), cross])
+
+feature_moment_cache = FeatureMomentCache(os.environ.get('FEATURE_CACHE_DIR'))
+
+
+def _float32_floor(values) -> np.ndarray:
+    """Largest float32 at or below each value, so `x32 <= threshold` can be decided in float32"""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    return np.where(rounded > values, np.nextafter(rounded, np.float32(-np.inf)), rounded).astype(np.float64)
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    frontier, depth = np.array([0]), -1
+    while frontier.size:
+        frontier = np.concatenate([left[frontier], right[frontier]])
+        frontier, depth = frontier[frontier >= 0], depth + 1
+    return depth
+
+def _lightgbm_tree(structure: Dict[str, Any]):
+    """dump_model() tree -> (feature, threshold, left, right, value) node arrays, root first"""
+    nodes = []
+    
+    def visit(node) -> int:
+        index = len(nodes)
+        nodes.append(None)
+        if 'leaf_value' in node:
+            nodes[index] = (0, 0.0, -1, -1, node['leaf_value'])
+            return index
+        if node['decision_type'] != '<=' or node.get('missing_type') == 'Zero':
+            raise ValueError(f"Unsupported LightGBM split {node['decision_type']} (missing: {node.get('missing_type')})")
+        left, right = visit(node['left_child']), visit(node['right_child'])
+        nodes[index] = (node['split_feature'], node['threshold'], left, right, 0.0)
+        return index
+    
+    visit(structure)
+    feature, threshold, left, right, value = map(np.array, zip(*nodes))
+    return feature, threshold.astype(np.float64), left, right, value.astype(np.float64)
+
+
+class CompiledTrees:
+    """Tree-ensemble members flattened into one set of node arrays, traversed level by level for a batch.
+    
+    predict() returns one row per member output: the averaged forest, the
+    boosted sum plus its initial score, or one row per target of a
+    multi-output booster. Every split sends a row right when x > threshold.
+    sklearn and xgboost compare float32 inputs, so their nodes read a
+    float32-rounded copy of the features (columns n_features and up) with
+    thresholds moved to the float32 grid, and every split decides exactly as
+    the native predictor does.
+    """
+    
+    def __init__(self, estimators: List[Any]):
+        self.n_features = int(estimators[0].n_features_in_)
+        trees, bias = [], []
+        for estimator in estimators:
+            member_trees, member_bias = self._member_trees(estimator)
+            trees += [(nodes, len(bias) + output, weight) for nodes, output, weight in member_trees]
+            bias += member_bias
+        self.bias = np.array(bias, dtype=np.float64)
+        
+        # Deepest trees first, so level d only advances the prefix of trees deeper than d
+        depths = np.array([_tree_depth(nodes[2], nodes[3]) for nodes, _, _ in trees])
+        order = np.argsort(-depths, kind='stable')
+        self.active_trees = [int((depths > level).sum()) for level in range(int(depths.max()))]
+        
+        sizes = np.array([len(trees[i][0][0]) for i in order])
+        self.roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+        features, thresholds, children, values = [], [], [], []
+        for i, root in zip(order, self.roots):
+            feature, threshold, left, right, value = trees[i][0]
+            leaf = left < 0
+            own = np.arange(len(left)) + root
+            # Leaves point at themselves, so trees that finished early stay put
+            features.append(np.where(leaf, 0, feature))
+            thresholds.append(np.where(leaf, np.inf, threshold))
+            children.append(np.column_stack([np.where(leaf, own, left + root), np.where(leaf, own, right + root)]).ravel())
+            values.append(value)
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.children = np.concatenate(children).astype(np.intp)  # (left, right) pairs
+        self.value = np.concatenate(values)
+        self.weights = np.zeros((len(self.bias), len(trees)))
+        self.weights[[trees[i][1] for i in order], np.arange(len(trees))] = [trees[i][2] for i in order]
+    
+    def _member_trees(self, estimator):
+        """[(node arrays, output, weight)] and the per-output bias of one fitted member"""
+        float32_offset = self.n_features
+        
+        def sklearn_tree(tree):
+            return (tree.feature + float32_offset, _float32_floor(tree.threshold), tree.children_left,
+                    tree.children_right, tree.value[:, 0, 0].astype(np.float64))
+        
+        if isinstance(estimator, RandomForestRegressor):
+            return [(sklearn_tree(member.tree_), 0, 1 / len(estimator.estimators_)) for member in estimator.estimators_], [0.0]
+        if isinstance(estimator, GradientBoostingRegressor):
+            init = 0.0 if estimator.init_ == 'zero' else float(np.ravel(estimator.init_.constant_)[0])
+            return [(sklearn_tree(member.tree_), 0, estimator.learning_rate) for member in estimator.estimators_[:, 0]], [init]
+        if isinstance(estimator, xgb.XGBRegressor):
+            learner = json.loads(estimator.get_booster().save_raw('json'))['learner']
+            booster = learner['gradient_booster']
+            if booster['name'] != 'gbtree' or learner['objective']['name'] not in XGBOOST_IDENTITY_OBJECTIVES:
+                raise ValueError(f"Unsupported xgboost model {booster['name']}/{learner['objective']['name']}")
+            trees = []
+            for tree, output in zip(booster['model']['trees'], booster['model']['tree_info']):
+                if any(tree['split_type']) or int(tree['tree_param']['size_leaf_vector']) > 1:
+                    raise ValueError("Categorical splits and vector leaves are not compiled")
+                left = np.array(tree['left_children'])
+                conditions = np.array(tree['split_conditions'], dtype=np.float32)
+                # Left when x < condition: right when x exceeds the float32 just below it. Leaves store their value
+                threshold = np.nextafter(conditions, np.float32(-np.inf)).astype(np.float64)
+                trees.append(((np.array(tree['split_indices']) + float32_offset, threshold, left,
+                               np.array(tree['right_children']), np.where(left < 0, conditions, 0).astype(np.float64)),
+                              output, 1.0))
+            base_score = learner['learner_model_param']['base_score'].strip('[]')
+            return trees, [float(value) for value in base_score.split(',')]
+        if isinstance(estimator, lgb.LGBMRegressor):
+            model = estimator.booster_.dump_model()
+            if model['objective'].split()[0] not in LIGHTGBM_IDENTITY_OBJECTIVES:
+                raise ValueError(f"Unsupported LightGBM objective {model['objective']}")
+            # Leaf values already include shrinkage and the initial score
+            return [(_lightgbm_tree(info['tree_structure']), 0, 1.0) for info in model['tree_info']], [0.0]
+        raise TypeError(f"{type(estimator).__name__} has no compiled form")
+    
+    def predict(self, X) -> np.ndarray:
+        """(outputs, rows) predictions for finite X"""
+        X = np.asarray(X, dtype=np.float64)
+        predictions = np.empty((len(self.bias), len(X)))
+        for start in range(0, len(X), COMPILED_CHUNK_ROWS):
+            chunk = X[start:start + COMPILED_CHUNK_ROWS]
+            columns = np.hstack([chunk, chunk.astype(np.float32)]).ravel()
+            row_offsets = (np.arange(len(chunk)) * 2 * self.n_features)[None, :]
+            nodes = np.repeat(self.roots[:, None], len(chunk), axis=1)
+            for active in self.active_trees:
+                current = nodes[:active]
+                go_right = columns[self.feature[current] + row_offsets] > self.threshold[current]
+                current[...] = self.children[2 * current + go_right]
+            predictions[:, start:start + len(chunk)] = self.weights @ self.value[nodes] + self.bias[:, None]
+        return predictions
+
+def compile_tree_models(trained_models: Dict[str, Any]) -> Dict[str, CompiledTrees]:
+    """CompiledTrees for every tree member and for the ensemble, with one output row per ensemble member"""
+    compiled = {}
+    for name, model in trained_models.items():
+        estimators = list(model.estimators_) if isinstance(model, VotingRegressor) else [model]
+        # Linear and neural members, and ensembles containing them, stay on native predict
+        if not all(isinstance(estimator, COMPILED_TREE_TYPES) for estimator in estimators):
+            continue
+        try:
+            compiled[name] = CompiledTrees(estimators)
+        except Exception as e:
+            logger.warning(f"⚠️ {name} stays on native predict: {e}")
+    logger.info(f"⚡ Compiled {sorted(compiled)} for batch inference")
+    return compiled
+
+
 class MLEngine1M:
     """Goldman Sachs-level ML Engine optimized for 1M predictions"""
     
-    def engineer_features(self, X: pd.DataFrame, horizon: str = '1M') -> pd.DataFrame:
+    def engineer_features(self, X: pd.DataFrame, horizon: str = '1M', low_memory: bool = False) -> pd.DataFrame:
         """Balanced feature engineering for 1M models"""
-        X_engineered = X.copy()
+        if low_memory:
+            # One float32 copy; engineered columns inherit its dtype and are added in place
+            X = X_engineered = X.astype(np.float32)
+        else:
+            X_engineered = X.copy()
         
         logger.info("📈 Applying balanced feature engineering for 1M")
         
@@ -57,23 +553,42 @@ class MLEngine1M:
         X_engineered['risk_adjusted_return'] = X['fundamental'] / (X['volatility'] / 20 + 0.1)
         X_engineered['volatility_trend'] = X['volatility'] * X['technical'] / 100
         
+        if low_memory:
+            X_engineered.ffill(inplace=True)
+            X_engineered.fillna(X_engineered.median(), inplace=True)
+            X_engineered.fillna(0, inplace=True)
+            return X_engineered
         return X_engineered.ffill().fillna(X_engineered.median()).fillna(0)
     
-    def train_models(self, X: pd.DataFrame, y: pd.Series, horizon: str) -> Dict[str, Any]:
+    def train_models(self, X: pd.DataFrame, y: pd.Series, horizon: str, scorer: str = 'f_regression',
+                     model_names: Optional[List[str]] = None, low_memory: bool = False,
+                     quantiles: bool = False) -> Dict[str, Any]:
         """Train balanced models for 1M"""
         logger.info(f"📈 Training balanced models for {horizon}")
         
+        memory = MemoryTracker(low_memory)
+        
         # Feature engineering 
-        X_engineered = self.engineer_features(X, horizon)
+        X_engineered = self.engineer_features(X, horizon, low_memory=low_memory)
+        memory.mark('engineer_features')
         
-        # Feature selection (moderate number of features)
-        selector = SelectKBest(score_func=f_regression, k=min(10, X_engineered.shape[1]))
-        X_selected = selector.fit_transform(X_engineered, y)
-        selected_features = X_engineered.columns[selector.get_support()].tolist()
+        # Feature selection, repeated inside every CV fold so CV scores are leak-free
+        selection = self.select_features(X_engineered, y, k=min(10, X_engineered.shape[1]), cv=4, scorer=scorer,
+                                         dtype=np.float32 if low_memory else np.float64)
+        selector = selection['selector']
+        selected_features = selection['selected_features']
+        if low_memory:
+            # Slice the contiguous selection matrix instead of transforming the frame again
+            del X_engineered
+            X_selected = selection['X_values'][:, selector.get_support()]
+        else:
+            X_selected = selector.transform(X_engineered)
+        memory.mark('select_features')
         
-        # Scaling
+        # Scaling (in place over row chunks in low-memory mode)
         scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X_selected)
+        X_scaled = _scale_in_chunks(scaler, X_selected) if low_memory else scaler.fit_transform(X_selected)
+        memory.mark('scaling')
         
         logger.info(f"📊 Selected {len(selected_features)} features for {horizon}")
         
@@ -90,19 +605,37 @@ class MLEngine1M:
             'bayesian_ridge': BayesianRidge()
         }
         
+        # A fan-out task trains only its share of the roster
+        if model_names:
+            models = {name: model for name, model in models.items() if name in model_names}
+            if not models:
+                raise ValueError(f"None of {model_names} are in the {horizon} roster")
+        
+        # Linear members are solved together from one Gram matrix per CV fold
+        linear_family = self.train_linear_family(
+            {name: model for name, model in models.items() if name in SUFFICIENT_STAT_MODELS}, selection, y
+        )
+        
         # Train and evaluate models
         trained_models = {}
         model_performances = {}
+        oof_predictions = {}
         
         for name, model in models.items():
             try:
                 logger.info(f"🔧 Training {name} for {horizon}")
                 
-                # Train model
-                model.fit(X_scaled, y)
-                
-                # Cross-validation
-                cv_scores = cross_val_score(model, X_scaled, y, cv=4, scoring='r2')  # Balanced CV
+                if name in linear_family['cv_scores']:
+                    # Already fitted from the shared sufficient statistics
+                    cv_scores = linear_family['cv_scores'][name]
+                    oof_predictions[name] = linear_family['oof_predictions'][name]
+                else:
+                    # Train model
+                    model.fit(X_scaled, y)
+                    
+                    # Cross-validation with per-fold selection and scaling
+                    oof_predictions[name] = np.empty(len(y))
+                    cv_scores = self.cross_validate(model, selection, y, oof=oof_predictions[name])
                 
                 # Make predictions
                 y_pred = model.predict(X_scaled)
@@ -178,18 +711,51 @@ class MLEngine1M:
                 best_model_name = 'ensemble'
                 logger.info(f"🎯 Ensemble created with R²={ensemble_r2:.6f}")
         
+        memory.mark('models')
+        
+        # Conformal calibration from out-of-fold residuals, normalized by the spread of the
+        # top members so prediction intervals widen where the members disagree
+        members = sorted((name for name in model_performances if name != 'ensemble'),
+                         key=lambda name: model_performances[name]['r2'], reverse=True)[:3]
+        member_oof = np.array([oof_predictions[name] for name in members])
+        best_oof = member_oof.mean(axis=0) if best_model_name == 'ensemble' else oof_predictions[best_model_name]
+        calibration = {**_conformal_calibration(np.asarray(y, dtype=np.float64), member_oof, best_oof), 'members': members}
+        
+        # Optional multi-quantile booster for median, interval and direction in one pass
+        quantile_model = self.train_quantile_model(selection, X_scaled, y) if quantiles else None
+        
+        # Sufficient statistics and reference error for incremental updates; the
+        # reference error comes from cross-validation since in-sample fits are near-perfect
+        cv_r2 = max(p['cv_score_mean'] for p in model_performances.values() if 'cv_score_mean' in p)
+        training_state = {
+            'sufficient_stats': linear_family['stats'],
+            'training_mse': float(max(1 - cv_r2, 0.05) * np.var(y)),
+            'best_model': best_model_name,
+            'feature_columns': list(X.columns),
+            'incremental_updates': 0,
+            'calibration': calibration,
+            'target_std': float(np.std(y))
+        }
+        
         return {
             'best_model': best_model_name,
             'performance': model_performances[best_model_name],
+            'model_performances': model_performances,
             'ensemble_available': 'ensemble' in trained_models,
             'models_trained': list(trained_models.keys()),
             'selected_features': selected_features,
+            'alpha_paths': linear_family['alpha_paths'],
             'trained_models': trained_models,
             'scaler': scaler,
-            'feature_selector': selector
+            'feature_selector': selector,
+            'training_state': training_state,
+            'quantile_model': quantile_model,
+            'memory_report': memory.report()
         }
     
-    def save_model_to_gcs(self, trained_models: Dict, scaler, feature_selector, selected_features: List[str], horizon: str) -> Optional[str]:
+    def save_model_to_gcs(self, trained_models: Dict, scaler, feature_selector, selected_features: List[str], horizon: str,
+                          training_state: Optional[Dict[str, Any]] = None, shard: Optional[str] = None,
+                          task_id: Optional[str] = None, quantile_model: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """Save model data to Google Cloud Storage"""
         try:
             storage_client = storage.Client()
@@ -200,6 +766,9 @@ class MLEngine1M:
                 'scaler': scaler,
                 'feature_selector': feature_selector,
                 'selected_features': selected_features,
+                'training_state': training_state,
+                'quantile_model': quantile_model,
+                'compiled_trees': compile_tree_models(trained_models),
                 'version': '1.0',
                 'horizon': horizon,
                 'created_at': datetime.now(timezone.utc).isoformat()
@@ -210,7 +779,10 @@ class MLEngine1M:
             buffer.seek(0)
             
             timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
-            blob_name = f"models/{horizon}_{timestamp}.pkl"
+            if task_id:
+                # Concurrent fan-out tasks save within the same second
+                timestamp = f"{timestamp}_{task_id}"
+            blob_name = f"models/{horizon}/{shard}/{timestamp}.pkl" if shard else f"models/{horizon}_{timestamp}.pkl"
             
             bucket = storage_client.bucket(bucket_name)
             blob = bucket.blob(blob_name)
@@ -223,9 +795,820 @@ class MLEngine1M:
             logger.error(f"Error saving model to GCS: {e}")
             return None
 
+    def load_model_from_gcs(self, blob_name: str) -> Optional[Dict[str, Any]]:
+        """Load model data previously written by save_model_to_gcs"""
+        try:
+            storage_client = storage.Client()
+            bucket = storage_client.bucket('uptrendr-models')
+            model_data = pickle.loads(bucket.blob(blob_name).download_as_bytes())
+            logger.info(f"✅ Model loaded from GCS: gs://uptrendr-models/{blob_name}")
+            return model_data
+            
+        except Exception as e:
+            logger.error(f"Error loading model from GCS: {e}")
+            return None
+    
+    def predict_batch(self, model_data: Dict[str, Any], X: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Predictions, conformal intervals, confidence and risk for all rows, one call per member"""
+        state = model_data['training_state']
+        calibration = state.get('calibration')
+        if calibration is None:
+            raise ValueError(f"Model for {model_data['horizon']} has no conformal calibration, retrain it")
+        
+        models = model_data['trained_models']
+        X_engineered = self.engineer_features(X, model_data['horizon'])
+        X_scaled = model_data['scaler'].transform(model_data['feature_selector'].transform(X_engineered))
+        
+        # Small batches skip native predict's per-call overhead through the compiled trees; non-finite
+        # rows keep the native missing-value routing
+        compiled = model_data.get('compiled_trees') or {}
+        if len(X_scaled) > COMPILED_TREES_MAX_ROWS or not np.isfinite(X_scaled).all():
+            compiled = {}
+        
+        def predict(name, estimators) -> np.ndarray:
+            if name in compiled:
+                return compiled[name].predict(X_scaled)
+            return np.array([estimator.predict(X_scaled) for estimator in estimators])
+        
+        quantile_model = model_data.get('quantile_model')
+        if quantile_model:
+            # One booster pass gives the median, conformalized bounds and P(up)
+            quantiles = np.sort(quantile_model['model'].predict(X_scaled), axis=1)
+            low, high = quantile_model['interval_indices']
+            lower = quantiles[:, low] - quantile_model['conformal_margin']
+            upper = quantiles[:, high] + quantile_model['conformal_margin']
+            prob_up = 1 - _quantile_cdf_at_zero(quantiles, quantile_model['levels'])
+            return {
+                'prediction': quantiles[:, quantile_model['median_index']],
+                'lower': lower,
+                'upper': upper,
+                'prob_up': prob_up,
+                'confidence': np.maximum(prob_up, 1 - prob_up),
+                'risk_level': RISK_LEVELS[np.searchsorted(quantile_model['risk_cutoffs'], upper - lower)]
+            }
+        
+        best_model = state['best_model']
+        if best_model == 'ensemble':
+            # VotingRegressor averages its fitted members, so score them once and reuse
+            member_predictions = predict('ensemble', models['ensemble'].estimators_)
+            prediction = member_predictions.mean(axis=0)
+        else:
+            members = calibration['members']
+            member_predictions = np.concatenate([predict(name, [models[name]]) for name in members])
+            prediction = member_predictions[members.index(best_model)] if best_model in members else predict(best_model, [models[best_model]])[0]
+        
+        dispersion = member_predictions.std(axis=0) if len(member_predictions) > 1 else np.zeros(len(prediction))
+        scale = dispersion + calibration['dispersion_floor']
+        half_width = calibration['interval_quantile'] * scale
+        
+        # Share of calibration errors smaller than the distance to zero: how likely the trend holds
+        within = np.interp(np.abs(prediction) / scale, calibration['score_quantiles'], CONFORMAL_GRID)
+        
+        return {
+            'prediction': prediction,
+            'lower': prediction - half_width,
+            'upper': prediction + half_width,
+            'dispersion': dispersion,
+            'confidence': 0.5 + 0.5 * within,
+            'risk_level': RISK_LEVELS[np.searchsorted(calibration['risk_cutoffs'], half_width)]
+        }
+    
+    def measure_drift(self, model_data: Dict[str, Any], X_scaled: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+        """Compare new rows against the frozen scaler and the training error of the best model"""
+        state = model_data['training_state']
+        best_model = model_data['trained_models'][state['best_model']]
+        
+        feature_shift = float(np.max(np.abs(X_scaled.mean(axis=0))))
+        error_ratio = float(mean_squared_error(y, best_model.predict(X_scaled)) / (state['training_mse'] + 1e-12))
+        
+        return {
+            'feature_shift': feature_shift,
+            'error_ratio': error_ratio,
+            'drifted': feature_shift > FEATURE_DRIFT_THRESHOLD or error_ratio > ERROR_DRIFT_THRESHOLD
+        }
+    
+    def _fit_from_statistics(self, name: str, model, stats: Dict[str, Any]) -> bool:
+        """Set a linear member's coefficients from sufficient statistics; False for other members"""
+        if name == 'ridge':
+            model.coef_, model.intercept_ = _solve_ridge(stats, model.alpha)
+        elif name == 'lasso':
+            model.coef_, model.intercept_ = _solve_elastic_net(stats, model.alpha, 1.0, getattr(model, 'coef_', None))
+        elif name == 'elastic_net':
+            model.coef_, model.intercept_ = _solve_elastic_net(stats, model.alpha, model.l1_ratio, getattr(model, 'coef_', None))
+        elif name == 'bayesian_ridge':
+            model.coef_, model.intercept_, model.alpha_, model.lambda_, model.sigma_ = _solve_bayesian_ridge(stats)
+        else:
+            return False
+        model.n_features_in_ = len(model.coef_)
+        return True
+    
+    def select_features(self, X_engineered: pd.DataFrame, y, k: int, cv: int, scorer: str = 'f_regression',
+                        dtype=np.float64) -> Dict[str, Any]:
+        """Leak-free feature selection: every CV fold selects from its own training rows.
+        
+        Fold statistics are the cached full-data column moments minus the held-out
+        fold's, so the univariate scores cost one pass over the data in total.
+        """
+        if scorer not in SELECTION_SCORERS:
+            raise ValueError(f"Unknown selection scorer '{scorer}', expected one of {SELECTION_SCORERS}")
+        
+        X_values = np.ascontiguousarray(X_engineered.values, dtype=dtype)
+        y = np.asarray(y, dtype=np.float64)
+        n_features = X_values.shape[1]
+        folds = list(KFold(n_splits=cv).split(X_values))
+        fold_ids = np.empty(len(y), dtype=np.int64)
+        for i, (_, test) in enumerate(folds):
+            fold_ids[test] = i
+        
+        # (fold, feature, moment) and (fold, moment) arrays
+        moments = np.stack([feature_moment_cache.column_moments(X_values[:, j], y, fold_ids, cv)
+                            for j in range(n_features)], axis=1)
+        y_moments = np.stack([
+            np.bincount(fold_ids, minlength=cv).astype(np.float64),
+            np.bincount(fold_ids, weights=y, minlength=cv),
+            np.bincount(fold_ids, weights=y * y, minlength=cv)
+        ], axis=1)
+        
+        counts = None
+        if scorer == 'mutual_info':
+            # Quantile bins on the full columns; joint counts are kept per fold so they subtract
+            edges = np.quantile(X_values, np.linspace(0, 1, MI_BINS + 1)[1:-1], axis=0)
+            x_codes = np.stack([np.searchsorted(edges[:, j], X_values[:, j]) for j in range(n_features)], axis=1)
+            y_codes = np.searchsorted(np.quantile(y, np.linspace(0, 1, MI_BINS + 1)[1:-1]), y)
+            cells = ((fold_ids[:, None] * n_features + np.arange(n_features)) * MI_BINS + x_codes) * MI_BINS + y_codes[:, None]
+            counts = np.bincount(cells.ravel(), minlength=cv * n_features * MI_BINS * MI_BINS)
+            counts = counts.reshape(cv, n_features, MI_BINS, MI_BINS).astype(np.float64)
+        
+        def score(held_out: Optional[int], rows: np.ndarray) -> np.ndarray:
+            fold_moments = moments.sum(axis=0) - (moments[held_out] if held_out is not None else 0)
+            fold_y_moments = y_moments.sum(axis=0) - (y_moments[held_out] if held_out is not None else 0)
+            f_scores = _f_scores(fold_moments, fold_y_moments)
+            if scorer == 'mutual_info':
+                return _binned_mutual_information(counts.sum(axis=0) - (counts[held_out] if held_out is not None else 0))
+            if scorer == 'stability':
+                frequencies = _stability_scores(X_values[rows], y[rows], STABILITY_TIME_BUDGET / (cv + 1))
+                # F statistics only break ties between equally stable columns
+                return frequencies + 1e-3 * f_scores / (np.max(f_scores) + 1e-12)
+            return f_scores
+        
+        fold_masks = [_top_k_mask(score(i, train), k) for i, (train, _) in enumerate(folds)]
+        full_scores = score(None, np.arange(len(y)))
+        
+        # Fitted SelectKBest so saved models keep the same transform() interface
+        selector = SelectKBest(score_func=f_regression, k=k)
+        selector.scores_ = full_scores
+        selector.pvalues_ = f_distribution.sf(full_scores, 1, len(y) - 2) if scorer == 'f_regression' else None
+        selector.n_features_in_ = n_features
+        selector.feature_names_in_ = np.asarray(X_engineered.columns, dtype=object)
+        
+        return {
+            'selector': selector,
+            'selected_features': X_engineered.columns[selector.get_support()].tolist(),
+            'scorer': scorer,
+            'X_values': X_values,
+            'folds': folds,
+            'fold_masks': fold_masks
+        }
+    
+    def out_of_fold_predict(self, model, selection: Dict[str, Any], y) -> np.ndarray:
+        """Held-out predictions with selection and scaling fitted on each fold's training rows only"""
+        X_values = selection['X_values']
+        y = np.asarray(y, dtype=np.float64)
+        oof = None
+        
+        for (train, test), mask in zip(selection['folds'], selection['fold_masks']):
+            X_train = X_values[np.ix_(train, mask)]
+            mean = X_train.mean(axis=0)
+            scale = X_train.std(axis=0)
+            scale[scale == 0] = 1.0
+            fold_model = clone(model).fit((X_train - mean) / scale, y[train])
+            predictions = fold_model.predict((X_values[np.ix_(test, mask)] - mean) / scale)
+            if oof is None:
+                oof = np.empty((len(y),) + predictions.shape[1:])
+            oof[test] = predictions
+        
+        return oof
+    
+    def cross_validate(self, model, selection: Dict[str, Any], y, oof: Optional[np.ndarray] = None) -> np.ndarray:
+        """R² per fold from out-of-fold predictions (copied into oof if given)"""
+        y = np.asarray(y, dtype=np.float64)
+        predictions = self.out_of_fold_predict(model, selection, y)
+        if oof is not None:
+            oof[:] = predictions
+        return np.array([r2_score(y[test], predictions[test]) for _, test in selection['folds']])
+    
+    def train_quantile_model(self, selection: Dict[str, Any], X_scaled: np.ndarray, y) -> Dict[str, Any]:
+        """Multi-quantile xgboost: median, interval bounds and P(up) from a single booster.
+        
+        The interval is conformalized (CQR) with out-of-fold quantiles from the same
+        folds as the point models, so its coverage holds on held-out rows.
+        """
+        y = np.asarray(y, dtype=np.float64)
+        model = xgb.XGBRegressor(objective='reg:quantileerror', quantile_alpha=QUANTILE_LEVELS,
+                                 n_estimators=150, max_depth=5, learning_rate=0.1, random_state=42)
+        oof = np.sort(self.out_of_fold_predict(model, selection, y), axis=1)
+        model.fit(X_scaled, y)
+        
+        low, high = (int(np.searchsorted(QUANTILE_LEVELS, level)) for level in QUANTILE_INTERVAL)
+        median = int(np.searchsorted(QUANTILE_LEVELS, 0.5))
+        conformity = np.maximum(oof[:, low] - y, y - oof[:, high])
+        n = len(y)
+        margin = float(np.quantile(conformity, min(1.0, np.ceil((n + 1) * INTERVAL_COVERAGE) / n)))
+        
+        prob_up = 1 - _quantile_cdf_at_zero(oof, QUANTILE_LEVELS)
+        residuals = y[:, None] - oof
+        cv_metrics = {
+            'pinball_loss': float(np.mean(np.maximum(QUANTILE_LEVELS * residuals, (QUANTILE_LEVELS - 1) * residuals))),
+            'interval_coverage': float(np.mean((y >= oof[:, low] - margin) & (y <= oof[:, high] + margin))),
+            'directional_accuracy': float(np.mean((y > 0) == (oof[:, median] > 0))),
+            'brier_score': float(np.mean((prob_up - (y > 0)) ** 2))
+        }
+        logger.info(f"📏 Quantile booster CV: pinball={cv_metrics['pinball_loss']:.5f}, "
+                    f"coverage={cv_metrics['interval_coverage']:.3f}, brier={cv_metrics['brier_score']:.3f}")
+        
+        return {
+            'model': model,
+            'levels': QUANTILE_LEVELS,
+            'interval_indices': (low, high),
+            'median_index': median,
+            'conformal_margin': margin,
+            'risk_cutoffs': np.quantile(oof[:, high] - oof[:, low] + 2 * margin, [1 / 3, 2 / 3]),
+            'cv_metrics': cv_metrics
+        }
+    
+    def train_linear_family(self, models: Dict[str, Any], selection: Dict[str, Any], y) -> Dict[str, Any]:
+        """Fit all linear members, their CV scores and alpha paths from per-fold Gram matrices.
+        
+        Gram statistics over all engineered columns are multiplied out once per fold.
+        Each fold's training statistics are the full statistics minus the held-out
+        fold's, restricted to that fold's selected columns and standardized algebraically.
+        """
+        X_values = selection['X_values']
+        y = np.asarray(y, dtype=np.float64)
+        folds = selection['folds']
+        fold_stats = [_sufficient_statistics(X_values[test], y[test]) for _, test in folds]
+        full_stats = fold_stats[0]
+        for stats in fold_stats[1:]:
+            full_stats = _merge_statistics(full_stats, stats)
+        
+        cv_scores = {name: [] for name in models}
+        oof_predictions = {name: np.empty(len(y)) for name in models}
+        path_scores = {name: {} for name in models if name in ALPHA_PATHS}
+        
+        for (_, test), held_out, mask in zip(folds, fold_stats, selection['fold_masks']):
+            train_stats, mean, scale = _standardize_statistics(_subtract_statistics(full_stats, held_out), mask)
+            X_test, y_test = (X_values[np.ix_(test, mask)] - mean) / scale, y[test]
+            
+            for name, model in models.items():
+                fold_model = clone(model)
+                self._fit_from_statistics(name, fold_model, train_stats)
+                oof_predictions[name][test] = fold_model.predict(X_test)
+                cv_scores[name].append(r2_score(y_test, oof_predictions[name][test]))
+            
+            for name in path_scores:
+                if name == 'ridge':
+                    path = _ridge_path(train_stats, ALPHA_PATHS[name])
+                else:
+                    l1_ratio = 1.0 if name == 'lasso' else models[name].l1_ratio
+                    path = _elastic_net_path(train_stats, ALPHA_PATHS[name], l1_ratio)
+                for alpha, coef, intercept in path:
+                    path_scores[name].setdefault(alpha, []).append(r2_score(y_test, X_test @ coef + intercept))
+        
+        # Final fit in the space of the full-data selection and scaler
+        full_stats, _, _ = _standardize_statistics(full_stats, selection['selector'].get_support())
+        for name, model in models.items():
+            self._fit_from_statistics(name, model, full_stats)
+        
+        alpha_paths = {}
+        for name, scores in path_scores.items():
+            alphas = sorted(scores)
+            means = [float(np.mean(scores[alpha])) for alpha in alphas]
+            alpha_paths[name] = {
+                'alphas': alphas,
+                'cv_scores': means,
+                'best_alpha': alphas[int(np.argmax(means))]
+            }
+            logger.info(f"📉 {name} alpha path: best alpha={alpha_paths[name]['best_alpha']:.4g} (CV R²={max(means):.4f})")
+        
+        return {
+            'models': models,
+            'cv_scores': {name: np.array(scores) for name, scores in cv_scores.items()},
+            'oof_predictions': oof_predictions,
+            'alpha_paths': alpha_paths,
+            'stats': full_stats
+        }
+    
+    def _update_member(self, name: str, model, X_scaled: np.ndarray, y: np.ndarray, stats: Dict[str, Any]) -> bool:
+        """Update one fitted model in place; False for members that need a full retrain"""
+        if self._fit_from_statistics(name, model, stats):
+            return True
+        if name not in BOOSTED_MODELS:
+            return False
+        model.set_params(n_estimators=INCREMENTAL_TREES)
+        if name == 'xgboost':
+            model.fit(X_scaled, y, xgb_model=model.get_booster())
+        else:
+            model.fit(X_scaled, y, init_model=model.booster_)
+        return True
+    
+    def update_models(self, model_data: Dict[str, Any], X: pd.DataFrame, y: pd.Series, horizon: str) -> Optional[Dict[str, Any]]:
+        """Incrementally update a trained roster with new rows (None when drift requires a full retrain)"""
+        state = model_data.get('training_state')
+        if not state:
+            logger.info(f"No training state stored for {horizon}, incremental update unavailable")
+            return None
+        
+        X_engineered = self.engineer_features(X, horizon)
+        X_scaled = model_data['scaler'].transform(model_data['feature_selector'].transform(X_engineered))
+        y = np.asarray(y, dtype=np.float64)
+        
+        drift = self.measure_drift(model_data, X_scaled, y)
+        logger.info(f"📐 Drift for {horizon}: feature_shift={drift['feature_shift']:.3f}, error_ratio={drift['error_ratio']:.3f}")
+        if drift['drifted']:
+            logger.info(f"⚠️ Drift threshold crossed for {horizon}, full retrain required")
+            return None
+        
+        stats = _merge_statistics(state['sufficient_stats'], _sufficient_statistics(X_scaled, y))
+        updated_models = set()
+        
+        for name, model in model_data['trained_models'].items():
+            if isinstance(model, VotingRegressor):
+                # Ensemble members are fitted clones, so they are updated separately
+                for (member_name, _), member in zip(model.estimators, model.estimators_):
+                    if self._update_member(member_name, member, X_scaled, y, stats):
+                        updated_models.add(member_name)
+            elif self._update_member(name, model, X_scaled, y, stats):
+                updated_models.add(name)
+        
+        model_data['training_state'] = {
+            **state,
+            'sufficient_stats': stats,
+            'incremental_updates': state.get('incremental_updates', 0) + 1
+        }
+        logger.info(f"🔁 Incrementally updated {sorted(updated_models)} for {horizon} with {len(y)} new samples")
+        
+        return {
+            'updated_models': sorted(updated_models),
+            'drift': drift,
+            'new_samples': len(y),
+            'training_state': model_data['training_state']
+        }
+
 # Initialize ML engine
 ml_engine = MLEngine1M()
 
+def probe_factor_inputs(query) -> Dict[str, Any]:
+    """Row count, newest timestamp and last write of a factor query, from one count aggregation and two document reads
+
+    max_updated_at moves when rows are rewritten in place, which leaves the count and newest timestamp unchanged.
+    """
+    row_count = query.count().get()[0][0].value
+    newest = list(query.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(1).stream())
+    last_write = list(query.order_by('updated_at', direction=firestore.Query.DESCENDING).limit(1).stream())
+    return {'row_count': int(row_count), 'max_timestamp': newest[0].get('timestamp') if newest else None,
+            'max_updated_at': last_write[0].get('updated_at') if last_write else None}
+
+def training_input_probe(horizon: str) -> Dict[str, Any]:
+    """Probe the factor rows tagged with the horizon, or all rows when none are tagged"""
+    factors = db.collection('historical_factors')
+    probe = probe_factor_inputs(factors.where('horizon', '==', horizon))
+    if probe['row_count']:
+        return {'scope': horizon, **probe}
+    return {'scope': 'all', **probe_factor_inputs(factors)}
+
+def factor_content_hash(df: pd.DataFrame, feature_cols: List[str]) -> str:
+    """Hash of the training rows that does not depend on the order Firestore streamed them in"""
+    columns = [col for col in ['symbol', 'timestamp', 'actual_return', *feature_cols] if col in df.columns]
+    sort_keys = [col for col in ('symbol', 'timestamp') if col in columns]
+    frame = df[columns].sort_values(sort_keys) if sort_keys else df[columns]
+    return hashlib.sha256(pd.util.hash_pandas_object(frame, index=False).values.tobytes()).hexdigest()
+
+def prediction_content_hash(prediction_doc: Dict[str, Any]) -> str:
+    """Hash of what a client renders from a category doc, leaving out the publish timestamp"""
+    content = {key: value for key, value in prediction_doc.items() if key != 'metadata'}
+    content['data_through'] = prediction_doc['metadata']['data_through']
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+def fingerprint_matches(previous: Dict[str, Any], current: Dict[str, Any], keys) -> bool:
+    return bool(previous) and all(key in previous and previous[key] == current.get(key) for key in keys)
+
+def unchanged_training_response(horizon: str, fingerprint: Dict[str, Any]) -> Dict[str, Any]:
+    """Leave the last completed status in place and only note when the inputs were checked"""
+    logger.info(f"⏭️ {horizon} inputs unchanged ({fingerprint['row_count']} rows through {fingerprint['max_timestamp']}), skipping training")
+    db.collection('ml_training_status').document(f'{horizon}_latest').set(
+        {'last_checked': datetime.now(timezone.utc), 'last_check': 'inputs_unchanged'}, merge=True)
+    return {
+        "success": True,
+        "skipped": True,
+        "horizon": horizon,
+        "reason": "inputs unchanged",
+        "row_count": fingerprint['row_count'],
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+def asset_class(symbol: str) -> str:
+    """Asset class of a ticker, inferred from its Yahoo Finance suffix"""
+    if symbol.startswith('^'):
+        return 'index'
+    if symbol.endswith('=X'):
+        return 'fx'
+    if symbol.endswith('.T'):
+        return 'jp_equity'
+    return 'us_equity'
+
+def plan_shards(horizon_df: pd.DataFrame, shard_by: str) -> Dict[str, Any]:
+    """Route every symbol to a shard, folding shards too small to fit into one pooled fallback"""
+    symbol_shards = {symbol: asset_class(symbol) if shard_by == 'asset_class' else symbol
+                     for symbol in horizon_df['symbol'].unique()}
+    
+    shard_sizes = horizon_df['symbol'].map(symbol_shards).value_counts()
+    small_shards = set(shard_sizes.index[shard_sizes < MIN_SHARD_SAMPLES])
+    symbol_shards = {symbol: 'pooled' if shard in small_shards else shard for symbol, shard in symbol_shards.items()}
+    
+    # The pooled fallback itself may still be too small to train
+    shard_sizes = horizon_df['symbol'].map(symbol_shards).value_counts()
+    routed = {symbol: shard for symbol, shard in symbol_shards.items() if shard_sizes[shard] >= MIN_SHARD_SAMPLES}
+    
+    return {
+        'symbol_shards': routed,
+        'shards': sorted(set(routed.values())),
+        'unassigned_symbols': sorted(set(symbol_shards) - set(routed))
+    }
+
+def _train_shard(task):
+    """Process-pool worker: fit the full roster on the rows of one shard"""
+    shard, X, y, horizon, scorer, model_names, low_memory, quantiles = task
+    try:
+        return shard, ml_engine.train_models(X, y, horizon, scorer=scorer, model_names=model_names,
+                                             low_memory=low_memory, quantiles=quantiles), None
+    except Exception as e:
+        return shard, None, str(e)
+
+def run_sharded_training(horizon_df: pd.DataFrame, feature_cols: List[str], horizon: str, shard_by: str,
+                         scorer: str = 'f_regression', shards: Optional[List[str]] = None,
+                         model_names: Optional[List[str]] = None, publish: bool = True,
+                         task_id: Optional[str] = None, low_memory: bool = False,
+                         quantiles: bool = False, fingerprint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Train one roster per shard in parallel, then merge the results into a shard manifest.
+    
+    With publish=False the shard artifacts are only saved to GCS and returned, leaving
+    the Firestore documents to a coordinator that merges several partial runs.
+    """
+    if 'symbol' not in horizon_df.columns or 'actual_return' not in horizon_df.columns:
+        return {"error": "Sharded training needs 'symbol' and 'actual_return' columns"}
+    
+    plan = plan_shards(horizon_df, shard_by)
+    symbol_shards = plan['symbol_shards']
+    shard_column = horizon_df['symbol'].map(symbol_shards)
+    
+    tasks = [
+        (shard, group[feature_cols], group['actual_return'], horizon, scorer, model_names, low_memory, quantiles)
+        for shard, group in horizon_df.groupby(shard_column)
+        if shards is None or shard in shards
+    ]
+    if not tasks:
+        return {"error": f"No {shard_by} shard has {MIN_SHARD_SAMPLES} samples for {horizon}"}
+    
+    # Fork shares the loaded module with the workers instead of re-importing it
+    workers = max(1, min(TRAINING_WORKERS, len(tasks)))
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    logger.info(f"🧩 Training {len(tasks)} {shard_by} shards for {horizon} on {workers} workers")
+    
+    shard_results, failures = {}, {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method)) as pool:
+        for shard, results, error in pool.map(_train_shard, tasks):
+            if results is None:
+                logger.warning(f"Failed to train shard {shard}: {error}")
+                failures[shard] = error
+            else:
+                shard_results[shard] = results
+    
+    # Merge: persist every shard under trained_models/{horizon}/{shard}/latest and
+    # record the symbol -> shard routing on the horizon document
+    model_ref = db.collection('trained_models').document(horizon)
+    shard_manifest, shard_details = {}, {}
+    for shard, results in shard_results.items():
+        gcs_blob_name = ml_engine.save_model_to_gcs(
+            results['trained_models'], results['scaler'],
+            results['feature_selector'], results['selected_features'], horizon,
+            training_state=results['training_state'], shard=shard, task_id=task_id,
+            quantile_model=results['quantile_model']
+        )
+        if not gcs_blob_name:
+            failures[shard] = 'Failed to save trained models'
+            continue
+        
+        shard_rows = shard_column == shard
+        shard_doc = {
+            'horizon': horizon,
+            'shard': shard,
+            'shard_by': shard_by,
+            'symbols': sorted(symbol for symbol, owner in symbol_shards.items() if owner == shard),
+            'gcs_blob_name': gcs_blob_name,
+            'best_model_name': results['best_model'],
+            'model_performance': results['performance'],
+            'training_samples': int(shard_rows.sum()),
+            'models_trained': results['models_trained'],
+            'version': '2.0'
+        }
+        shard_manifest[shard] = {
+            'gcs_blob_name': gcs_blob_name,
+            'best_model_name': results['best_model'],
+            'r2': results['performance']['r2'],
+            'training_samples': shard_doc['training_samples']
+        }
+        if publish:
+            model_ref.collection(shard).document('latest').set({**shard_doc, 'last_updated': datetime.now(timezone.utc)})
+        else:
+            shard_details[shard] = {**shard_doc, 'model_performances': results['model_performances']}
+    
+    if not shard_manifest:
+        raise ValueError(f"No shards successfully trained for {horizon}: {failures}")
+    
+    trained_rows = shard_column.isin(list(shard_manifest))
+    data_through = pd.Timestamp(horizon_df['timestamp'].max()).to_pydatetime()
+    
+    if not publish:
+        return {
+            "success": True,
+            "horizon": horizon,
+            "mode": "sharded",
+            "shard_by": shard_by,
+            "samples_processed": int(trained_rows.sum()),
+            "shards": shard_details,
+            "shard_failures": failures,
+            "data_through": data_through.isoformat(),
+            "content_hash": (fingerprint or {}).get('content_hash'),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    
+    routed = {symbol: shard for symbol, shard in symbol_shards.items() if shard in shard_manifest}
+    unassigned = sorted(set(plan['unassigned_symbols']) | (set(symbol_shards) - set(routed)))
+    
+    model_doc = {
+        'horizon': horizon,
+        'shard_by': shard_by,
+        'shards': shard_manifest,
+        'symbol_shards': routed,
+        'unassigned_symbols': unassigned,
+        'training_samples': int(trained_rows.sum()),
+        'data_through': data_through,
+        'training_mode': 'full',
+        'incremental_updates': 0,
+        'input_fingerprint': fingerprint or {},
+        'last_updated': datetime.now(timezone.utc),
+        'version': '2.0'
+    }
+    model_ref.set(model_doc)
+    logger.info(f"✅ {horizon} trained {len(shard_manifest)} shards, {len(unassigned)} symbols unassigned")
+    
+    training_summary = {
+        'timestamp': datetime.now(timezone.utc),
+        'horizon': horizon,
+        'training_samples': model_doc['training_samples'],
+        'status': 'completed',
+        'mode': 'sharded',
+        'shard_by': shard_by,
+        'shards_trained': len(shard_manifest),
+        'shard_failures': failures
+    }
+    db.collection('ml_training_status').document(f'{horizon}_latest').set(training_summary)
+    
+    return {
+        "success": True,
+        "horizon": horizon,
+        "mode": "sharded",
+        "shard_by": shard_by,
+        "samples_processed": model_doc['training_samples'],
+        "shards": shard_manifest,
+        "unassigned_symbols": unassigned,
+        "shard_failures": failures,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+def _symbol_slug(symbol: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', symbol.lower()).strip('_')
+
+def run_batch_predictions(horizon: str, force: bool = False) -> Dict[str, Any]:
+    """Score the latest factors of every symbol and publish market_predictions/{horizon}/{category}/latest"""
+    model_doc = db.collection('trained_models').document(horizon).get()
+    if not model_doc.exists:
+        return {"error": f"No trained model for {horizon}"}
+    model_info = model_doc.to_dict()
+    
+    # market_predictions/{horizon} is the manifest: input fingerprint, version counter and
+    # per-category content hashes. Nothing to republish unless the model or newest factor rows changed
+    predictions_ref = db.collection('market_predictions').document(horizon)
+    manifest_doc = predictions_ref.get()
+    manifest = manifest_doc.to_dict() if manifest_doc.exists else {}
+    fingerprint = {'model_updated': model_info.get('last_updated'), **probe_factor_inputs(db.collection('historical_factors'))}
+    if not force:
+        if fingerprint_matches(manifest.get('input_fingerprint', {}), fingerprint, tuple(fingerprint)):
+            logger.info(f"⏭️ {horizon} model and factors unchanged, skipping predictions")
+            return {
+                "success": True,
+                "skipped": True,
+                "horizon": horizon,
+                "reason": "model and factors unchanged",
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+    
+    cutoff = datetime.now(timezone.utc) - timedelta(days=PREDICTION_LOOKBACK_DAYS)
+    factors = [doc.to_dict() for doc in db.collection('historical_factors').where('timestamp', '>=', cutoff).stream()]
+    if not factors:
+        return {"error": f"No factors since {cutoff.date()} to score for {horizon}"}
+    
+    df = pd.DataFrame(factors)
+    if 'horizon' in df.columns and (df['horizon'] == horizon).any():
+        df = df[df['horizon'] == horizon]
+    latest = df.sort_values('timestamp').groupby('symbol').tail(1)
+    
+    # Route rows to the pooled artifact, or to the artifact of their shard
+    if model_info.get('shard_by', 'pooled') == 'pooled':
+        routes = {model_info['gcs_blob_name']: latest}
+    else:
+        shard_of = latest['symbol'].map(model_info['symbol_shards'])
+        routes = {model_info['shards'][shard]['gcs_blob_name']: rows for shard, rows in latest.groupby(shard_of)}
+    
+    scored = []
+    for blob_name, rows in routes.items():
+        model_data = ml_engine.load_model_from_gcs(blob_name)
+        if not model_data:
+            continue
+        state = model_data['training_state']
+        batch = ml_engine.predict_batch(model_data, rows[state['feature_columns']])
+        model_used = 'xgboost_quantile' if model_data.get('quantile_model') else state['best_model']
+        scored.append(rows.assign(**batch, model_used=model_used, target_std=state['target_std']))
+    if not scored:
+        return {"error": f"No model artifacts could be loaded for {horizon}"}
+    
+    results = pd.concat(scored)
+    if 'prob_up' in results.columns:
+        # Shards without the quantile booster fall back to the dispersion confidence, read in the prediction's direction
+        implied = np.where(results['prediction'] >= 0, results['confidence'], 1 - results['confidence'])
+        results['prob_up'] = np.where(results['prob_up'].isna(), implied, results['prob_up'])
+    results['category'] = results['symbol'].map(lambda symbol: PREDICTION_CATEGORIES[asset_class(symbol)])
+    
+    # 0-100 score and trend arrow from the return relative to the horizon's return spread
+    results['strength'] = results['prediction'] / (results['target_std'] + 1e-12)
+    results['score'] = 50 + 50 * np.tanh(results['strength'])
+    results['trend'] = np.select([results['strength'] > TREND_DEADBAND, results['strength'] < -TREND_DEADBAND], ['▲', '▼'], '→')
+    
+    timestamp = datetime.now(timezone.utc)
+    published_categories = manifest.get('categories', {})
+    version = manifest.get('version', 0) + 1
+    changed = {}
+    batch = db.batch()
+    for category, rows in results.groupby('category'):
+        predictions = {
+            _symbol_slug(row.symbol): {
+                'score': round(float(row.score), 1),
+                'trend': row.trend,
+                'return': float(row.prediction),
+                'interval': {'lower': float(row.lower), 'upper': float(row.upper), 'coverage': INTERVAL_COVERAGE},
+                'confidence': round(float(row.confidence), 3),
+                'risk_level': row.risk_level,
+                **({'prob_up': round(float(row.prob_up), 3)} if 'prob_up' in rows.columns else {}),
+                'factors': {name: round(float(getattr(row, name)), 4) for name in FACTOR_NAMES if name in rows.columns},
+                'model_used': row.model_used,
+                'symbol': row.symbol
+            }
+            for row in rows.itertuples()
+        }
+        mean_strength = float(rows['strength'].mean())
+        prediction_doc = {
+            'status': 'success',
+            'category': category,
+            'horizon': horizon,
+            'overview': {
+                'average_score': round(float(rows['score'].mean()), 1),
+                'trend': '▲' if mean_strength > TREND_DEADBAND else '▼' if mean_strength < -TREND_DEADBAND else '→',
+                'total_assets': len(rows),
+                'bullish_count': int((rows['trend'] == '▲').sum()),
+                'bearish_count': int((rows['trend'] == '▼').sum())
+            },
+            'predictions': predictions,
+            'metadata': {
+                'timestamp': timestamp,
+                'data_source': 'uptrendr_ml_batch',
+                'interval_method': 'normalized_split_conformal',
+                'data_through': pd.Timestamp(rows['timestamp'].max()).to_pydatetime()
+            }
+        }
+        
+        # Only categories whose content changed are rewritten, stamped with the new version
+        content_hash = prediction_content_hash(prediction_doc)
+        if published_categories.get(category, {}).get('content_hash') == content_hash:
+            continue
+        prediction_doc['metadata'].update(version=version, content_hash=content_hash)
+        batch.set(predictions_ref.collection(category).document('latest'), prediction_doc)
+        changed[category] = {'version': version, 'content_hash': content_hash, 'updated_at': timestamp}
+    
+    manifest_update = {'input_fingerprint': fingerprint, 'last_scored': timestamp}
+    if changed:
+        manifest_update.update(version=version, categories={**published_categories, **changed}, last_published=timestamp)
+    batch.set(predictions_ref, manifest_update, merge=True)
+    batch.commit()
+    
+    unchanged = sorted(set(results['category'].unique()) - set(changed))
+    logger.info(f"✅ Scored {len(results)} {horizon} predictions, published {len(changed)} changed categories "
+                f"as version {manifest_update.get('version', version - 1)} ({len(unchanged)} unchanged)")
+    return {
+        "success": True,
+        "horizon": horizon,
+        "symbols_scored": len(results),
+        "version": manifest_update.get('version', version - 1),
+        "categories": sorted(changed),
+        "categories_unchanged": unchanged,
+        "timestamp": timestamp.isoformat()
+    }
+
+def run_incremental_update(horizon: str, fingerprint: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Apply factor rows added since the last run to the latest model (None falls back to a full retrain)"""
+    model_ref = db.collection('trained_models').document(horizon)
+    model_doc = model_ref.get()
+    if not model_doc.exists:
+        logger.info(f"No trained model for {horizon} yet, running full retrain")
+        return None
+    
+    model_info = model_doc.to_dict()
+    if model_info.get('shard_by', 'pooled') != 'pooled':
+        logger.info(f"Sharded models for {horizon} are retrained in full")
+        return None
+    
+    data_through = model_info.get('data_through')
+    if not data_through:
+        return None
+    
+    new_docs = list(db.collection('historical_factors').where('timestamp', '>', data_through).stream())
+    if not new_docs:
+        logger.info(f"✅ No new factor rows for {horizon} since {data_through}")
+        return {
+            "success": True,
+            "horizon": horizon,
+            "mode": "incremental",
+            "samples_processed": 0,
+            "gcs_blob": model_info['gcs_blob_name'],
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    
+    df = pd.DataFrame([doc.to_dict() for doc in new_docs])
+    if 'horizon' in df.columns and (df['horizon'] == horizon).any():
+        df = df[df['horizon'] == horizon]
+    
+    model_data = ml_engine.load_model_from_gcs(model_info['gcs_blob_name'])
+    if not model_data or not model_data.get('training_state'):
+        return None
+    
+    feature_cols = model_data['training_state']['feature_columns']
+    if 'actual_return' not in df.columns or any(col not in df.columns for col in feature_cols):
+        return None
+    
+    update = ml_engine.update_models(model_data, df[feature_cols], df['actual_return'], horizon)
+    if update is None:
+        return None
+    
+    gcs_blob_name = ml_engine.save_model_to_gcs(
+        model_data['trained_models'], model_data['scaler'],
+        model_data['feature_selector'], model_data['selected_features'], horizon,
+        training_state=update['training_state'], quantile_model=model_data.get('quantile_model')
+    )
+    if not gcs_blob_name:
+        return None
+    
+    model_ref.update({
+        'gcs_blob_name': gcs_blob_name,
+        'data_through': pd.Timestamp(df['timestamp'].max()).to_pydatetime(),
+        'training_mode': 'incremental',
+        'incremental_updates': update['training_state']['incremental_updates'],
+        'input_fingerprint': fingerprint or {},
+        'last_updated': datetime.now(timezone.utc)
+    })
+    
+    training_summary = {
+        'timestamp': datetime.now(timezone.utc),
+        'horizon': horizon,
+        'training_samples': update['new_samples'],
+        'performance': model_info.get('model_performance', {}),
+        'status': 'completed',
+        'mode': 'incremental',
+        'updated_models': update['updated_models'],
+        'drift': update['drift'],
+        'gcs_blob': gcs_blob_name,
+        'best_model': model_info.get('best_model_name')
+    }
+    db.collection('ml_training_status').document(f'{horizon}_latest').set(training_summary)
+    
+    return {
+        "success": True,
+        "horizon": horizon,
+        "mode": "incremental",
+        "samples_processed": update['new_samples'],
+        "updated_models": update['updated_models'],
+        "gcs_blob": gcs_blob_name,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
 @functions_framework.http
 def train_1m_models(request):
     """Complete 1M model training with balanced approach"""
@@ -233,6 +1616,7 @@ def train_1m_models(request):
     
     try:
         horizon = '1M'
+        request_json = request.get_json(silent=True) or {}
         
         # Balanced data fetch for 1M (90 days)
         horizon_cutoff = datetime.now(timezone.utc) - timedelta(days=90)
@@ -240,6 +1624,42 @@ def train_1m_models(request):
         if not db:
             logger.error("Firestore not initialized")
             return {"error": "Firestore not available"}
+        
+        # Coordinator fan-out: a task trains part of the roster (and of the shards) and
+        # leaves publishing the Firestore documents to the coordinator's merge step
+        model_names = request_json.get('models')
+        publish = request_json.get('publish', True)
+        scorer = request_json.get('selection_scorer', 'f_regression')
+        low_memory = request_json.get('low_memory', LOW_MEMORY_TRAINING)
+        quantiles = request_json.get('quantiles', False)
+        
+        # Sharded mode fits one roster per asset class or symbol instead of one pooled model
+        shard_by = request_json.get('shard_by', 'pooled')
+        if shard_by not in SHARD_MODES:
+            return {"error": f"Unknown shard_by '{shard_by}', expected one of {list(SHARD_MODES)}"}
+        
+        # Skip the run when the factor rows and training options match the published model's
+        fingerprint = {
+            **training_input_probe(horizon),
+            'config': {'shard_by': shard_by, 'selection_scorer': scorer, 'quantiles': quantiles,
+                       'models': sorted(model_names) if model_names else None}
+        }
+        skip_unchanged = publish and not request_json.get('force', False) and not request_json.get('plan_only')
+        model_ref = db.collection('trained_models').document(horizon)
+        previous_fingerprint = {}
+        if skip_unchanged:
+            model_snapshot = model_ref.get()
+            if model_snapshot.exists:
+                previous_fingerprint = model_snapshot.to_dict().get('input_fingerprint', {})
+            if fingerprint_matches(previous_fingerprint, fingerprint, INPUT_PROBE_KEYS):
+                return unchanged_training_response(horizon, fingerprint)
+        
+        # Incremental mode updates the existing models unless drift forces a full retrain
+        if request_json.get('mode') == 'incremental':
+            incremental_result = run_incremental_update(horizon, fingerprint)
+            if incremental_result is not None:
+                return incremental_result
+            logger.info(f"🔁 Falling back to full retrain for {horizon}")
             
         logger.info(f"🎯 Fetching 90 days of data for {horizon} horizon")
         factors_query = db.collection('historical_factors').where('timestamp', '>=', horizon_cutoff)
@@ -274,19 +1694,54 @@ def train_1m_models(request):
         if len(available_cols) < 3:
             return {"error": f"Insufficient features: {available_cols}"}
         
+        # The probe moved (new, late or deleted rows) but the training rows may still be identical
+        fingerprint['content_hash'] = factor_content_hash(horizon_df, available_cols)
+        if skip_unchanged and fingerprint_matches(previous_fingerprint, fingerprint, CONTENT_KEYS):
+            model_ref.update({'input_fingerprint': fingerprint})
+            return unchanged_training_response(horizon, fingerprint)
+        
+        if shard_by != 'pooled':
+            if request_json.get('plan_only'):
+                if 'symbol' not in horizon_df.columns:
+                    return {"error": "Sharded training needs a 'symbol' column"}
+                return {"success": True, "horizon": horizon, "shard_by": shard_by, **plan_shards(horizon_df, shard_by)}
+            return run_sharded_training(horizon_df, available_cols, horizon, shard_by, scorer=scorer,
+                                        shards=request_json.get('shards'), model_names=model_names, publish=publish,
+                                        task_id=request_json.get('task_id'), low_memory=low_memory,
+                                        quantiles=quantiles, fingerprint=fingerprint)
+        
         X = horizon_df[available_cols]
         y = horizon_df['actual_return'] if 'actual_return' in horizon_df.columns else pd.Series(np.random.normal(0, 0.03, len(horizon_df)))
         
         # Train balanced models
-        results = ml_engine.train_models(X, y, horizon)
+        results = ml_engine.train_models(X, y, horizon, scorer=scorer, model_names=model_names,
+                                          low_memory=low_memory, quantiles=quantiles)
         
         # Save to GCS
         if 'trained_models' in results and 'scaler' in results and 'feature_selector' in results:
             gcs_blob_name = ml_engine.save_model_to_gcs(
                 results['trained_models'], results['scaler'], 
-                results['feature_selector'], results['selected_features'], horizon
+                results['feature_selector'], results['selected_features'], horizon,
+                training_state=results['training_state'], task_id=request_json.get('task_id'),
+                quantile_model=results['quantile_model']
             )
             
+            if gcs_blob_name and not publish:
+                return {
+                    "success": True,
+                    "horizon": horizon,
+                    "samples_processed": len(horizon_df),
+                    "best_model": results['best_model'],
+                    "performance": results['performance'],
+                    "model_performances": results['model_performances'],
+                    "models_trained": results['models_trained'],
+                    "memory_report": results['memory_report'],
+                    "gcs_blob": gcs_blob_name,
+                    "data_through": pd.Timestamp(horizon_df['timestamp'].max()).isoformat(),
+                    "content_hash": fingerprint['content_hash'],
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                }
+            
             if gcs_blob_name and db:
                 model_doc = {
                     'horizon': horizon,
@@ -295,10 +1750,14 @@ def train_1m_models(request):
                     'model_performance': results['performance'],
                     'training_samples': len(horizon_df),
                     'models_trained': results['models_trained'],
+                    'data_through': pd.Timestamp(horizon_df['timestamp'].max()).to_pydatetime(),
+                    'training_mode': 'full',
+                    'incremental_updates': 0,
+                    'input_fingerprint': fingerprint,
                     'last_updated': datetime.now(timezone.utc),
                     'version': '2.0'
                 }
-                db.collection('trained_models').document(horizon).set(model_doc)
+                model_ref.set(model_doc)
                 logger.info(f"✅ {horizon} models successfully trained and persisted to GCS")
                 
                 # Store training status
@@ -309,8 +1768,13 @@ def train_1m_models(request):
                     'performance': results['performance'],
                     'status': 'completed',
                     'gcs_blob': gcs_blob_name,
-                    'best_model': results['best_model']
+                    'best_model': results['best_model'],
+                    'input_fingerprint': fingerprint
                 }
+                if results['memory_report']:
+                    training_summary['memory_report'] = results['memory_report']
+                if results['quantile_model']:
+                    training_summary['quantile_metrics'] = results['quantile_model']['cv_metrics']
                 db.collection('ml_training_status').document(f'{horizon}_latest').set(training_summary)
                 
                 return {
@@ -319,6 +1783,7 @@ def train_1m_models(request):
                     "samples_processed": len(horizon_df),
                     "best_model": results['best_model'],
                     "performance": results['performance'],
+                    "memory_report": results['memory_report'],
                     "gcs_blob": gcs_blob_name,
                     "timestamp": datetime.now(timezone.utc).isoformat()
                 }
@@ -344,6 +1809,23 @@ def train_1m_models(request):
         
         return {"error": error_msg}
 
+@functions_framework.http
+def predict_1m_models(request):
+    """Batch 1M predictions with per-asset confidence intervals and risk levels"""
+    logger.info("🔮 Starting 1M batch predictions")
+    
+    try:
+        request_json = request.get_json(silent=True) or {}
+        if not db:
+            logger.error("Firestore not initialized")
+            return {"error": "Firestore not available"}
+        return run_batch_predictions('1M', force=request_json.get('force', False))
+    
+    except Exception as e:
+        error_msg = f"Error predicting 1M: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {"error": error_msg}
+
 # For local testing
 if __name__ == "__main__":
     class MockRequest:
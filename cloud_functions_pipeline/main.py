@@ -0,0 +1,231 @@
+"""
+Nightly ML Pipeline DAG Runner
+
+One Cloud Scheduler job triggers run_pipeline, which starts every stage as
+soon as its upstream stages complete instead of waiting for a fixed cron
+offset. Independent stages (the four data fetches, the three horizons) run
+concurrently, a failed stage skips everything downstream of it, and each
+run is recorded in pipeline_executions/{run_id}. Stages whose input
+fingerprint is unchanged skip themselves and report `unchanged`, which
+satisfies their dependents like a completed stage.
+"""
+
+import os
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Any, Optional, Callable
+
+import requests
+from google.cloud import firestore
+from google.auth.transport.requests import Request as AuthRequest
+from google.oauth2 import id_token
+import functions_framework
+
+# Initialize logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Initialize Firestore
+try:
+    db = firestore.Client()
+    logger.info("✅ Firestore initialized successfully")
+except Exception as e:
+    logger.error(f"❌ Failed to initialize Firestore: {e}")
+    db = None
+
+FUNCTIONS_BASE_URL = os.environ.get('PIPELINE_FUNCTIONS_URL', 'https://asia-northeast1-uptrendr-jp.cloudfunctions.net')
+STAGE_TIMEOUT = 540
+MAX_CONCURRENT_STAGES = 8
+SATISFIED_STATUSES = ('completed', 'unchanged')
+
+# Stage -> Cloud Function and the stages that must complete first
+PIPELINE_STAGES = {
+    'fetch_market_data': {'function': 'fetch_market_data_daily', 'depends_on': []},
+    'fetch_sentiment_data': {'function': 'fetch_sentiment_data_daily', 'depends_on': []},
+    'fetch_macro_data': {'function': 'fetch_macro_data_daily', 'depends_on': []},
+    'fetch_esg_data': {'function': 'fetch_esg_data_daily', 'depends_on': []},
+    'create_historical_factors': {
+        'function': 'create_historical_factors_daily',
+        'depends_on': ['fetch_market_data', 'fetch_sentiment_data', 'fetch_macro_data', 'fetch_esg_data']
+    },
+    'train_1W': {'function': 'train_1w_models', 'depends_on': ['create_historical_factors']},
+    'train_1M': {'function': 'train_1m_models', 'depends_on': ['create_historical_factors']},
+    'train_6M': {'function': 'train_6m_models', 'depends_on': ['create_historical_factors']},
+    'predict_1W': {'function': 'predict_1w_models', 'depends_on': ['train_1W']},
+    'predict_1M': {'function': 'predict_1m_models', 'depends_on': ['train_1M']},
+    'predict_6M': {'function': 'predict_6m_models', 'depends_on': ['train_6M']},
+    'materialize_snapshots': {
+        'function': 'materialize_app_snapshots',
+        'depends_on': ['predict_1W', 'predict_1M', 'predict_6M']
+    },
+    'apply_retention': {'function': 'apply_retention_policies', 'depends_on': ['create_historical_factors']}
+}
+
+
+class HttpStageInvoker:
+    """Calls a stage's Cloud Function over HTTP with a Google-signed identity token"""
+
+    def __init__(self, base_url: str = FUNCTIONS_BASE_URL, timeout: int = STAGE_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def __call__(self, function: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        url = f"{self.base_url}/{function}"
+        headers = {}
+        try:
+            headers['Authorization'] = f"Bearer {id_token.fetch_id_token(AuthRequest(), url)}"
+        except Exception as e:
+            logger.warning(f"⚠️ No identity token for {function}, calling unauthenticated: {e}")
+
+        response = requests.post(url, json=payload, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+def _result_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Scalar fields of a stage response, small enough to keep on the execution doc"""
+    return {key: value for key, value in result.items() if isinstance(value, (str, int, float, bool))}
+
+
+class PipelineRunner:
+    """Runs the stage DAG, launching each stage the moment its dependencies complete"""
+
+    def __init__(self, stages: Dict[str, Dict[str, Any]], invoke: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+                 db, max_workers: int = MAX_CONCURRENT_STAGES):
+        self.stages = stages
+        self.invoke = invoke
+        self.db = db
+        self.max_workers = max_workers
+
+    def _run_stage(self, name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = self.invoke(self.stages[name]['function'], payload)
+            status = 'failed' if 'error' in result else 'unchanged' if result.get('skipped') else 'completed'
+        except Exception as e:
+            result, status = {'error': str(e)}, 'failed'
+        return {'status': status, 'result': result, 'duration_s': round(time.perf_counter() - started, 2)}
+
+    def critical_path(self, records: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Walk back from the last stage to finish through the dependency that finished last"""
+        finished = {name: r for name, r in records.items() if r.get('finished_at')}
+        if not finished:
+            return []
+        path = [max(finished, key=lambda name: finished[name]['finished_at'])]
+        while True:
+            upstream = [d for d in self.stages[path[-1]]['depends_on'] if d in finished]
+            if not upstream:
+                return path[::-1]
+            path.append(max(upstream, key=lambda name: finished[name]['finished_at']))
+
+    def run(self, trigger: str = 'scheduler', only: Optional[List[str]] = None,
+            payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute the DAG (or the `only` subset, treating stages outside it as done)"""
+        run_id = f"{datetime.now(timezone.utc):%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+        selected = [name for name in self.stages if only is None or name in only]
+        records = {name: {'status': 'pending'} for name in selected}
+        execution_ref = self.db.collection('pipeline_executions').document(run_id)
+        execution_ref.set({
+            'run_id': run_id,
+            'trigger': trigger,
+            'status': 'running',
+            'started_at': datetime.now(timezone.utc),
+            'stages': records
+        })
+        logger.info(f"🚀 Pipeline run {run_id}: {len(selected)} stages")
+
+        def record(name: str, **fields) -> None:
+            records[name].update(fields)
+            execution_ref.update({f'stages.{name}': records[name]})
+
+        def satisfied(dependency: str) -> bool:
+            return dependency not in records or records[dependency]['status'] in SATISFIED_STATUSES
+
+        run_started = time.perf_counter()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                # Skip what can no longer run, launch what just became ready
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name in selected:
+                        if records[name]['status'] != 'pending':
+                            continue
+                        dependencies = self.stages[name]['depends_on']
+                        blocked = [d for d in dependencies if d in records and records[d]['status'] in ('failed', 'skipped')]
+                        if blocked:
+                            record(name, status='skipped', reason=f"upstream {', '.join(blocked)} did not complete")
+                            progressed = True
+                        elif all(satisfied(d) for d in dependencies):
+                            record(name, status='running', started_at=datetime.now(timezone.utc),
+                                   offset_s=round(time.perf_counter() - run_started, 2))
+                            running[pool.submit(self._run_stage, name, payload or {})] = name
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    outcome = future.result()
+                    record(name, status=outcome['status'], finished_at=datetime.now(timezone.utc),
+                           duration_s=outcome['duration_s'], result=_result_summary(outcome['result']))
+                    log = logger.error if outcome['status'] == 'failed' else logger.info
+                    log(f"{'❌' if outcome['status'] == 'failed' else '✅'} {name} {outcome['status']} in {outcome['duration_s']}s")
+
+        path = self.critical_path(records)
+        statuses = [r['status'] for r in records.values()]
+        summary = {
+            'status': 'completed' if all(s in SATISFIED_STATUSES for s in statuses) else 'failed',
+            'finished_at': datetime.now(timezone.utc),
+            'elapsed_s': round(time.perf_counter() - run_started, 2),
+            'stage_seconds': round(sum(r.get('duration_s', 0) for r in records.values()), 2),
+            'critical_path': path,
+            'critical_path_s': round(sum(records[name]['duration_s'] for name in path), 2),
+            'unchanged_stages': [name for name, r in records.items() if r['status'] == 'unchanged'],
+            'failed_stages': [name for name, r in records.items() if r['status'] == 'failed'],
+            'skipped_stages': [name for name, r in records.items() if r['status'] == 'skipped']
+        }
+        execution_ref.update(summary)
+        logger.info(f"🏁 Pipeline run {run_id} {summary['status']} in {summary['elapsed_s']}s "
+                    f"(critical path {' → '.join(path)}: {summary['critical_path_s']}s)")
+
+        return {**summary, 'run_id': run_id, 'finished_at': summary['finished_at'].isoformat()}
+
+
+@functions_framework.http
+def run_pipeline(request):
+    """Run the nightly pipeline DAG (optionally a subset via {"stages": [...]})"""
+    request_json = request.get_json(silent=True) or {}
+
+    if not db:
+        logger.error("Firestore not initialized")
+        return {"error": "Firestore not available"}
+
+    only = request_json.get('stages')
+    unknown = sorted(set(only or []) - set(PIPELINE_STAGES))
+    if unknown:
+        return {"error": f"Unknown stages: {unknown}"}
+
+    try:
+        runner = PipelineRunner(PIPELINE_STAGES, HttpStageInvoker(), db)
+        return runner.run(trigger=request_json.get('trigger', 'scheduler'), only=only,
+                          payload=request_json.get('payload'))
+    except Exception as e:
+        error_msg = f"Error running pipeline: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {"error": error_msg}
+
+
+# For local testing
+if __name__ == "__main__":
+    class MockRequest:
+        def get_json(self, silent=True):
+            return {}
+
+    result = run_pipeline(MockRequest())
+    print(f"Result: {result}")
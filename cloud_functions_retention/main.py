@@ -0,0 +1,278 @@
+"""
+Raw Time-Series Retention
+
+Keeps the hot query ranges of the raw collections small while long-horizon
+history stays available in compacted form. Each policy keeps `hot_days` of
+raw documents untouched. Older documents are rolled up per group (symbol,
+or symbol × horizon) into one document per week or month in
+{collection}_rollups, then expired:
+
+- ttl    - stamp `expire_at` (now + EXPIRY_GRACE_DAYS) and let the Firestore
+           TTL policy on that field delete them (see deploy_ml_pipeline.sh)
+- delete - delete them directly in batches, for projects without TTL enabled
+
+Only whole periods older than the hot window are rolled up, so a rollup
+document never changes once written. Progress is tracked per collection in
+config/retention as `rolled_through`, and each run covers at most
+MAX_PERIODS_PER_RUN periods so the first run over years of history stays
+within the function timeout.
+"""
+
+import os
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional
+
+from google.cloud import firestore
+import functions_framework
+
+# Initialize logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Initialize Firestore
+try:
+    db = firestore.Client()
+    logger.info("✅ Firestore initialized successfully")
+except Exception as e:
+    logger.error(f"❌ Failed to initialize Firestore: {e}")
+    db = None
+
+EXPIRY_MODE = os.environ.get('RETENTION_EXPIRY', 'ttl')  # 'ttl' or 'delete'
+EXPIRY_GRACE_DAYS = 7
+MAX_PERIODS_PER_RUN = 26
+BATCH_LIMIT = 500  # Firestore writes per batch
+
+# hot_days must cover the longest timestamp range any reader queries:
+# the 6M trainer reads 180 days of historical_factors, the factor builder 30 days of market_data
+RETENTION_POLICIES = {
+    'market_data': {
+        'hot_days': 400,
+        'period': 'weekly',
+        'group_by': ('symbol',),
+        'aggregates': {'open': 'first', 'high': 'max', 'low': 'min', 'price': 'last', 'close_price': 'last',
+                       'volume': 'sum', 'volatility': 'mean', 'fundamental_score': 'mean', 'technical_score': 'mean'}
+    },
+    'technical_analysis': {
+        'hot_days': 120,
+        'period': 'weekly',
+        'group_by': ('symbol',),
+        'aggregates': {'rsi': 'mean', 'technical_score': 'mean', 'price_change_pct': 'sum', 'volume': 'sum'}
+    },
+    'fundamental_analysis': {
+        'hot_days': 400,
+        'period': 'monthly',
+        'group_by': ('symbol',),
+        'aggregates': {'fundamental_score': 'last', 'pe_ratio': 'last', 'price_to_book': 'last',
+                       'trailing_eps': 'last', 'dividend_yield': 'last', 'market_cap': 'last'}
+    },
+    'sentiment_analysis': {
+        'hot_days': 90,
+        'period': 'weekly',
+        'group_by': ('symbol',),  # Market-wide rows have no symbol and roll up under 'all'
+        'aggregates': {'sentiment': 'mean', 'headline_count': 'sum', 'positive_headlines': 'sum',
+                       'negative_headlines': 'sum', 'overall_sentiment': 'mean', 'fear_greed_index': 'mean',
+                       'news_count': 'sum', 'positive_mentions': 'sum', 'negative_mentions': 'sum'}
+    },
+    'historical_factors': {
+        'hot_days': 365,
+        'period': 'monthly',
+        'group_by': ('symbol', 'horizon'),
+        'aggregates': {'fundamental': 'mean', 'technical': 'mean', 'sentiment': 'mean', 'macro': 'mean',
+                       'esg': 'mean', 'actual_return': 'mean', 'price': 'last', 'volatility': 'mean', 'volume': 'sum'}
+    }
+}
+
+AGGREGATORS = {
+    'first': lambda values: values[0],
+    'last': lambda values: values[-1],
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'mean': lambda values: sum(values) / len(values)
+}
+
+
+def period_start(timestamp: datetime, period: str) -> datetime:
+    """Start (UTC midnight) of the week, beginning Monday, or month containing timestamp"""
+    day = timestamp.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown rollup period '{period}'")
+
+
+def next_period(start: datetime, period: str) -> datetime:
+    if period == 'weekly':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def aggregate_rows(rows: List[Dict[str, Any]], aggregates: Dict[str, str]) -> Dict[str, Any]:
+    """Apply each field's aggregator to the rows (oldest first), ignoring missing and non-numeric values"""
+    rolled = {}
+    for field, how in aggregates.items():
+        values = [row[field] for row in rows
+                  if isinstance(row.get(field), (int, float)) and not isinstance(row.get(field), bool)]
+        if values:
+            rolled[field] = float(AGGREGATORS[how](values))
+    return rolled
+
+
+def rollup_id(period: str, key: tuple, start: datetime) -> str:
+    parts = ['all' if value is None else str(value).replace('/', '_') for value in key]
+    return '_'.join([period, *parts, f"{start:%Y%m%d}"])
+
+
+def commit_in_batches(operations: List[tuple]) -> None:
+    """(kind, ref, body) operations, BATCH_LIMIT per commit"""
+    for start in range(0, len(operations), BATCH_LIMIT):
+        batch = db.batch()
+        for kind, ref, body in operations[start:start + BATCH_LIMIT]:
+            if kind == 'set':
+                batch.set(ref, body)
+            elif kind == 'update':
+                batch.update(ref, body)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+
+def apply_policy(name: str, policy: Dict[str, Any], rolled_through: Optional[datetime],
+                 now: datetime, dry_run: bool = False) -> Dict[str, Any]:
+    """Roll up and expire the next whole periods of one collection older than its hot window"""
+    period = policy['period']
+    cutoff = period_start(now - timedelta(days=policy['hot_days']), period)
+    collection = db.collection(name)
+
+    if rolled_through is None:
+        oldest = next(iter(collection.order_by('timestamp').limit(1).stream()), None)
+        if oldest is None:
+            return {'status': 'empty'}
+        rolled_through = period_start(oldest.get('timestamp'), period)
+    if rolled_through >= cutoff:
+        return {'status': 'current', 'rolled_through': rolled_through}
+
+    upper = rolled_through
+    for _ in range(MAX_PERIODS_PER_RUN):
+        if upper >= cutoff:
+            break
+        upper = next_period(upper, period)
+    upper = min(upper, cutoff)
+
+    # Only the fields the rollup needs; the references are all the expiry step uses
+    fields = ['timestamp', *policy['group_by'], *policy['aggregates']]
+    groups, references = {}, []
+    query = (collection.where('timestamp', '>=', rolled_through).where('timestamp', '<', upper)
+             .order_by('timestamp').select(fields))
+    for snapshot in query.stream():
+        row = snapshot.to_dict()
+        key = tuple(row.get(field) for field in policy['group_by'])
+        groups.setdefault((key, period_start(row['timestamp'], period)), []).append(row)
+        references.append(snapshot.reference)
+
+    rollups = db.collection(f"{name}_rollups")
+    operations = []
+    for (key, start), rows in groups.items():
+        operations.append(('set', rollups.document(rollup_id(period, key, start)), {
+            **dict(zip(policy['group_by'], key)),
+            **aggregate_rows(rows, policy['aggregates']),
+            'period': period,
+            'period_start': start,
+            'period_end': next_period(start, period),
+            'timestamp': start,
+            'samples': len(rows),
+            'source_collection': name,
+            'rolled_up_at': now
+        }))
+    # Rollups are committed before any raw row is expired
+    expiry = ([('update', ref, {'expire_at': now + timedelta(days=EXPIRY_GRACE_DAYS)}) for ref in references]
+              if EXPIRY_MODE == 'ttl' else [('delete', ref, None) for ref in references])
+
+    if not dry_run:
+        commit_in_batches(operations)
+        commit_in_batches(expiry)
+
+    logger.info(f"{'🔍' if dry_run else '🗜️'} {name}: {len(references)} rows → {len(operations)} {period} rollups "
+                f"[{rolled_through:%Y-%m-%d}, {upper:%Y-%m-%d})")
+    return {
+        'status': 'rolled_up',
+        'rows': len(references),
+        'rollups': len(operations),
+        'expiry': EXPIRY_MODE,
+        'range': [rolled_through.isoformat(), upper.isoformat()],
+        'rolled_through': upper,
+        'caught_up': upper >= cutoff
+    }
+
+
+def apply_retention(collections: Optional[List[str]] = None, dry_run: bool = False) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    state_ref = db.collection('config').document('retention')
+    state_doc = state_ref.get()
+    state = (state_doc.to_dict() or {}).get('collections', {}) if state_doc.exists else {}
+
+    results = {}
+    for name in collections or list(RETENTION_POLICIES):
+        try:
+            outcome = apply_policy(name, RETENTION_POLICIES[name], state.get(name, {}).get('rolled_through'), now, dry_run)
+        except Exception as e:
+            logger.error(f"❌ Retention failed for {name}: {e}")
+            results[name] = {'status': 'failed', 'error': str(e)}
+            continue
+        if outcome['status'] == 'rolled_up' and not dry_run:
+            state_ref.set({'collections': {name: {'rolled_through': outcome['rolled_through'], 'updated_at': now}}},
+                          merge=True)
+        if 'rolled_through' in outcome:
+            outcome['rolled_through'] = outcome['rolled_through'].isoformat()
+        results[name] = outcome
+
+    failed = [name for name, outcome in results.items() if outcome['status'] == 'failed']
+    rolled = [name for name, outcome in results.items() if outcome['status'] == 'rolled_up']
+    response = {
+        "success": not failed,
+        "dry_run": dry_run,
+        "collections": results,
+        "rows_expired": sum(outcome.get('rows', 0) for outcome in results.values()),
+        "rollups_written": sum(outcome.get('rollups', 0) for outcome in results.values()),
+        "timestamp": now.isoformat()
+    }
+    if failed:
+        response["error"] = f"Retention failed for {', '.join(failed)}"
+    elif not rolled:
+        response["skipped"] = True
+    return response
+
+
+@functions_framework.http
+def apply_retention_policies(request):
+    """Roll up and expire raw time-series documents older than each collection's hot window"""
+    logger.info("🗜️ Starting retention sweep")
+    request_json = request.get_json(silent=True) or {}
+
+    if not db:
+        logger.error("Firestore not initialized")
+        return {"error": "Firestore not available"}
+
+    collections = request_json.get('collections')
+    unknown = sorted(set(collections or []) - set(RETENTION_POLICIES))
+    if unknown:
+        return {"error": f"No retention policy for: {unknown}"}
+
+    try:
+        return apply_retention(collections, dry_run=request_json.get('dry_run', False))
+    except Exception as e:
+        error_msg = f"Error applying retention policies: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {"error": error_msg}
+
+
+# For local testing
+if __name__ == "__main__":
+    class MockRequest:
+        def get_json(self, silent=True):
+            return {'dry_run': True}
+
+    result = apply_retention_policies(MockRequest())
+    print(f"Result: {result}")
@@ -0,0 +1,360 @@
+"""
+App Snapshot Materializer
+
+Runs after batch prediction and denormalizes market_predictions into the
+documents the iOS app reads on launch, so a screen costs one or two reads
+instead of one per horizon × category plus one per favorite:
+
+- app_snapshots/forecast: every horizon × category overview with compact
+  per-asset rows (sorted by score) and top-N bullish/bearish lists
+- users/{userId}/digests/picks: the user's favorites with their forecast
+  on every horizon
+
+Every document is sized against Firestore's 1 MiB limit before writing.
+An oversized forecast snapshot sheds factor breakdowns, then splits into
+app_snapshots/forecast_{horizon} parts, then trims each category to its
+top and bottom assets. `python main.py --check` asserts that sequence on
+synthetic predictions without Firestore.
+"""
+
+import copy
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+from google.cloud import firestore
+import functions_framework
+
+# Initialize logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Initialize Firestore
+try:
+    db = firestore.Client()
+    logger.info("✅ Firestore initialized successfully")
+except Exception as e:
+    logger.error(f"❌ Failed to initialize Firestore: {e}")
+    db = None
+
+HORIZONS = ['1W', '1M', '6M']
+CATEGORIES = ['global_indices', 'fx_pairs', 'us_sectors', 'japanese_sectors']
+TOP_N = 10
+SNAPSHOT_BYTE_BUDGET = 900 * 1024  # Under the 1 MiB document limit, with headroom for the name and index entries
+BATCH_LIMIT = 500                  # Firestore writes per batch
+
+
+def firestore_size(value: Any) -> int:
+    """Stored size of a value under Firestore's document size rules"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, dict):
+        return sum(firestore_size(key) + firestore_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(firestore_size(item) for item in value)
+    if value is None or isinstance(value, bool):
+        return 1
+    return 8  # Numbers and timestamps
+
+
+def compact_asset(slug: str, prediction: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields a forecast row renders, without tags or commentary"""
+    row = {
+        'slug': slug,
+        'symbol': prediction.get('symbol', slug),
+        'score': prediction.get('score'),
+        'trend': prediction.get('trend'),
+        'return': round(float(prediction.get('return', 0.0)), 4),
+        'confidence': prediction.get('confidence'),
+        'risk_level': prediction.get('risk_level')
+    }
+    interval = prediction.get('interval')
+    if interval:
+        row['lower'] = round(float(interval['lower']), 4)
+        row['upper'] = round(float(interval['upper']), 4)
+    if 'prob_up' in prediction:
+        row['prob_up'] = prediction['prob_up']
+    if prediction.get('factors'):
+        row['factors'] = {name: round(float(value), 2) for name, value in prediction['factors'].items()}
+    return row
+
+
+def top_assets(rows: List[Dict[str, Any]], n: int = TOP_N) -> Dict[str, List[Dict[str, Any]]]:
+    ranked = sorted(rows, key=lambda row: row['score'] or 0, reverse=True)
+    reference = lambda row: {key: row[key] for key in ('symbol', 'slug', 'category', 'score', 'trend', 'return')}
+    return {
+        'top_bullish': [reference(row) for row in ranked[:n] if row['trend'] == '▲'],
+        'top_bearish': [reference(row) for row in ranked[::-1][:n] if row['trend'] == '▼']
+    }
+
+
+def load_predictions(horizons: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """market_predictions/{horizon}/{category}/latest for every pair, fetched in one round trip"""
+    refs = {(h, c): db.collection('market_predictions').document(h).collection(c).document('latest')
+            for h in horizons for c in CATEGORIES}
+    path_keys = {ref.path: key for key, ref in refs.items()}
+    predictions = {h: {} for h in horizons}
+    for snapshot in db.get_all(list(refs.values())):
+        if snapshot.exists:
+            h, c = path_keys[snapshot.reference.path]
+            predictions[h][c] = snapshot.to_dict()
+    return predictions
+
+
+def build_horizon(categories: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    horizon_doc, rows = {'categories': {}}, []
+    for category, doc in categories.items():
+        assets = sorted((compact_asset(slug, p) for slug, p in doc.get('predictions', {}).items()),
+                        key=lambda row: row['score'] or 0, reverse=True)
+        horizon_doc['categories'][category] = {
+            'overview': doc.get('overview', {}),
+            'assets': assets,
+            'data_through': doc.get('metadata', {}).get('data_through')
+        }
+        rows.extend({**row, 'category': category} for row in assets)
+    horizon_doc.update(top_assets(rows))
+    return horizon_doc
+
+
+def shed_factors(horizon_doc: Dict[str, Any]) -> None:
+    for category in horizon_doc['categories'].values():
+        for row in category['assets']:
+            row.pop('factors', None)
+
+
+def trim_assets(horizon_doc: Dict[str, Any], keep: int) -> None:
+    """Keep each category's `keep` best and `keep` worst assets; the overview still counts them all"""
+    for category in horizon_doc['categories'].values():
+        assets = category['assets']
+        if len(assets) > 2 * keep:
+            category['assets'] = assets[:keep] + assets[-keep:]
+            category['truncated'] = True
+
+
+def fit_horizon(horizon_doc: Dict[str, Any], budget: int = SNAPSHOT_BYTE_BUDGET) -> Dict[str, Any]:
+    """Trim one horizon part until it fits the budget, halving the kept assets each pass"""
+    keep = max(len(c['assets']) for c in horizon_doc['categories'].values()) if horizon_doc['categories'] else 0
+    while firestore_size(horizon_doc) > budget:
+        keep //= 2
+        if keep < 1:
+            raise ValueError(f"Forecast part is {firestore_size(horizon_doc)} bytes even with one asset per side")
+        trim_assets(horizon_doc, keep)
+    return horizon_doc
+
+
+def plan_forecast_documents(predictions: Dict[str, Dict[str, Dict[str, Any]]], metadata: Dict[str, Any],
+                            budget: int = SNAPSHOT_BYTE_BUDGET) -> Dict[str, Dict[str, Any]]:
+    """Document id -> body for the forecast snapshot, as one doc when it fits and split per horizon otherwise"""
+    horizons = {h: build_horizon(categories) for h, categories in predictions.items() if categories}
+    snapshot = {'layout': 'single', 'horizons': horizons, 'factors_included': True, **metadata}
+    if firestore_size(snapshot) <= budget:
+        return {'forecast': snapshot}
+
+    for horizon_doc in horizons.values():
+        shed_factors(horizon_doc)
+    snapshot['factors_included'] = False
+    if firestore_size(snapshot) <= budget:
+        return {'forecast': snapshot}
+
+    # The index keeps overviews and top lists so launch renders before the part loads
+    index = {
+        'layout': 'split',
+        'parts': {h: f'forecast_{h}' for h in horizons},
+        'horizons': {
+            h: {
+                'overviews': {c: doc['overview'] for c, doc in horizon_doc['categories'].items()},
+                'top_bullish': horizon_doc['top_bullish'],
+                'top_bearish': horizon_doc['top_bearish']
+            }
+            for h, horizon_doc in horizons.items()
+        },
+        'factors_included': False,
+        **metadata
+    }
+    documents = {'forecast': index}
+    for h, horizon_doc in horizons.items():
+        documents[f'forecast_{h}'] = {'horizon': h, **fit_horizon(horizon_doc, budget), **metadata}
+    return documents
+
+
+def check_size_fallbacks(assets_per_category: int = 200) -> None:
+    """Raise AssertionError unless plan_forecast_documents falls back in order and every document fits"""
+    predictions = {
+        h: {
+            c: {
+                'overview': {'average_score': 50.0, 'total_assets': assets_per_category},
+                'metadata': {'data_through': '2026-01-10'},
+                'predictions': {
+                    f'{c}_{i:04d}': {'score': float(i % 100), 'trend': '▲' if i % 2 else '▼', 'return': 0.001 * i,
+                                     'confidence': 0.6, 'risk_level': 'moderate',
+                                     'factors': {'fundamental': 0.5, 'technical': 0.4, 'sentiment': 0.6}}
+                    for i in range(assets_per_category)
+                }
+            }
+            for c in CATEGORIES
+        }
+        for h in HORIZONS
+    }
+    metadata = {'generated_at': '2026-01-10T00:00:00+00:00'}
+
+    def plan(budget: int) -> Dict[str, Dict[str, Any]]:
+        documents = plan_forecast_documents(copy.deepcopy(predictions), metadata, budget)
+        for doc_id, body in documents.items():
+            assert firestore_size(body) <= budget, f"{doc_id} is {firestore_size(body)} bytes over a {budget} budget"
+        return documents
+
+    full = plan(10 ** 9)['forecast']
+    assert full['layout'] == 'single' and full['factors_included'], "a snapshot within budget was reduced"
+    shed = copy.deepcopy(full)
+    for horizon_doc in shed['horizons'].values():
+        shed_factors(horizon_doc)
+
+    single = plan(firestore_size(full) - 1)['forecast']
+    assert single['layout'] == 'single' and not single['factors_included'], "factors were not shed first"
+
+    split = plan(firestore_size(shed) - 1)
+    assert split['forecast']['layout'] == 'split' and set(split) == {'forecast'} | {f'forecast_{h}' for h in HORIZONS}, \
+        "an oversized snapshot without factors was not split per horizon"
+    assert not any(c.get('truncated') for h in HORIZONS for c in split[f'forecast_{h}']['categories'].values()), \
+        "parts were trimmed although they fit"
+
+    part_size = max(firestore_size(split[f'forecast_{h}']) for h in HORIZONS)
+    trimmed = plan(part_size // 3)
+    for h in HORIZONS:
+        for category, doc in trimmed[f'forecast_{h}']['categories'].items():
+            scores = [row['score'] for row in doc['assets']]
+            assert doc.get('truncated') and scores == sorted(scores, reverse=True), f"{h}/{category} was not trimmed to its ends"
+            assert doc['overview']['total_assets'] == assets_per_category, "trimming changed the overview counts"
+    logger.info(f"✅ Snapshot fallbacks engage in order: {firestore_size(full):,} B single, "
+                f"{firestore_size(shed):,} B without factors, split parts of {part_size:,} B, trimmed at {part_size // 3:,} B")
+
+
+def load_favorites() -> Dict[str, List[str]]:
+    """user id -> favorite symbols, from one collection group query over users/{userId}/favorites"""
+    favorites = {}
+    for doc in db.collection_group('favorites').stream():
+        user_ref = doc.reference.parent.parent
+        if user_ref is None or user_ref.parent.id != 'users':
+            continue
+        symbol = (doc.to_dict() or {}).get('symbol', doc.id)
+        favorites.setdefault(user_ref.id, []).append(symbol)
+    return favorites
+
+
+def build_picks_digest(symbols: List[str], forecasts: Dict[str, Dict[str, Any]],
+                       metadata: Dict[str, Any], budget: int = SNAPSHOT_BYTE_BUDGET) -> Dict[str, Any]:
+    picks = [{'symbol': symbol, **forecasts[symbol]} for symbol in dict.fromkeys(symbols) if symbol in forecasts]
+    digest = {
+        'picks': picks,
+        'missing': [symbol for symbol in dict.fromkeys(symbols) if symbol not in forecasts],
+        **metadata
+    }
+    while firestore_size(digest) > budget and digest['picks']:
+        digest['picks'] = digest['picks'][:len(digest['picks']) // 2]
+        digest['truncated'] = True
+    return digest
+
+
+def symbol_forecasts(predictions: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """symbol -> category and the compact forecast on every horizon it was scored for"""
+    forecasts = {}
+    for h, categories in predictions.items():
+        for category, doc in categories.items():
+            for slug, prediction in doc.get('predictions', {}).items():
+                entry = forecasts.setdefault(prediction.get('symbol', slug), {'slug': slug, 'category': category, 'forecasts': {}})
+                row = compact_asset(slug, prediction)
+                entry['forecasts'][h] = {key: row[key] for key in ('score', 'trend', 'return', 'confidence', 'risk_level')}
+    return forecasts
+
+
+def commit_in_batches(writes: List[tuple]) -> None:
+    for start in range(0, len(writes), BATCH_LIMIT):
+        batch = db.batch()
+        for ref, body in writes[start:start + BATCH_LIMIT]:
+            batch.set(ref, body)
+        batch.commit()
+
+
+def materialize_snapshots(horizons: Optional[List[str]] = None, force: bool = False) -> Dict[str, Any]:
+    """Rebuild the app snapshots and picks digests from the latest published predictions"""
+    horizons = horizons or HORIZONS
+    snapshots = db.collection('app_snapshots')
+
+    # The horizons' manifest versions identify the inputs; nothing to rebuild on a quiet night
+    # get_all does not return documents in request order, so results are keyed by document id
+    published = {h: None for h in horizons}
+    for snapshot in db.get_all([db.collection('market_predictions').document(h) for h in horizons]):
+        if snapshot.exists:
+            published[snapshot.id] = snapshot.to_dict().get('version')
+    if not force:
+        current = snapshots.document('forecast').get()
+        if current.exists and current.to_dict().get('source') == published:
+            logger.info("⏭️ Predictions unchanged since the last snapshot, skipping materialization")
+            return {
+                "success": True,
+                "skipped": True,
+                "reason": "predictions unchanged",
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+
+    predictions = load_predictions(horizons)
+    if not any(predictions.values()):
+        return {"error": "No published predictions to materialize"}
+
+    generated_at = datetime.now(timezone.utc)
+    metadata = {'generated_at': generated_at, 'source': published}
+    documents = plan_forecast_documents(predictions, metadata)
+    writes = [(snapshots.document(doc_id), body) for doc_id, body in documents.items()]
+
+    forecasts = symbol_forecasts(predictions)
+    favorites = load_favorites()
+    for user_id, symbols in favorites.items():
+        digest = build_picks_digest(symbols, forecasts, {'generated_at': generated_at})
+        writes.append((db.collection('users').document(user_id).collection('digests').document('picks'), digest))
+
+    commit_in_batches(writes)
+    sizes = {doc_id: firestore_size(body) for doc_id, body in documents.items()}
+    logger.info(f"✅ Materialized {len(documents)} forecast snapshot docs ({max(sizes.values())} bytes max) "
+                f"and {len(favorites)} picks digests")
+
+    return {
+        "success": True,
+        "layout": documents['forecast']['layout'],
+        "snapshot_bytes": sizes,
+        "digests_written": len(favorites),
+        "timestamp": generated_at.isoformat()
+    }
+
+
+@functions_framework.http
+def materialize_app_snapshots(request):
+    """Rebuild app_snapshots and per-user picks digests after batch prediction"""
+    logger.info("🧱 Starting app snapshot materialization")
+    request_json = request.get_json(silent=True) or {}
+
+    if not db:
+        logger.error("Firestore not initialized")
+        return {"error": "Firestore not available"}
+
+    try:
+        return materialize_snapshots(request_json.get('horizons'), force=request_json.get('force', False))
+    except Exception as e:
+        error_msg = f"Error materializing app snapshots: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {"error": error_msg}
+
+
+# For local testing
+if __name__ == "__main__":
+    import sys
+
+    if '--check' in sys.argv[1:]:
+        check_size_fallbacks()
+        sys.exit(0)
+
+    class MockRequest:
+        def get_json(self, silent=True):
+            return {}
+
+    result = materialize_app_snapshots(MockRequest())
+    print(f"Result: {result}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+FIRESTORE COLLECTION INVENTORY
+==============================
+
+Exact per-collection statistics in one concurrent pass, without streaming
+whole collections:
+
+- Count   - server-side count() aggregation (billed as one read per 1000
+            index entries, not one per document)
+- Newest  - order_by(<timestamp field>, DESCENDING).limit(SAMPLE_SIZE); the
+            same page doubles as the size sample
+- Oldest  - order_by(<timestamp field>).limit(1)
+- Storage - average sampled document size (Firestore's storage size rules)
+            times the exact count; an estimate that excludes index entries
+
+The timestamp field is the first of TIMESTAMP_FIELDS a collection's
+documents carry. Counts cover each collection's own documents, not nested
+subcollections.
+
+Usage:
+    python collection_inventory.py                  # the 15 expected collections
+    python collection_inventory.py --all            # every root collection
+    python collection_inventory.py market_data --json
+"""
+
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+from google.cloud import firestore
+
+EXPECTED_COLLECTIONS = [
+    'market_data',
+    'technical_analysis',
+    'fundamental_analysis',
+    'sentiment_analysis',
+    'macro_indicators',
+    'esg_scores',
+    'economic_calendar',
+    'japanese_news',
+    'japanese_economics',
+    'historical_factors',
+    'model_weights',
+    'market_predictions',
+    'ml_training_status',
+    'forecast_weights',
+    'trained_models'
+]
+TIMESTAMP_FIELDS = ('timestamp', 'last_updated', 'updated_at')
+SAMPLE_SIZE = 5
+MAX_WORKERS = 16
+
+
+def value_size(value: Any) -> int:
+    """Stored size of a field value under Firestore's document size rules"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(value_size(key) + value_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    if value is None or isinstance(value, bool):
+        return 1
+    if hasattr(value, 'path'):  # DocumentReference
+        return len(value.path.encode('utf-8')) + 1
+    if hasattr(value, 'latitude'):  # GeoPoint
+        return 16
+    return 8  # Numbers and timestamps
+
+
+def document_size(snapshot) -> int:
+    """Document name + fields + 32 bytes of per-document overhead"""
+    name_size = sum(len(segment.encode('utf-8')) + 1 for segment in snapshot.reference.path.split('/')) + 16
+    return name_size + value_size(snapshot.to_dict() or {}) + 32
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _isoformat(value: Any) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else (str(value) if value is not None else None)
+
+
+class CollectionInventory:
+    """Counts, freshness and estimated size of Firestore collections, probed concurrently"""
+
+    def __init__(self, db=None, workers: int = MAX_WORKERS, sample_size: int = SAMPLE_SIZE):
+        self.db = db or firestore.Client()
+        self.workers = workers
+        self.sample_size = sample_size
+
+    def _timestamp_probe(self, collection_ref):
+        """(field, newest-first sample) for the first timestamp field present, else (None, unordered sample)"""
+        for field in TIMESTAMP_FIELDS:
+            sample = list(collection_ref.order_by(field, direction=firestore.Query.DESCENDING)
+                          .limit(self.sample_size).stream())
+            if sample:
+                return field, sample
+        return None, list(collection_ref.limit(self.sample_size).stream())
+
+    def probe(self, name: str) -> Dict[str, Any]:
+        collection_ref = self.db.collection(name)
+        started = time.perf_counter()
+        count = collection_ref.count().get()[0][0].value
+        stats = {'documents': count, 'exists': count > 0, 'timestamp_field': None,
+                 'newest': None, 'oldest': None, 'estimated_bytes': 0, 'avg_document_bytes': 0}
+        if count:
+            field, sample = self._timestamp_probe(collection_ref)
+            if sample:
+                avg_size = sum(document_size(snapshot) for snapshot in sample) / len(sample)
+                stats.update(avg_document_bytes=round(avg_size), estimated_bytes=round(avg_size * count))
+            if field:
+                oldest = next(iter(collection_ref.order_by(field).limit(1).stream()), None)
+                stats.update(timestamp_field=field,
+                             newest=sample[0].get(field),
+                             oldest=oldest.get(field) if oldest else None)
+        stats['probe_s'] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def _safe_probe(self, name: str) -> Dict[str, Any]:
+        try:
+            return self.probe(name)
+        except Exception as e:
+            return {'error': str(e), 'exists': False}
+
+    def run(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Probe the named collections (default: every root collection) in parallel"""
+        names = names or sorted(c.id for c in self.db.collections())
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(names)))) as pool:
+            collections = dict(zip(names, pool.map(self._safe_probe, names)))
+        return {
+            'checked_at': datetime.now(timezone.utc),
+            'elapsed_s': round(time.perf_counter() - started, 2),
+            'collections': collections,
+            'total_documents': sum(stats.get('documents', 0) for stats in collections.values()),
+            'total_estimated_bytes': sum(stats.get('estimated_bytes', 0) for stats in collections.values()),
+            'missing': [name for name, stats in collections.items() if not stats.get('exists')]
+        }
+
+
+def print_report(inventory: Dict[str, Any]) -> None:
+    print(f"📊 {'COLLECTION':<24} {'DOCS':>9} {'SIZE (est.)':>12}  {'NEWEST':<26} OLDEST")
+    print("-" * 100)
+    for name, stats in inventory['collections'].items():
+        if 'error' in stats:
+            print(f"   {name:<24} ERROR: {stats['error']}")
+            continue
+        if not stats['exists']:
+            print(f"   {name:<24} {'EMPTY':>9}")
+            continue
+        newest = _isoformat(stats['newest']) or "(no timestamp field)"
+        print(f"   {name:<24} {stats['documents']:>9,} {format_bytes(stats['estimated_bytes']):>12}  "
+              f"{newest[:26]:<26} {(_isoformat(stats['oldest']) or '')[:26]}")
+    print("-" * 100)
+    print(f"   {'TOTAL':<24} {inventory['total_documents']:>9,} "
+          f"{format_bytes(inventory['total_estimated_bytes']):>12}  "
+          f"({len(inventory['collections'])} collections in {inventory['elapsed_s']}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact Firestore collection counts, freshness and size estimates")
+    parser.add_argument('collections', nargs='*', help="Collections to inventory (default: the 15 expected)")
+    parser.add_argument('--all', action='store_true', help="Inventory every root collection")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--json', action='store_true', help="Print the inventory as JSON")
+    args = parser.parse_args()
+
+    names = None if args.all else (args.collections or EXPECTED_COLLECTIONS)
+    inventory = CollectionInventory(workers=args.workers).run(names)
+    if args.json:
+        print(json.dumps(inventory, indent=2, default=_isoformat))
+    else:
+        print_report(inventory)
+    sys.exit(1 if any('error' in stats for stats in inventory['collections'].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ def main():
         # Import Firebase modules
         from google.cloud import firestore
         from firebase_admin import initialize_app, credentials
+        from firestore_bulk_delete import BulkDeleter
         
         print("✅ Firebase modules imported")
         
@@ -92,35 +93,7 @@ def main():
         print(f"\n🗑️ STEP 1: DELETING TESTING COLLECTIONS")
         print("-" * 50)
         
-        for collection_name in testing_collections:
-            if collection_name in current_collections:
-                try:
-                    print(f"🗑️ Deleting collection: {collection_name}")
-                    
-                    collection_ref = db.collection(collection_name)
-                    docs = collection_ref.stream()
-                    
-                    batch = db.batch()
-                    batch_count = 0
-                    deleted_docs = 0
-                    
-                    for doc in docs:
-                        batch.delete(doc.reference)
-                        batch_count += 1
-                        deleted_docs += 1
-                        
-                        if batch_count >= 450:
-                            batch.commit()
-                            batch = db.batch()
-                            batch_count = 0
-                    
-                    if batch_count > 0:
-                        batch.commit()
-                    
-                    print(f"   ✅ Deleted '{collection_name}' ({deleted_docs} documents)")
-                    
-                except Exception as e:
-                    print(f"   ❌ Error deleting {collection_name}: {e}")
+        BulkDeleter(db).delete_collections([name for name in testing_collections if name in current_collections])
         
         # Step 2: Create missing collections
         missing_collections = [col for col in expected_collections if col not in current_collections or col in testing_collections]
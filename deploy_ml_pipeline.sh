@@ -19,20 +19,32 @@ echo ""
 # Step 1: Deploy Cloud Functions
 echo "1️⃣ DEPLOYING CLOUD FUNCTIONS..."
 echo "Your sophisticated ML functions include:"
-echo "  ├── 🤖 train_ml_models_daily (2:00 AM UTC)"
-echo "  ├── 📊 fetch_market_data_daily (1:00 AM UTC)"  
-echo "  ├── 📰 fetch_sentiment_data_daily (1:15 AM UTC)"
-echo "  ├── 🏛️ fetch_macro_data_daily (1:30 AM UTC)"
-echo "  ├── 🌱 fetch_esg_data_daily (1:45 AM UTC)"
-echo "  ├── 📈 create_historical_factors_daily (12:30 AM UTC)"
-echo "  ├── 🇯🇵 fetch_japanese_data_daily (7:00 AM UTC)"
-echo "  └── 🔮 generate_market_predictions_daily (2:30 AM UTC)"
+echo "  ├── 🧭 run_pipeline (1:00 AM UTC, runs the DAG below)"
+echo "  │   ├── 📊 fetch_market_data_daily / 📰 fetch_sentiment_data_daily"
+echo "  │   ├── 🏛️ fetch_macro_data_daily / 🌱 fetch_esg_data_daily"
+echo "  │   ├── 📈 create_historical_factors_daily (after all fetches)"
+echo "  │   ├── 🤖 train_{1w,1m,6m}_models (after historical factors)"
+echo "  │   ├── 🗜️ apply_retention_policies (after historical factors)"
+echo "  │   ├── 🔮 predict_{1w,1m,6m}_models (after each horizon trains)"
+echo "  │   └── 🧱 materialize_app_snapshots (after all predictions)"
+echo "  └── 🇯🇵 fetch_japanese_data_daily (7:00 AM UTC)"
 echo ""
 
+# Numerical shortcuts and skip rules must still match their references
+echo "Running self-checks..."
+python3 check_training_numerics.py || exit 1
+python3 cloud_functions_snapshots/main.py --check || exit 1
+python3 sentiment_scoring.py --check || exit 1
+
 # Deploy the Python functions
 echo "Deploying Python Cloud Functions..."
 firebase deploy --only functions:uptrendr
 
+# Indexes are generated from the query registry; refuse to deploy a stale file
+echo "Deploying Firestore indexes..."
+python3 firestore_indexes.py --check || exit 1
+firebase deploy --only firestore:indexes --project=$PROJECT_ID
+
 # Step 2: Initialize Firestore Collections
 echo ""
 echo "2️⃣ INITIALIZING FIRESTORE COLLECTIONS..."
@@ -79,6 +91,20 @@ async function initializeCollections() {
 initializeCollections();
 EOF
 
+# Step 2b: TTL policies for retention expiry
+echo ""
+echo "🗜️ ENABLING TTL ON RAW TIME-SERIES COLLECTIONS..."
+echo "apply_retention_policies stamps expire_at on rows it has rolled up"
+
+for collection in market_data technical_analysis fundamental_analysis sentiment_analysis historical_factors; do
+  gcloud firestore fields ttls update expire_at \
+    --collection-group=$collection \
+    --enable-ttl \
+    --project=$PROJECT_ID \
+    --async \
+    --quiet || echo "TTL policy on $collection may already exist"
+done
+
 # Step 3: Set up Cloud Scheduler
 echo ""
 echo "3️⃣ SETTING UP CLOUD SCHEDULER..."
@@ -89,14 +115,8 @@ gcloud services enable cloudscheduler.googleapis.com --project=$PROJECT_ID
 
 # Create scheduler jobs for each function
 scheduler_jobs=(
-  "train-ml-models:0 2 * * *:train_ml_models_daily"
-  "fetch-market-data:0 1 * * *:fetch_market_data_daily"
-  "fetch-sentiment-data:15 1 * * *:fetch_sentiment_data_daily"  
-  "fetch-macro-data:30 1 * * *:fetch_macro_data_daily"
-  "fetch-esg-data:45 1 * * *:fetch_esg_data_daily"
-  "create-historical-factors:30 0 * * *:create_historical_factors_daily"
+  "run-pipeline:0 1 * * *:run_pipeline"
   "fetch-japanese-data:0 7 * * *:fetch_japanese_data_daily"
-  "generate-predictions:30 2 * * *:generate_market_predictions_daily"
 )
 
 for job in "${scheduler_jobs[@]}"; do
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+ESG FACTOR PROVIDER
+===================
+
+Supplies historical_factors.esg from esg_scores without re-reading the
+collection every day:
+
+1. Cache    - per symbol, the change points (timestamp, score) of its ESG
+              score and the newest source timestamp seen; kept in memory for
+              warm instances and, when ESG_CACHE_DIR is set, on disk as JSON
+              stamped with ESG_CACHE_VERSION (a version bump drops the file)
+2. Refresh  - one query for documents at or after the cache's high-water
+              timestamp; only symbols whose source timestamp moved are
+              touched, and a reading equal to the previous score is not stored
+3. Join     - pd.merge_asof by symbol on date, so each factor row gets the
+              score in force on its own date, not today's
+
+Scores are total_esg_score / 100 (the mean of the E, S and G pillars when
+the total is missing). Symbols not re-published within ESG_MAX_AGE_DAYS
+are left out of the join, and rows without a score get a neutral 0.5.
+
+Usage:
+    python esg_factors.py                # refresh the cache and print latest scores
+    python esg_factors.py --rebuild      # ignore the cache and re-read esg_scores
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ESG_CACHE_VERSION = 1   # Bump when the score definition changes
+ESG_MAX_AGE_DAYS = 400  # Symbols not re-published for this long are treated as unscored
+NEUTRAL = 0.5
+PILLAR_FIELDS = ('environmental_score', 'social_score', 'governance_score')
+SOURCE_FIELDS = ['symbol', 'timestamp', 'total_esg_score', *PILLAR_FIELDS]
+
+
+def esg_score(row: Dict[str, Any]) -> Optional[float]:
+    """esg_scores document -> factor value in [0, 1], None when it carries no usable score"""
+    def numeric(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    total = row.get('total_esg_score')
+    if not numeric(total):
+        pillars = [row[field] for field in PILLAR_FIELDS if numeric(row.get(field))]
+        if not pillars:
+            return None
+        total = sum(pillars) / len(pillars)
+    return round(min(max(float(total) / 100, 0.0), 1.0), 4)
+
+
+class ESGFactorCache:
+    """Per-symbol ESG score change points, refreshed incrementally from esg_scores"""
+
+    def __init__(self, cache_dir: Optional[str] = None, rebuild: bool = False):
+        self.path = os.path.join(cache_dir, f"esg_cache_v{ESG_CACHE_VERSION}.json") if cache_dir else None
+        self.symbols: Dict[str, Dict[str, Any]] = {}
+        self.high_water: Optional[datetime] = None
+        self.stats = {'documents_read': 0, 'symbols_refreshed': 0}
+        if not rebuild:
+            self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable ESG cache {self.path}: {e}")
+            return
+        if stored.get('version') != ESG_CACHE_VERSION:
+            return
+        self.symbols = {symbol: {'source_timestamp': datetime.fromisoformat(entry['source_timestamp']),
+                                 'history': [(datetime.fromisoformat(ts), score) for ts, score in entry['history']]}
+                        for symbol, entry in stored['symbols'].items()}
+        self.high_water = datetime.fromisoformat(stored['high_water']) if stored.get('high_water') else None
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': ESG_CACHE_VERSION,
+                'high_water': self.high_water.isoformat() if self.high_water else None,
+                'symbols': {symbol: {'source_timestamp': entry['source_timestamp'].isoformat(),
+                                     'history': [[ts.isoformat(), score] for ts, score in entry['history']]}
+                            for symbol, entry in self.symbols.items()}
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, db) -> List[str]:
+        """Read esg_scores written since the high-water mark; returns the symbols whose scores were updated"""
+        collection = db.collection('esg_scores')
+        # >= rather than > so a document sharing the high-water timestamp but written later is not missed
+        query = collection.where('timestamp', '>=', self.high_water) if self.high_water else collection
+        readings = {}
+        for snapshot in query.select(SOURCE_FIELDS).stream():
+            self.stats['documents_read'] += 1
+            row = snapshot.to_dict()
+            if not row.get('symbol') or not isinstance(row.get('timestamp'), datetime):
+                continue
+            score = esg_score(row)
+            if score is not None:
+                readings.setdefault(row['symbol'], []).append((row['timestamp'], score))
+
+        refreshed = []
+        for symbol, points in readings.items():
+            entry = self.symbols.setdefault(symbol, {'source_timestamp': None, 'history': []})
+            if entry['source_timestamp'] is not None and max(ts for ts, _ in points) <= entry['source_timestamp']:
+                continue
+            for timestamp, score in sorted(points):
+                if entry['source_timestamp'] is not None and timestamp <= entry['source_timestamp']:
+                    continue
+                if not entry['history'] or entry['history'][-1][1] != score:
+                    entry['history'].append((timestamp, score))
+                entry['source_timestamp'] = timestamp
+            refreshed.append(symbol)
+
+        if refreshed:
+            self.high_water = max(entry['source_timestamp'] for entry in self.symbols.values())
+            self._save()
+        self.stats['symbols_refreshed'] += len(refreshed)
+        logger.info(f"🌱 ESG cache: {len(readings)} symbols read, {len(refreshed)} refreshed, "
+                    f"{len(self.symbols)} cached")
+        return refreshed
+
+    def latest(self) -> Dict[str, float]:
+        return {symbol: entry['history'][-1][1] for symbol, entry in self.symbols.items() if entry['history']}
+
+    def frame(self, max_age_days: int = ESG_MAX_AGE_DAYS) -> pd.DataFrame:
+        """Long (date, symbol, esg) frame of the cached change points, sorted by date for merge_asof"""
+        # Age is measured from the last publish, not the last change: a score re-confirmed daily stays live
+        stale_before = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        records = [(timestamp, symbol, score) for symbol, entry in self.symbols.items()
+                   if entry['source_timestamp'] >= stale_before
+                   for timestamp, score in entry['history']]
+        frame = pd.DataFrame(records, columns=['date', 'symbol', 'esg'])
+        frame['date'] = pd.to_datetime(frame['date'], utc=True).astype('datetime64[ns, UTC]')
+        return frame.sort_values('date')
+
+
+# Shared across calls so warm instances only read documents newer than their cache
+esg_cache = ESGFactorCache(os.environ.get('ESG_CACHE_DIR'))
+
+
+def esg_as_of(dates: pd.Series, symbols: pd.Series, scores: pd.DataFrame) -> np.ndarray:
+    """Each symbol's score in force at each date, in one as-of merge by symbol; neutral where unscored"""
+    if scores.empty:
+        return np.full(len(dates), NEUTRAL)
+    frame = pd.DataFrame({'position': np.arange(len(dates)),
+                          'date': pd.to_datetime(pd.Series(dates).to_numpy(), utc=True).astype('datetime64[ns, UTC]'),
+                          'symbol': pd.Series(symbols).to_numpy().astype(str)})
+    merged = pd.merge_asof(frame.sort_values('date'), scores.astype({'symbol': str}), on='date', by='symbol',
+                           direction='backward').sort_values('position')
+    return np.nan_to_num(merged['esg'].to_numpy(dtype=float), nan=NEUTRAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the ESG factor cache from esg_scores")
+    parser.add_argument('--rebuild', action='store_true', help="Discard cached scores and re-read everything")
+    args = parser.parse_args()
+
+    from google.cloud import firestore
+    cache = ESGFactorCache(os.environ.get('ESG_CACHE_DIR'), rebuild=args.rebuild)
+    cache.refresh(firestore.Client())
+    for symbol, score in sorted(cache.latest().items()):
+        print(f"{symbol:<12} {score:.4f}  (as of {cache.symbols[symbol]['source_timestamp']:%Y-%m-%d})")
+    print(cache.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+FACTOR ASSEMBLY
+===============
+
+Builds historical_factors for every horizon from the raw collections in
+one pass, instead of reading factor columns off market_data row by row:
+
+1. Refresh  - derived sources first: headline sentiment (sentiment_scoring),
+              daily macro scores (macro_factors), the ESG cache (esg_factors)
+2. Load     - each source once, projected to the fields used and bounded by
+              timestamp: market_data (prices back to the longest horizon's
+              lookback), technical_analysis, sentiment_analysis, plus the
+              fundamentals snapshots, macro scores and ESG change points
+3. Grid     - one row per symbol × trading day in the window; volatility is
+              the point-in-time OHLC estimate from volatility.py, computed
+              for all symbols in one grouped pass
+4. Join     - every factor is a pd.merge_asof by symbol on date against its
+              source, so a row only sees data published on or before it
+5. Returns  - the grid is stacked once per horizon and the past prices for
+              all horizons come from a single as-of merge
+6. Emit     - historical_factors/{symbol}_{horizon}_{YYYYMMDD} (re-runs
+              overwrite instead of duplicating), and the same matrix as a
+              columnar .npz snapshot in Cloud Storage for bulk readers
+
+Usage:
+    python factor_assembly.py                       # assemble the last 30 days and publish
+    python factor_assembly.py --dry-run             # assemble and print a summary only
+    python factor_assembly.py --output factors.npz  # write the snapshot locally instead of to GCS
+"""
+
+import io
+import argparse
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from sentiment_scoring import score_news
+from macro_factors import publish_macro_factors, load_macro_factors, macro_as_of
+from esg_factors import esg_cache, esg_as_of
+from fundamentals_store import FundamentalsStore, MAX_SNAPSHOT_AGE_DAYS, point_in_time_scores
+from volatility import DEFAULT_ESTIMATOR, estimate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = 30
+HORIZON_LOOKBACK_DAYS = {'1W': 7, '1M': 30, '6M': 180}
+TECHNICAL_CARRY_DAYS = 3      # Bridges weekends and holidays
+SENTIMENT_CARRY_DAYS = 7
+DEFAULT_VOLATILITY = 20.0     # Annualized %, used until a symbol has enough history
+NEUTRAL = 0.5
+BATCH_LIMIT = 400
+SNAPSHOT_BUCKET = 'uptrendr-models'
+SNAPSHOT_BLOB = 'factor_snapshots/historical_factors.npz'
+
+FACTOR_COLUMNS = ['fundamental', 'technical', 'sentiment', 'macro', 'esg']
+VALUE_COLUMNS = [*FACTOR_COLUMNS, 'actual_return', 'price', 'volatility']
+
+# Collection -> projected fields; each is read once per run, bounded by timestamp
+SOURCES = {
+    'market_data': ['symbol', 'timestamp', 'open', 'high', 'low', 'price', 'volume', 'technical_score'],
+    'technical_analysis': ['symbol', 'timestamp', 'technical_score'],
+    'sentiment_analysis': ['symbol', 'timestamp', 'sentiment']
+}
+
+
+def load_source(db, collection: str, since: datetime) -> pd.DataFrame:
+    """Projected rows of one source since `since` as a (date, symbol, fields...) frame sorted by date"""
+    fields = SOURCES[collection]
+    query = db.collection(collection).where('timestamp', '>=', since).select(fields)
+    frame = pd.DataFrame([snapshot.to_dict() for snapshot in query.stream()], columns=fields)
+    # Market-wide rows (no symbol) have nothing to join on
+    frame = frame.dropna(subset=['symbol', 'timestamp'])
+    frame['date'] = pd.to_datetime(frame.pop('timestamp'), utc=True).astype('datetime64[ns, UTC]')
+    frame['symbol'] = frame['symbol'].astype(str)
+    return frame.sort_values('date').reset_index(drop=True)
+
+
+def as_of(grid: pd.DataFrame, source: pd.DataFrame, column: str, carry_days: int) -> np.ndarray:
+    """Latest non-null `column` per symbol on or before each grid date within carry_days; NaN otherwise"""
+    source = source[['date', 'symbol', column]].dropna()
+    if source.empty:
+        return np.full(len(grid), np.nan)
+    merged = pd.merge_asof(grid[['date', 'symbol']].assign(position=np.arange(len(grid))).sort_values('date'),
+                           source.astype({column: float}), on='date', by='symbol', direction='backward',
+                           tolerance=pd.Timedelta(days=carry_days)).sort_values('position')
+    return merged[column].to_numpy(dtype=float)
+
+
+def assemble_factors(db, window_days: int = WINDOW_DAYS, now: Optional[datetime] = None) -> pd.DataFrame:
+    """Factor matrix (symbol, horizon, date, factors..., actual_return, price, volatility, volume) for all horizons"""
+    now = now or datetime.now(timezone.utc)
+    window_start = now - timedelta(days=window_days)
+    history_start = window_start - timedelta(days=max(HORIZON_LOOKBACK_DAYS.values()) + 7)
+
+    market = load_source(db, 'market_data', history_start)
+    market['date'] = market['date'].dt.normalize()
+    market = (market.dropna(subset=['price']).drop_duplicates(['symbol', 'date'], keep='last')
+              .sort_values(['symbol', 'date']).reset_index(drop=True))
+    market['volatility'] = estimate(DEFAULT_ESTIMATOR, market['price'], high=market['high'], low=market['low'],
+                                    open_=market['open'], groups=market['symbol'])
+
+    grid = market[market['date'] >= window_start].reset_index(drop=True)
+    if grid.empty:
+        return pd.DataFrame(columns=['symbol', 'horizon', 'date', *VALUE_COLUMNS, 'volume'])
+    logger.info(f"🧮 Assembling {len(grid)} symbol-days ({grid['symbol'].nunique()} symbols) "
+                f"from {len(market)} market_data rows")
+
+    technical = load_source(db, 'technical_analysis', window_start - timedelta(days=TECHNICAL_CARRY_DAYS))
+    sentiment = load_source(db, 'sentiment_analysis', window_start - timedelta(days=SENTIMENT_CARRY_DAYS))
+    snapshots = FundamentalsStore(db).load(window_start - timedelta(days=MAX_SNAPSHOT_AGE_DAYS))
+    macro = load_macro_factors(db, window_start - timedelta(days=7))
+
+    # market_data.technical_score backs up days technical_analysis has not covered
+    technical_score = pd.Series(as_of(grid, technical, 'technical_score', TECHNICAL_CARRY_DAYS))
+    grid['technical'] = technical_score.fillna(grid['technical_score'].astype(float)).fillna(NEUTRAL).to_numpy()
+    grid['sentiment'] = np.nan_to_num(as_of(grid, sentiment, 'sentiment', SENTIMENT_CARRY_DAYS), nan=NEUTRAL)
+    grid['fundamental'] = point_in_time_scores(grid[['date', 'symbol', 'price']], snapshots)['fundamental_score'].to_numpy()
+    grid['macro'] = macro_as_of(grid['date'], grid['symbol'], macro)
+    grid['esg'] = esg_as_of(grid['date'], grid['symbol'], esg_cache.frame())
+    grid['volatility'] = grid['volatility'].fillna(DEFAULT_VOLATILITY)
+
+    # Every horizon's past price in one as-of merge over the stacked grid
+    stacked = pd.concat([grid.assign(horizon=horizon, lookup=grid['date'] - pd.Timedelta(days=days))
+                         for horizon, days in HORIZON_LOOKBACK_DAYS.items()], ignore_index=True)
+    past = market[['symbol', 'date', 'price']].rename(columns={'date': 'lookup', 'price': 'past_price'})
+    factors = pd.merge_asof(stacked.sort_values('lookup'), past.sort_values('lookup'), on='lookup', by='symbol',
+                            direction='backward')
+    factors = factors[factors['past_price'] > 0]
+    factors['actual_return'] = ((factors['price'] - factors['past_price']) / factors['past_price']).clip(-0.5, 0.5)
+    factors['volume'] = factors['volume'].fillna(0).astype(np.int64)
+
+    factors = factors[['symbol', 'horizon', 'date', *VALUE_COLUMNS, 'volume']]
+    return factors.sort_values(['horizon', 'symbol', 'date']).reset_index(drop=True)
+
+
+def write_factors(db, factors: pd.DataFrame) -> int:
+    """historical_factors/{symbol}_{horizon}_{YYYYMMDD}, so a re-run replaces rather than duplicates
+
+    Every row carries the run's updated_at, which the trainers' input probe reads to see in-place rewrites.
+    """
+    collection = db.collection('historical_factors')
+    updated_at = datetime.now(timezone.utc)
+    batch, pending = db.batch(), 0
+    for row in factors.itertuples(index=False):
+        batch.set(collection.document(f"{row.symbol}_{row.horizon}_{row.date:%Y%m%d}"), {
+            'symbol': row.symbol,
+            'horizon': row.horizon,
+            'timestamp': row.date.to_pydatetime(),
+            **{column: float(getattr(row, column)) for column in VALUE_COLUMNS},
+            'volume': int(row.volume),
+            'source': 'factor_assembly',
+            'updated_at': updated_at
+        })
+        pending += 1
+        if pending >= BATCH_LIMIT:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    return len(factors)
+
+
+def columnar_snapshot(factors: pd.DataFrame) -> bytes:
+    """The factor matrix as a compressed .npz, one array per column"""
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        symbol=factors['symbol'].to_numpy(dtype=str),
+        horizon=factors['horizon'].to_numpy(dtype=str),
+        timestamp=factors['date'].dt.tz_localize(None).to_numpy(dtype='datetime64[ns]'),
+        volume=factors['volume'].to_numpy(dtype=np.int64),
+        **{column: factors[column].to_numpy(dtype=np.float64) for column in VALUE_COLUMNS}
+    )
+    return buffer.getvalue()
+
+
+def load_columnar_snapshot(data: bytes) -> pd.DataFrame:
+    """Inverse of columnar_snapshot; timestamps come back as UTC"""
+    arrays = np.load(io.BytesIO(data))
+    frame = pd.DataFrame({name: arrays[name] for name in arrays.files})
+    frame['timestamp'] = frame['timestamp'].dt.tz_localize('UTC')
+    return frame
+
+
+def publish_snapshot(data: bytes, output: Optional[str] = None, storage_client=None) -> str:
+    """Write the snapshot to a local path, or to gs://SNAPSHOT_BUCKET/SNAPSHOT_BLOB"""
+    if output:
+        with open(output, 'wb') as f:
+            f.write(data)
+        return output
+    if storage_client is None:
+        from google.cloud import storage
+        storage_client = storage.Client()
+    storage_client.bucket(SNAPSHOT_BUCKET).blob(SNAPSHOT_BLOB).upload_from_file(
+        io.BytesIO(data), content_type='application/octet-stream')
+    return f"gs://{SNAPSHOT_BUCKET}/{SNAPSHOT_BLOB}"
+
+
+def run_assembly(db, window_days: int = WINDOW_DAYS, dry_run: bool = False, snapshot: bool = True,
+                 output: Optional[str] = None, storage_client=None) -> Dict[str, Any]:
+    """Refresh the derived sources, assemble the factor matrix and publish it to Firestore and the snapshot"""
+    window_start = datetime.now(timezone.utc) - timedelta(days=window_days)
+    if not dry_run:
+        score_news(db, window_start - timedelta(days=SENTIMENT_CARRY_DAYS))
+        publish_macro_factors(db)
+    esg_cache.refresh(db)
+
+    factors = assemble_factors(db, window_days)
+    result = {'rows': len(factors), 'by_horizon': factors['horizon'].value_counts().to_dict(),
+              'symbols': int(factors['symbol'].nunique()), 'dry_run': dry_run}
+    if dry_run or factors.empty:
+        return result
+
+    write_factors(db, factors)
+    if snapshot:
+        data = columnar_snapshot(factors)
+        result['snapshot'] = publish_snapshot(data, output, storage_client)
+        result['snapshot_bytes'] = len(data)
+    logger.info(f"✅ Assembled {len(factors)} historical factors for {result['symbols']} symbols "
+                f"({', '.join(f'{h}: {n}' for h, n in sorted(result['by_horizon'].items()))})")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assemble historical_factors from the raw collections")
+    parser.add_argument('--days', type=int, default=WINDOW_DAYS)
+    parser.add_argument('--dry-run', action='store_true', help="Assemble without writing anything")
+    parser.add_argument('--output', help="Write the columnar snapshot to this path instead of Cloud Storage")
+    parser.add_argument('--no-snapshot', action='store_true', help="Only write historical_factors")
+    args = parser.parse_args()
+
+    from google.cloud import firestore
+    print(run_assembly(firestore.Client(), args.days, dry_run=args.dry_run,
+                       snapshot=not args.no_snapshot, output=args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+FIRESTORE BULK DELETE
+=====================
+
+Shared deletion engine for the cleanup scripts. Deleting a collection:
+
+1. Partition - split the collection's key range with a collection group
+               partition query (cursors outside the collection are dropped)
+2. List      - page through each partition keys-only (select __name__) with a
+               recursive query, so documents in subcollections at any depth
+               are listed under their parent's range and deleted with it
+3. Delete    - one BulkWriter per worker deletes its partition's pages
+               concurrently, with BulkWriter's built-in rate ramp-up
+4. Resume    - after each flushed page the partition's last deleted path is
+               checkpointed to a JSON file; an interrupted run restarts after
+               that cursor instead of rescanning the tombstones it left behind
+
+Usage:
+    python firestore_bulk_delete.py stocks test_collection --workers 16
+    python firestore_bulk_delete.py stocks --checkpoint .bulk_delete.json   # resumable
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+DEFAULT_WORKERS = 8
+PARTITIONS_PER_WORKER = 4
+PAGE_SIZE = 1000
+
+
+def _path_key(path: str) -> List[str]:
+    """Firestore orders document names segment by segment, not as flat strings"""
+    return path.split('/')
+
+
+class DeletionCheckpoint:
+    """Per-collection partition bounds and resume cursors, persisted as JSON"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state: Dict[str, Any] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def partitions(self, collection_path: str) -> Optional[List[Dict[str, Any]]]:
+        return self.state.get(collection_path, {}).get('partitions')
+
+    def start(self, collection_path: str, bounds: List[Tuple[Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+        partitions = [{'start': start, 'end': end, 'cursor': None, 'deleted': 0, 'done': False} for start, end in bounds]
+        with self.lock:
+            self.state[collection_path] = {'partitions': partitions}
+            self._save()
+        return partitions
+
+    def advance(self, collection_path: str, index: int, cursor: Optional[str], deleted: int, done: bool) -> None:
+        with self.lock:
+            partition = self.state[collection_path]['partitions'][index]
+            partition.update(cursor=cursor or partition['cursor'], deleted=partition['deleted'] + deleted, done=done)
+            self._save()
+
+    def finish(self, collection_path: str) -> None:
+        with self.lock:
+            self.state.pop(collection_path, None)
+            self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        if not self.state:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class BulkDeleter:
+    """Deletes collections (and everything nested under them) in parallel, resumably"""
+
+    def __init__(self, db=None, workers: int = DEFAULT_WORKERS, page_size: int = PAGE_SIZE,
+                 checkpoint_path: Optional[str] = None, log=print):
+        self.db = db or firestore.Client()
+        self.workers = workers
+        self.page_size = page_size
+        self.checkpoint = DeletionCheckpoint(checkpoint_path)
+        self.log = log
+
+    def partition_bounds(self, collection_ref, partition_count: int) -> List[Tuple[Optional[str], Optional[str]]]:
+        """[start, end) document paths covering the collection, from a collection group partition query"""
+        if partition_count <= 1:
+            return [(None, None)]
+        cursors = set()
+        for partition in self.db.collection_group(collection_ref.id).get_partitions(partition_count):
+            if partition.end_at is not None and partition.end_at.parent.path == collection_ref.path:
+                cursors.add(partition.end_at.path)
+        cursors = sorted(cursors, key=_path_key)
+        return list(zip([None] + cursors, cursors + [None]))
+
+    def _partition_query(self, collection_ref, start: Optional[str], end: Optional[str], cursor: Optional[str]):
+        """Keys-only recursive query over [start, end), narrowing the bounds recursive() sets to the whole collection"""
+        document_id = FieldPath.document_id()
+        query = collection_ref.recursive().select([document_id])
+        if cursor:
+            query = query.start_after({document_id: cursor})
+        elif start:
+            query = query.start_at({document_id: start})
+        if end:
+            query = query.end_before({document_id: end})
+        return query
+
+    def _delete_partition(self, collection_ref, index: int, partition: Dict[str, Any]) -> None:
+        writer = self.db.bulk_writer()
+        cursor = partition['cursor']
+        try:
+            while True:
+                query = self._partition_query(collection_ref, partition['start'], partition['end'], cursor)
+                page = [snapshot.reference for snapshot in query.limit(self.page_size).stream()]
+                for reference in page:
+                    writer.delete(reference)
+                # Only checkpoint a cursor once everything before it is durably deleted
+                writer.flush()
+                if page:
+                    cursor = page[-1].path
+                done = len(page) < self.page_size
+                self.checkpoint.advance(collection_ref.path, index, cursor, len(page), done)
+                if done:
+                    return
+        finally:
+            writer.close()
+
+    def delete_collection(self, name: str, partitions: Optional[int] = None) -> int:
+        """Delete every document in the collection and its subcollections; returns documents deleted"""
+        collection_ref = self.db.collection(name)
+        started = time.perf_counter()
+
+        plan = self.checkpoint.partitions(collection_ref.path)
+        if plan is not None:
+            remaining = sum(not p['done'] for p in plan)
+            self.log(f"   ↩️ Resuming '{name}': {remaining}/{len(plan)} partitions left")
+        else:
+            bounds = self.partition_bounds(collection_ref, partitions or self.workers * PARTITIONS_PER_WORKER)
+            plan = self.checkpoint.start(collection_ref.path, bounds)
+
+        pending = [(index, partition) for index, partition in enumerate(plan) if not partition['done']]
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                list(pool.map(lambda item: self._delete_partition(collection_ref, *item), pending))
+
+        # The checkpoint counts include pages deleted by an interrupted earlier run
+        deleted = sum(partition['deleted'] for partition in plan)
+        self.checkpoint.finish(collection_ref.path)
+        self.log(f"   ✅ Deleted '{name}' ({deleted} documents, {len(plan)} partitions, "
+                 f"{time.perf_counter() - started:.1f}s)")
+        return deleted
+
+    def delete_collections(self, names: List[str]) -> Dict[str, Any]:
+        """Delete several collections, recording per-collection errors instead of stopping"""
+        results = {}
+        for name in names:
+            self.log(f"🗑️ Deleting collection: {name}")
+            try:
+                results[name] = self.delete_collection(name)
+            except Exception as e:
+                self.log(f"   ❌ Error deleting {name}: {e}")
+                results[name] = {'error': str(e)}
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete Firestore collections and their subcollections in parallel")
+    parser.add_argument('collections', nargs='+')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--checkpoint', default=None, help="JSON file for resume cursors (resumes if it exists)")
+    args = parser.parse_args()
+
+    deleter = BulkDeleter(workers=args.workers, page_size=args.page_size, checkpoint_path=args.checkpoint)
+    print(json.dumps(deleter.delete_collections(args.collections), indent=2))
+
+
+if __name__ == "__main__":
+    main()
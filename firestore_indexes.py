@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+FIRESTORE INDEX MANAGEMENT
+==========================
+
+firestore.indexes.json is generated from QUERY_REGISTRY, the query shapes
+the pipeline actually issues (collection, filters, orderings), instead of
+being edited by hand:
+
+1. Composites  - every shape that needs a composite index (equality filters
+                 plus a range or ordering on another field, or several
+                 orderings) gets exactly the index Firestore asks for
+2. Exemptions  - high-write fields in INDEX_EXEMPTIONS keep only the
+                 single-field index modes some registered query uses; fields
+                 no query touches stop being indexed at all, cutting index
+                 writes per document
+3. TTL         - the retention expiry field is declared as a TTL field and
+                 exempted from indexing
+4. Check       - shapes captured at runtime (pipeline_harness.py
+                 --check-indexes against the emulator, which serves every
+                 query without an index) are checked against the generated
+                 config, so an unindexed query fails the harness run instead
+                 of production
+
+Usage:
+    python firestore_indexes.py            # regenerate firestore.indexes.json
+    python firestore_indexes.py --check    # exit 1 if the file is out of date
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List, Any, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+INDEX_FILE = os.path.join(REPO_ROOT, 'firestore.indexes.json')
+
+EQUALITY_OPS = ('==', 'in')
+CONTAINS_OPS = ('array_contains', 'array_contains_any')
+RANGE_OPS = ('<', '<=', '>', '>=', '!=', 'not-in')
+
+# Raw time-series collections with retention policies (cloud_functions_retention)
+TIME_SERIES_COLLECTIONS = ['market_data', 'technical_analysis', 'fundamental_analysis',
+                           'sentiment_analysis', 'historical_factors']
+TTL_FIELD = 'expire_at'
+
+
+def _shape(collection: str, filters: List[Tuple[str, str]] = (), order_by: List[Tuple[str, str]] = (),
+           used_by: str = '', scope: str = 'COLLECTION') -> Dict[str, Any]:
+    return {'collection': collection, 'scope': scope, 'filters': list(filters),
+            'order_by': list(order_by), 'used_by': used_by}
+
+
+# Query shapes issued by the loaders, trainers and jobs; add an entry with every new query
+QUERY_REGISTRY = {
+    'factor_count_by_horizon': _shape(
+        'historical_factors', [('horizon', '==')],
+        used_by='cloud_functions_{1w,1m,6m} training_input_probe (count), training_coordinator.input_fingerprint'),
+    'factor_newest_by_horizon': _shape(
+        'historical_factors', [('horizon', '==')], [('timestamp', 'DESCENDING')],
+        used_by='cloud_functions_{1w,1m,6m} training_input_probe, training_coordinator.input_fingerprint'),
+    'factor_newest': _shape(
+        'historical_factors', order_by=[('timestamp', 'DESCENDING')],
+        used_by='cloud_functions_{1w,1m,6m} training_input_probe (untagged fallback), training_coordinator.input_fingerprint'),
+    'factor_last_write_by_horizon': _shape(
+        'historical_factors', [('horizon', '==')], [('updated_at', 'DESCENDING')],
+        used_by='cloud_functions_{1w,1m,6m} training_input_probe, training_coordinator.input_fingerprint'),
+    'factor_last_write': _shape(
+        'historical_factors', order_by=[('updated_at', 'DESCENDING')],
+        used_by='cloud_functions_{1w,1m,6m} training_input_probe (untagged fallback), training_coordinator.input_fingerprint'),
+    'factor_training_window': _shape(
+        'historical_factors', [('timestamp', '>=')],
+        used_by='cloud_functions_{1w,1m,6m} train_*_models, run_batch_predictions'),
+    'factor_incremental_rows': _shape(
+        'historical_factors', [('timestamp', '>')],
+        used_by='cloud_functions_{1w,1m,6m} run_incremental_update'),
+    'market_data_factor_window': _shape(
+        'market_data', [('timestamp', '>=')],
+        used_by='factor_assembly.load_source'),
+    'technical_factor_window': _shape(
+        'technical_analysis', [('timestamp', '>=')],
+        used_by='factor_assembly.load_source'),
+    'news_scoring_window': _shape(
+        'japanese_news', [('timestamp', '>=')],
+        used_by='sentiment_scoring.score_news'),
+    'daily_sentiment_window': _shape(
+        'sentiment_analysis', [('timestamp', '>=')],
+        used_by='factor_assembly.load_source'),
+    'macro_indicator_window': _shape(
+        'macro_indicators', [('timestamp', '>=')],
+        used_by='macro_factors.load_indicator_series'),
+    'japanese_economics_window': _shape(
+        'japanese_economics', [('timestamp', '>=')],
+        used_by='macro_factors.load_indicator_series'),
+    'macro_factor_window': _shape(
+        'macro_factors', [('timestamp', '>=')],
+        used_by='macro_factors.load_macro_factors'),
+    'fundamental_snapshot_window': _shape(
+        'fundamental_analysis', [('timestamp', '>=')],
+        used_by='fundamentals_store.FundamentalsStore.load'),
+    'esg_score_refresh': _shape(
+        'esg_scores', [('timestamp', '>=')],
+        used_by='esg_factors.ESGFactorCache.refresh'),
+    'user_favorites': _shape(
+        'favorites', scope='COLLECTION_GROUP',
+        used_by='cloud_functions_snapshots load_favorites'),
+    **{f'{name}_oldest': _shape(
+        name, order_by=[('timestamp', 'ASCENDING')],
+        used_by='cloud_functions_retention apply_policy, collection_inventory')
+       for name in TIME_SERIES_COLLECTIONS},
+    **{f'{name}_newest': _shape(
+        name, order_by=[('timestamp', 'DESCENDING')],
+        used_by='collection_inventory')
+       for name in TIME_SERIES_COLLECTIONS},
+    **{f'{name}_retention_window': _shape(
+        name, [('timestamp', '>='), ('timestamp', '<')], [('timestamp', 'ASCENDING')],
+        used_by='cloud_functions_retention apply_policy')
+       for name in TIME_SERIES_COLLECTIONS}
+}
+
+# Fields written on every ingest row; each keeps only the index modes a registered query needs
+INDEX_EXEMPTIONS = {
+    'market_data': ['timestamp', 'open', 'high', 'low', 'price', 'current_price', 'close_price',
+                    'volume', 'volatility', 'fundamental_score', 'technical_score', 'source'],
+    'technical_analysis': ['rsi', 'technical_score', 'price_change_pct', 'volume', 'source'],
+    'historical_factors': ['fundamental', 'technical', 'sentiment', 'macro', 'esg', 'actual_return',
+                           'price', 'volatility', 'volume', 'source']
+}
+
+
+def _equality_fields(shape: Dict[str, Any]) -> List[str]:
+    return sorted({field for field, op in shape['filters'] if op in EQUALITY_OPS})
+
+
+def _shape_key(shape: Dict[str, Any]) -> tuple:
+    return (shape['collection'], shape['scope'], tuple(sorted(map(tuple, shape['filters']))),
+            tuple(map(tuple, shape['order_by'])))
+
+
+def _mode_entry(mode: str, scope: str) -> Dict[str, str]:
+    return {('arrayConfig' if mode == 'CONTAINS' else 'order'): mode, 'queryScope': scope}
+
+
+def required_indexes(shape: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[Tuple[str, str]]]:
+    """(composite index or None, [(field, mode)] single-field index modes) a query shape needs"""
+    equality = _equality_fields(shape)
+    contains = sorted({field for field, op in shape['filters'] if op in CONTAINS_OPS})
+    ranges = [field for field, op in shape['filters'] if op in RANGE_OPS]
+
+    # Firestore orders by the inequality field first when the query doesn't
+    orders = [tuple(order) for order in shape['order_by'] if order[0] != '__name__']  # Built in
+    if ranges and (not orders or orders[0][0] != ranges[0]):
+        orders.insert(0, (ranges[0], 'ASCENDING'))
+    orders = [(field, direction) for field, direction in orders if field not in equality]
+
+    fields = ([{'fieldPath': field, 'order': 'ASCENDING'} for field in equality] +
+              [{'fieldPath': field, 'arrayConfig': 'CONTAINS'} for field in contains] +
+              [{'fieldPath': field, 'order': direction} for field, direction in orders])
+
+    # Filters without an ordering are served by merging single-field indexes
+    if orders and len({f['fieldPath'] for f in fields}) > 1:
+        return {'collectionGroup': shape['collection'], 'queryScope': shape['scope'], 'fields': fields}, []
+    return None, [(f['fieldPath'], f.get('order') or f['arrayConfig']) for f in fields]
+
+
+def build_index_config(registry: Dict[str, Dict[str, Any]] = QUERY_REGISTRY) -> Dict[str, Any]:
+    composites, singles = {}, set()
+    for shape in registry.values():
+        composite, single = required_indexes(shape)
+        if composite:
+            composites[json.dumps(composite, sort_keys=True)] = composite
+        singles.update((shape['collection'], field, mode, shape['scope']) for field, mode in single)
+
+    overrides = []
+    for collection, fields in sorted(INDEX_EXEMPTIONS.items()):
+        for field in sorted(fields):
+            modes = sorted((mode, scope) for c, f, mode, scope in singles if (c, f) == (collection, field))
+            overrides.append({'collectionGroup': collection, 'fieldPath': field,
+                              'indexes': [_mode_entry(mode, scope) for mode, scope in modes]})
+    for collection in TIME_SERIES_COLLECTIONS:
+        overrides.append({'collectionGroup': collection, 'fieldPath': TTL_FIELD, 'ttl': True, 'indexes': []})
+
+    # Collection-group queries need a COLLECTION_GROUP scoped single-field index
+    for collection, field, mode, scope in sorted(singles):
+        if scope == 'COLLECTION_GROUP':
+            overrides.append({'collectionGroup': collection, 'fieldPath': field,
+                              'indexes': [_mode_entry(mode, 'COLLECTION'), _mode_entry(mode, scope)]})
+
+    return {
+        'indexes': sorted(composites.values(), key=lambda index: json.dumps(index, sort_keys=True)),
+        'fieldOverrides': overrides
+    }
+
+
+def _composite_matches(index: Dict[str, Any], required: Dict[str, Any], equality_count: int) -> bool:
+    """Same fields, with the equality prefix in any order and the ordering suffix exact"""
+    if (index['collectionGroup'], index['queryScope']) != (required['collectionGroup'], required['queryScope']):
+        return False
+    have, want = index['fields'], required['fields']
+    return (len(have) == len(want) and have[equality_count:] == want[equality_count:]
+            and sorted(f['fieldPath'] for f in have[:equality_count]) ==
+            sorted(f['fieldPath'] for f in want[:equality_count]))
+
+
+def find_unindexed(shapes: List[Dict[str, Any]], config: Dict[str, Any]) -> List[str]:
+    """Shapes the index config would reject in production, with the reason"""
+    overrides = {(o['collectionGroup'], o['fieldPath']): o for o in config.get('fieldOverrides', [])}
+    problems = []
+    for shape in shapes:
+        composite, singles = required_indexes(shape)
+        label = f"{shape['collection']} {shape['filters']} order_by {shape['order_by']}"
+        if composite and not any(_composite_matches(index, composite, len(_equality_fields(shape)))
+                                 for index in config.get('indexes', [])):
+            problems.append(f"{label}: missing composite index {json.dumps(composite['fields'])}")
+        for field, mode in singles:
+            override = overrides.get((shape['collection'], field))
+            if override is None:
+                if shape['scope'] == 'COLLECTION_GROUP':
+                    problems.append(f"{label}: {field} needs a COLLECTION_GROUP {mode} index")
+                continue
+            if _mode_entry(mode, shape['scope']) not in override['indexes']:
+                problems.append(f"{label}: {field} {mode} is exempted from indexing")
+    return problems
+
+
+def unregistered(shapes: List[Dict[str, Any]], registry: Dict[str, Dict[str, Any]] = QUERY_REGISTRY) -> List[Dict[str, Any]]:
+    """Filtered or ordered shapes issued at runtime that no registry entry describes"""
+    known = {_shape_key(shape) for shape in registry.values()}
+    return [shape for shape in shapes if (shape['filters'] or shape['order_by']) and _shape_key(shape) not in known]
+
+
+_OPERATORS = {'EQUAL': '==', 'IN': 'in', 'LESS_THAN': '<', 'LESS_THAN_OR_EQUAL': '<=', 'GREATER_THAN': '>',
+              'GREATER_THAN_OR_EQUAL': '>=', 'NOT_EQUAL': '!=', 'NOT_IN': 'not-in',
+              'ARRAY_CONTAINS': 'array_contains', 'ARRAY_CONTAINS_ANY': 'array_contains_any'}
+
+
+def shape_from_query(query) -> Optional[Dict[str, Any]]:
+    """Registry-style shape of a google-cloud-firestore Query, CollectionReference or AggregationQuery"""
+    query = getattr(query, '_nested_query', query)
+    if not hasattr(query, '_field_filters'):  # A plain CollectionReference
+        return _shape(query.id) if hasattr(query, 'id') else None
+    filters = []
+    for field_filter in query._field_filters:
+        if hasattr(field_filter, 'field') and hasattr(field_filter, 'op'):
+            op = getattr(field_filter.op, 'name', str(field_filter.op))
+            filters.append((field_filter.field.field_path, _OPERATORS.get(op, op)))
+    orders = [(order.field.field_path, 'DESCENDING' if int(order.direction) == 2 else 'ASCENDING')
+              for order in query._orders or ()]
+    if not query._parent.id:  # recursive() from the database root
+        return None
+    return _shape(query._parent.id, filters, orders,
+                  scope='COLLECTION_GROUP' if query._all_descendants and not getattr(query, '_recursive', False)
+                  else 'COLLECTION')
+
+
+def render_config(config: Dict[str, Any]) -> str:
+    return json.dumps(config, indent=2) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate firestore.indexes.json from the query registry")
+    parser.add_argument('--check', action='store_true', help="Exit 1 if firestore.indexes.json is out of date")
+    parser.add_argument('--output', default=INDEX_FILE)
+    args = parser.parse_args()
+
+    config = build_index_config()
+    rendered = render_config(config)
+    problems = find_unindexed(list(QUERY_REGISTRY.values()), config)
+    if problems:
+        print("❌ Registered queries the generated config cannot serve:")
+        for problem in problems:
+            print(f"   {problem}")
+        sys.exit(1)
+
+    if args.check:
+        with open(args.output) as f:
+            current = json.load(f)
+        if current != config:
+            print(f"❌ {os.path.basename(args.output)} is out of date; run python firestore_indexes.py")
+            sys.exit(1)
+        print(f"✅ {os.path.basename(args.output)} matches the registry "
+              f"({len(config['indexes'])} composite indexes, {len(config['fieldOverrides'])} field overrides)")
+        return
+
+    with open(args.output, 'w') as f:
+        f.write(rendered)
+    print(f"✅ Wrote {len(config['indexes'])} composite indexes and {len(config['fieldOverrides'])} "
+          f"field overrides to {os.path.basename(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,10 @@ from google.cloud import firestore
 import logging
 import requests
 
+from fundamentals_store import FundamentalsStore, MAX_SNAPSHOT_AGE_DAYS, point_in_time_scores
+from factor_assembly import run_assembly
+from volatility import DEFAULT_ESTIMATOR, estimate
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,6 +60,11 @@ def fetch_and_store_real_market_data(db):
     market_data_batch = []
     technical_data_batch = []
     
+    # Ticker.info is fetched only for symbols whose snapshot is older than the TTL
+    fundamentals = FundamentalsStore(db)
+    fundamentals.refresh(symbols)
+    snapshots = fundamentals.load(datetime.now(timezone.utc) - timedelta(days=60 + MAX_SNAPSHOT_AGE_DAYS))
+    
     for symbol in symbols:
         try:
             logger.info(f"📈 Processing {symbol}")
@@ -63,12 +72,22 @@ def fetch_and_store_real_market_data(db):
             # Get 60 days of data for proper technical analysis
             ticker = yf.Ticker(symbol)
             hist = ticker.history(period="60d", interval="1d")
-            info = ticker.info
             
             if hist.empty:
                 logger.warning(f"❌ No data for {symbol}")
                 continue
             
+            # Each day is scored from the snapshot in force that day, never from today's .info
+            fundamental_scores = point_in_time_scores(pd.DataFrame({
+                'date': [date.replace(tzinfo=timezone.utc) for date in hist.index],
+                'symbol': symbol,
+                'price': hist['Close'].to_numpy()
+            }), snapshots)['fundamental_score'].to_numpy()
+            
+            # Volatility as known at each day's close, computed once for the whole series
+            volatility = estimate(DEFAULT_ESTIMATOR, hist['Close'], high=hist['High'], low=hist['Low'],
+                                  open_=hist['Open']).fillna(15.0).to_numpy()
+            
             # Process each day's data
             for i in range(len(hist)):
                 date = hist.index[i]
@@ -99,16 +118,7 @@ def fetch_and_store_real_market_data(db):
                     technical_score = 0.5
                     rsi = 50
                 
-                # Fundamental score (basic)
-                try:
-                    pe_ratio = info.get('trailingPE', 20)
-                    market_cap = info.get('marketCap', 1000000000)
-                    
-                    # Normalize P/E ratio (lower is better, but not too low)
-                    pe_score = max(0, min(1, 1 - (pe_ratio - 15) / 50)) if pe_ratio and pe_ratio > 0 else 0.5
-                    fundamental_score = np.clip(pe_score, 0, 1)
-                except:
-                    fundamental_score = 0.5
+                fundamental_score = fundamental_scores[i]
                 
                 # Create market data document
                 market_doc = {
@@ -120,7 +130,7 @@ def fetch_and_store_real_market_data(db):
                     'volume': int(data_point['Volume']) if not pd.isna(data_point['Volume']) else 0,
                     'current_price': float(data_point['Close']),
                     'close_price': float(data_point['Close']),
-                    'volatility': float(np.std(hist['Close'].pct_change().dropna()) * 100 * np.sqrt(252)) if len(hist) > 5 else 15.0,
+                    'volatility': float(volatility[i]),
                     'fundamental_score': float(fundamental_score),
                     'technical_score': float(technical_score),
                     'timestamp': date.replace(tzinfo=timezone.utc),
@@ -186,115 +196,16 @@ def fetch_and_store_real_market_data(db):
     logger.info(f"✅ Stored {len(market_data_batch)} market data records and {len(technical_data_batch)} technical records")
     return len(market_data_batch)
 
-def create_real_historical_factors(db):
-    """Create historical factors with REAL returns calculated from price changes"""
+def create_real_historical_factors(db, storage_client=None):
+    """Create historical factors with REAL returns, joined from every raw collection"""
     logger.info("🔧 Creating historical factors with REAL returns...")
     
-    # Get all market data from last 30 days
-    cutoff_time = datetime.now(timezone.utc) - timedelta(days=30)
-    market_query = db.collection('market_data').where('timestamp', '>=', cutoff_time).stream()
-    
-    # Group by symbol and date
-    symbol_data = {}
-    for doc in market_query:
-        data = doc.to_dict()
-        symbol = data['symbol']
-        date_key = data['timestamp'].date()
-        
-        if symbol not in symbol_data:
-            symbol_data[symbol] = {}
-        
-        symbol_data[symbol][date_key] = data
-    
-    # Create historical factors with real returns
-    historical_batch = []
-    horizons = ['1W', '1M', '6M']
-    
-    for symbol, dates_data in symbol_data.items():
-        # Sort dates
-        sorted_dates = sorted(dates_data.keys())
-        
-        if len(sorted_dates) < 2:
-            continue
-        
-        # Calculate returns for different horizons
-        for i, current_date in enumerate(sorted_dates):
-            current_data = dates_data[current_date]
-            current_price = current_data['price']
-            
-            for horizon in horizons:
-                # Calculate lookback period for each horizon
-                if horizon == '1W':
-                    lookback_days = 7
-                elif horizon == '1M':
-                    lookback_days = 30
-                else:  # 6M
-                    lookback_days = 180
-                
-                # Find price from lookback_days ago
-                target_date = current_date - timedelta(days=lookback_days)
-                
-                # Find closest available date
-                past_price = None
-                for past_date in sorted_dates:
-                    if past_date <= target_date:
-                        past_price = dates_data[past_date]['price']
-                    else:
-                        break
-                
-                if past_price is None or past_price <= 0:
-                    continue
-                
-                # Calculate REAL return
-                actual_return = (current_price - past_price) / past_price
-                
-                # Get factor scores
-                fundamental = current_data.get('fundamental_score', 0.5)
-                technical = current_data.get('technical_score', 0.5)
-                
-                # Create historical factor document
-                historical_doc = {
-                    'symbol': symbol,
-                    'horizon': horizon,
-                    'timestamp': current_data['timestamp'],
-                    'fundamental': float(fundamental),
-                    'technical': float(technical),
-                    'sentiment': float(np.random.uniform(0.3, 0.7)),  # Placeholder - would come from news analysis
-                    'macro': float(np.random.uniform(0.4, 0.6)),     # Placeholder - would come from economic data
-                    'esg': float(np.random.uniform(0.4, 0.6)),       # Placeholder - would come from ESG data
-                    'actual_return': float(np.clip(actual_return, -0.5, 0.5)),  # Real calculated return!
-                    'price': float(current_price),
-                    'volatility': float(current_data.get('volatility', 20)),
-                    'volume': int(current_data.get('volume', 0)),
-                    'source': 'real_calculated_returns'
-                }
-                
-                historical_batch.append(historical_doc)
-                
-                if len(historical_batch) % 100 == 0:
-                    logger.info(f"📊 Created {len(historical_batch)} historical factors so far...")
-    
-    # Batch write historical factors
-    if historical_batch:
-        logger.info(f"💾 Writing {len(historical_batch)} historical factor records...")
-        batch = db.batch()
-        batch_count = 0
-        
-        for doc_data in historical_batch:
-            doc_ref = db.collection('historical_factors').document()
-            batch.set(doc_ref, doc_data)
-            batch_count += 1
-            
-            if batch_count >= 400:
-                batch.commit()
-                batch = db.batch()
-                batch_count = 0
-        
-        if batch_count > 0:
-            batch.commit()
+    # One vectorized pass over all sources and horizons; also refreshes the columnar snapshot
+    # (storage_client defaults to the production bucket's client)
+    result = run_assembly(db, storage_client=storage_client)
     
-    logger.info(f"✅ Created {len(historical_batch)} historical factors with REAL returns")
-    return len(historical_batch)
+    logger.info(f"✅ Created {result['rows']} historical factors with REAL returns")
+    return result['rows']
 
 def trigger_model_training():
     """Trigger ML model training via API"""
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+FUNDAMENTALS SNAPSHOT STORE
+===========================
+
+Point-in-time fundamentals for the factor pipeline, without calling
+yfinance's slow Ticker.info for every symbol on every run:
+
+1. Snapshot - Ticker.info is reduced to INFO_FIELDS and written to
+              fundamental_analysis/{symbol}_{YYYYMMDD} with the time it was
+              fetched; the accumulated snapshots are the fundamentals history
+2. Reuse    - one query finds snapshots younger than SNAPSHOT_TTL_HOURS; only
+              symbols without one are fetched, concurrently
+3. As-of    - each (symbol, date) row is joined to the latest snapshot taken
+              on or before that date with one pd.merge_asof, so a day never
+              sees fundamentals published after it. P/E is re-derived from
+              that day's close and the snapshot's trailing EPS, so the score
+              moves with price between reports instead of being today's P/E
+              copied onto every past day. Rows older than the first snapshot
+              stay neutral (0.5)
+
+Usage:
+    python fundamentals_store.py AAPL MSFT      # refresh stale snapshots and print them
+    python fundamentals_store.py AAPL --force   # ignore the TTL
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Iterable, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL_HOURS = 24
+MAX_SNAPSHOT_AGE_DAYS = 120  # About one reporting quarter; older snapshots no longer describe the company
+FETCH_WORKERS = 8
+BATCH_LIMIT = 400
+NEUTRAL = 0.5
+SNAPSHOT_SOURCE = 'yfinance_info'
+
+# Ticker.info key -> fundamental_analysis field
+INFO_FIELDS = {
+    'trailingPE': 'pe_ratio',
+    'trailingEps': 'trailing_eps',
+    'priceToBook': 'price_to_book',
+    'dividendYield': 'dividend_yield',
+    'marketCap': 'market_cap',
+    'debtToEquity': 'debt_to_equity',
+    'returnOnEquity': 'return_on_equity'
+}
+
+
+def pe_score(pe_ratio) -> np.ndarray:
+    """Lower P/E scores higher (15 -> 1.0, 65 -> 0.0); missing or negative P/E is neutral"""
+    pe = np.asarray(pe_ratio, dtype=float)
+    valid = np.isfinite(pe) & (pe > 0)
+    return np.where(valid, np.clip(1 - (np.where(valid, pe, 15) - 15) / 50, 0, 1), NEUTRAL)
+
+
+def fetch_info_snapshot(symbol: str) -> Dict[str, float]:
+    """Ticker.info reduced to INFO_FIELDS; empty for indices and FX, which have no fundamentals"""
+    import yfinance as yf
+    info = yf.Ticker(symbol).info or {}
+    return {field: float(info[key]) for key, field in INFO_FIELDS.items()
+            if isinstance(info.get(key), (int, float)) and not isinstance(info.get(key), bool)}
+
+
+class FundamentalsStore:
+    """Timestamped Ticker.info snapshots in fundamental_analysis, reused until SNAPSHOT_TTL_HOURS expires"""
+
+    def __init__(self, db, ttl_hours: int = SNAPSHOT_TTL_HOURS, fetch=fetch_info_snapshot,
+                 workers: int = FETCH_WORKERS):
+        self.db = db
+        self.ttl = timedelta(hours=ttl_hours)
+        self.fetch = fetch
+        self.workers = workers
+        self.stats = {'fetched': 0, 'reused': 0, 'failed': 0}
+
+    def load(self, since: datetime, symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Snapshots taken since `since` as a (date, symbol, fields...) frame sorted for merge_asof"""
+        wanted = set(symbols) if symbols is not None else None
+        records = []
+        for doc in self.db.collection('fundamental_analysis').where('timestamp', '>=', since).stream():
+            row = doc.to_dict()
+            # Other writers share the collection; only fetched snapshots form the history
+            if row.get('source') == SNAPSHOT_SOURCE and (wanted is None or row.get('symbol') in wanted):
+                records.append({'date': row['timestamp'], 'symbol': row['symbol'],
+                                **{field: row.get(field, np.nan) for field in INFO_FIELDS.values()}})
+        frame = pd.DataFrame(records, columns=['date', 'symbol', *INFO_FIELDS.values()])
+        frame['date'] = pd.to_datetime(frame['date'], utc=True).astype('datetime64[ns, UTC]')
+        return frame.sort_values('date')
+
+    def refresh(self, symbols: List[str], force: bool = False) -> Dict[str, Any]:
+        """Fetch Ticker.info for the symbols without a snapshot younger than the TTL"""
+        now = datetime.now(timezone.utc)
+        fresh = set() if force else set(self.load(now - self.ttl, symbols)['symbol'])
+        stale = [symbol for symbol in symbols if symbol not in fresh]
+        self.stats['reused'] += len(symbols) - len(stale)
+
+        def fetch(symbol):
+            try:
+                return symbol, self.fetch(symbol) or {}
+            except Exception as e:
+                logger.warning(f"⚠️ Ticker.info failed for {symbol}: {e}")
+                return symbol, None
+
+        snapshots = {}
+        if stale:
+            # An empty snapshot (indices, FX) is stored too, so the symbol is not re-fetched until the TTL expires;
+            # failed fetches are not, so they are retried on the next run
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(stale)))) as pool:
+                snapshots = {symbol: values for symbol, values in pool.map(fetch, stale) if values is not None}
+        self.stats['fetched'] += len(snapshots)
+        self.stats['failed'] += len(stale) - len(snapshots)
+
+        collection = self.db.collection('fundamental_analysis')
+        batch, pending = self.db.batch(), 0
+        for symbol, values in snapshots.items():
+            batch.set(collection.document(f"{symbol}_{now:%Y%m%d}"), {
+                'symbol': symbol,
+                **values,
+                'timestamp': now,
+                'source': SNAPSHOT_SOURCE
+            })
+            pending += 1
+            if pending >= BATCH_LIMIT:
+                batch.commit()
+                batch, pending = self.db.batch(), 0
+        if pending:
+            batch.commit()
+
+        logger.info(f"🏦 Fundamentals: {len(snapshots)} fetched, {len(symbols) - len(stale)} reused "
+                    f"(TTL {self.ttl.total_seconds() / 3600:.0f}h), {len(stale) - len(snapshots)} failed")
+        return {'fetched': sorted(snapshots), 'reused': len(symbols) - len(stale)}
+
+
+def point_in_time_scores(rows: pd.DataFrame, snapshots: pd.DataFrame,
+                         max_age_days: int = MAX_SNAPSHOT_AGE_DAYS) -> pd.DataFrame:
+    """rows (date, symbol, price) -> rows plus the as-of snapshot fields, 'pe_asof' and 'fundamental_score'"""
+    frame = rows.assign(date=pd.to_datetime(rows['date'], utc=True).astype('datetime64[ns, UTC]'),
+                        symbol=rows['symbol'].astype(str), position=np.arange(len(rows)))
+    if snapshots.empty:
+        merged = frame.assign(**{field: np.nan for field in INFO_FIELDS.values()})
+    else:
+        merged = pd.merge_asof(frame.sort_values('date'), snapshots.astype({'symbol': str}), on='date', by='symbol',
+                               direction='backward',
+                               tolerance=pd.Timedelta(days=max_age_days)).sort_values('position')
+    eps = merged['trailing_eps'].to_numpy(dtype=float)
+    price = merged['price'].to_numpy(dtype=float)
+    # That day's close over the EPS known that day; the snapshot P/E where EPS is missing or negative
+    merged['pe_asof'] = np.where(np.isfinite(eps) & (eps > 0), price / np.where(eps > 0, eps, 1),
+                                 merged['pe_ratio'].to_numpy(dtype=float))
+    merged['fundamental_score'] = pe_score(merged['pe_asof'])
+    return merged.drop(columns='position').set_index(rows.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh Ticker.info snapshots in fundamental_analysis")
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--force', action='store_true', help="Fetch even when a snapshot is younger than the TTL")
+    args = parser.parse_args()
+
+    from google.cloud import firestore
+    store = FundamentalsStore(firestore.Client())
+    store.refresh(args.symbols, force=args.force)
+    print(store.load(datetime.now(timezone.utc) - timedelta(days=MAX_SNAPSHOT_AGE_DAYS), args.symbols)
+          .groupby('symbol').tail(1).to_string(index=False))
+    print(store.stats)
+
+
+if __name__ == "__main__":
+    main()
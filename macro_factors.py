@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+MACRO FACTOR ENGINE
+===================
+
+Turns the macro_indicators and japanese_economics series into one macro
+score per day and region, feeding historical_factors.macro:
+
+1. Load       - indicator readings since the z-score lookback, as one long
+                frame (date, indicator, value); japanese_economics numeric
+                fields are read as indicators of their own
+2. Normalize  - pivot to a daily calendar, forward-fill release gaps, rolling
+                z-score every indicator at once, clip, then EWM-decay so a
+                reading fades instead of dropping out
+3. Composite  - sign-adjust (higher VIX is bearish), weight and average per
+                region, then blend US and JP composites per equity region
+                and squash into [0, 1] (0.5 neutral)
+4. Publish    - macro_factors/{YYYY-MM-DD} with the count of readings dated
+                that day; from the first day whose count changed (a release
+                landing after the day was published) every later day is
+                rewritten, since the z-scores and decay carry it forward
+5. Join       - factor_assembly attaches the score to every row with one
+                pd.merge_asof on date, picking the row's region column
+
+Usage:
+    python macro_factors.py              # publish new days and days with late readings
+    python macro_factors.py --force      # recompute the whole window
+"""
+
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ZSCORE_WINDOW = 252     # Trading-year lookback for each indicator's mean and spread
+ZSCORE_MIN_PERIODS = 20
+ZSCORE_CLIP = 3.0
+DECAY_HALFLIFE = 5      # Days for a reading's influence to halve
+FFILL_LIMIT = 31        # Monthly releases carry forward until the next one
+PUBLISH_DAYS = 30
+BATCH_LIMIT = 400
+NEUTRAL = 0.5
+
+# Indicator -> region, equity sign (+1 when a rise is bullish) and weight within the region
+MACRO_INDICATORS = {
+    # macro_indicators (by indicator name)
+    'VIX': {'region': 'US', 'sign': -1, 'weight': 1.0},
+    'US_10Y_YIELD': {'region': 'US', 'sign': -1, 'weight': 0.8},
+    'US_30Y_YIELD': {'region': 'US', 'sign': -1, 'weight': 0.4},
+    'GOLD_PRICE': {'region': 'US', 'sign': -1, 'weight': 0.3},
+    'USDJPY_RATE': {'region': 'JP', 'sign': 1, 'weight': 0.6},  # A weaker yen lifts exporters
+    # japanese_economics (by field)
+    'interest_rate': {'region': 'JP', 'sign': -1, 'weight': 1.0},
+    'inflation_rate': {'region': 'JP', 'sign': -1, 'weight': 0.5},
+    'jgb_10y_yield': {'region': 'JP', 'sign': -1, 'weight': 0.8},
+    'unemployment_rate': {'region': 'JP', 'sign': -1, 'weight': 0.7},
+    'nikkei_volatility': {'region': 'JP', 'sign': -1, 'weight': 1.0},
+    'economic_health_score': {'region': 'JP', 'sign': 1, 'weight': 1.0}
+}
+
+# Equity region -> blend of the regional macro composites
+REGION_WEIGHTS = {
+    'US': {'US': 0.8, 'JP': 0.2},
+    'JP': {'US': 0.4, 'JP': 0.6}
+}
+JP_SYMBOLS = {'^N225', '^TOPX', 'USDJPY=X'}
+
+
+def symbol_region(symbol: str) -> str:
+    return 'JP' if symbol.endswith('.T') or symbol in JP_SYMBOLS else 'US'
+
+
+def load_indicator_series(db, since: datetime) -> pd.DataFrame:
+    """Long frame of (date, indicator, value) readings for the configured indicators"""
+    records = []
+    for doc in db.collection('macro_indicators').where('timestamp', '>=', since).stream():
+        row = doc.to_dict()
+        if row.get('indicator') in MACRO_INDICATORS and isinstance(row.get('value'), (int, float)):
+            records.append((row['timestamp'], row['indicator'], float(row['value'])))
+    for doc in db.collection('japanese_economics').where('timestamp', '>=', since).stream():
+        row = doc.to_dict()
+        records.extend((row['timestamp'], field, float(value)) for field, value in row.items()
+                       if field in MACRO_INDICATORS and isinstance(value, (int, float)) and not isinstance(value, bool))
+    frame = pd.DataFrame(records, columns=['timestamp', 'indicator', 'value'])
+    frame['date'] = pd.to_datetime(frame['timestamp'], utc=True).dt.normalize()
+    return frame[['date', 'indicator', 'value']]
+
+
+def compute_macro_scores(readings: pd.DataFrame, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Daily frame indexed by date with per-region composites and per-equity-region scores in [0, 1]"""
+    if readings.empty:
+        return pd.DataFrame(columns=['composite_US', 'composite_JP', 'macro_US', 'macro_JP', 'indicators'])
+
+    # Last reading per day, on a gap-free daily calendar
+    wide = readings.sort_values('date').pivot_table(index='date', columns='indicator', values='value', aggfunc='last')
+    calendar = pd.date_range(wide.index.min(), end or wide.index.max(), freq='D', tz='UTC')
+    wide = wide.reindex(calendar).ffill(limit=FFILL_LIMIT)
+
+    rolling = wide.rolling(ZSCORE_WINDOW, min_periods=ZSCORE_MIN_PERIODS)
+    zscores = ((wide - rolling.mean()) / rolling.std().replace(0, np.nan)).clip(-ZSCORE_CLIP, ZSCORE_CLIP)
+    decayed = zscores.ewm(halflife=DECAY_HALFLIFE, ignore_na=True).mean().where(wide.notna())
+
+    config = pd.DataFrame(MACRO_INDICATORS).T.loc[decayed.columns]
+    signed = decayed * config['sign'].astype(float)
+    scores = pd.DataFrame(index=decayed.index)
+    for region in ('US', 'JP'):
+        columns = config.index[config['region'] == region]
+        weights = config.loc[columns, 'weight'].astype(float)
+        present = signed[columns].notna()
+        # Weights renormalized over the indicators available that day
+        scores[f'composite_{region}'] = ((signed[columns].fillna(0) * weights).sum(axis=1)
+                                         / (present * weights).sum(axis=1).replace(0, np.nan))
+
+    for equity_region, blend in REGION_WEIGHTS.items():
+        composite = sum(scores[f'composite_{r}'].fillna(0) * w for r, w in blend.items())
+        scores[f'macro_{equity_region}'] = (NEUTRAL + 0.5 * np.tanh(composite)).round(4)
+    scores['indicators'] = decayed.notna().sum(axis=1)
+    return scores
+
+
+def publish_macro_factors(db, days: int = PUBLISH_DAYS, force: bool = False) -> Dict[str, Any]:
+    """Write macro_factors/{date} for the last `days` days, from the first day whose readings changed"""
+    today = pd.Timestamp(datetime.now(timezone.utc)).normalize()
+    dates = pd.date_range(today - pd.Timedelta(days=days - 1), today, freq='D', tz='UTC')
+    since = (dates[0] - pd.Timedelta(days=ZSCORE_WINDOW + FFILL_LIMIT)).to_pydatetime()
+    readings = load_indicator_series(db, since)
+    scores = compute_macro_scores(readings, end=today)
+    counts = readings.groupby('date').size()
+
+    collection = db.collection('macro_factors')
+    if not force:
+        published = {snapshot.id: snapshot.to_dict().get('readings')
+                     for snapshot in db.get_all([collection.document(f"{d:%Y-%m-%d}") for d in dates])
+                     if snapshot.exists}
+        stale = [i for i, date in enumerate(dates)
+                 if date in scores.index and scores.loc[date, 'indicators']
+                 and published.get(f"{date:%Y-%m-%d}") != int(counts.get(date, 0))]
+        dates = dates[stale[0]:] if stale else dates[:0]
+    if not len(dates):
+        logger.info("⏭️ Macro factors already published from every reading")
+        return {'published': 0, 'skipped': True}
+
+    now = datetime.now(timezone.utc)
+    batch, pending, published = db.batch(), 0, 0
+    for date in dates:
+        row = scores.loc[date] if date in scores.index else None
+        if row is None or not row['indicators']:
+            continue
+        batch.set(collection.document(f"{date:%Y-%m-%d}"), {
+            'date': f"{date:%Y-%m-%d}",
+            'timestamp': date.to_pydatetime(),
+            **{column: float(row[column]) for column in ('macro_US', 'macro_JP')},
+            **{column: (None if pd.isna(row[column]) else round(float(row[column]), 4))
+               for column in ('composite_US', 'composite_JP')},
+            'indicators': int(row['indicators']),
+            'readings': int(counts.get(date, 0)),
+            'updated_at': now
+        })
+        pending += 1
+        published += 1
+        if pending >= BATCH_LIMIT:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    logger.info(f"🏛️ Published macro factors for {published} days")
+    return {'published': published}
+
+
+def load_macro_factors(db, since: datetime) -> pd.DataFrame:
+    """Published daily scores since `since`, sorted by date for merge_asof"""
+    rows = [doc.to_dict() for doc in db.collection('macro_factors').where('timestamp', '>=', since).stream()]
+    frame = pd.DataFrame(rows, columns=['timestamp', 'macro_US', 'macro_JP'])
+    frame['date'] = pd.to_datetime(frame['timestamp'], utc=True).astype('datetime64[ns, UTC]')
+    return frame[['date', 'macro_US', 'macro_JP']].sort_values('date')
+
+
+def macro_as_of(dates: pd.Series, symbols: pd.Series, macro: pd.DataFrame, tolerance_days: int = 7) -> np.ndarray:
+    """Latest daily score on or before each date for each symbol's region, in one as-of merge"""
+    frame = pd.DataFrame({'position': np.arange(len(dates)),
+                          'date': pd.to_datetime(pd.Series(dates).to_numpy(), utc=True).astype('datetime64[ns, UTC]'),
+                          'region': [symbol_region(symbol) for symbol in symbols]})
+    merged = pd.merge_asof(frame.sort_values('date'), macro, on='date', direction='backward',
+                           tolerance=pd.Timedelta(days=tolerance_days)).sort_values('position')
+    values = np.where(merged['region'] == 'JP', merged['macro_JP'], merged['macro_US'])
+    return np.nan_to_num(values.astype(float), nan=NEUTRAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish daily macro factor scores")
+    parser.add_argument('--days', type=int, default=PUBLISH_DAYS)
+    parser.add_argument('--force', action='store_true', help="Recompute every day in the window")
+    args = parser.parse_args()
+
+    from google.cloud import firestore
+    print(publish_macro_factors(firestore.Client(), days=args.days, force=args.force))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+UPTRENDR LOCAL PIPELINE HARNESS
+===============================
+
+Drives the full ML pipeline end-to-end against the Firestore emulator and a
+local GCS stand-in, so pipeline performance work can be verified offline:
+
+1. Ingest    - seed market_data with a deterministic synthetic universe
+2. Factors   - create historical_factors via fix_ml_data_pipeline
+3. Training  - run the 1W / 1M / 6M Cloud Function entry points, and with
+               --distributed also the training coordinator's fan-out, which
+               fails the stage if any of its model-group tasks failed
+4. Predict   - publish market_predictions via the batch prediction entry points
+
+Every stage reports Firestore reads, writes and wall-clock latency. With
+--check-indexes, every query shape the stages issue is also checked against
+firestore.indexes.json (the emulator serves queries without indexes, so
+this is what catches a missing composite before deploy).
+
+Usage:
+    firebase emulators:start --only firestore
+    python pipeline_harness.py --symbols 50 --days 60 --seed 42
+    python pipeline_harness.py --check-indexes
+    python pipeline_harness.py --distributed --shard-by asset_class
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+import urllib.request
+from types import SimpleNamespace
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional
+import logging
+
+import numpy as np
+
+import firestore_indexes
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+HORIZONS = ['1W', '1M', '6M']
+
+# Symbols used by fix_ml_data_pipeline; synthetic tickers are appended to scale volume
+BASE_SYMBOLS = [
+    '^GSPC', '^DJI', '^IXIC',
+    'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'NVDA',
+    '^N225', '^TOPX',
+    '^FTSE', '^GDAXI', '^FCHI',
+    'USDJPY=X', 'EURUSD=X', 'GBPUSD=X'
+]
+
+
+def _load_emulator_config() -> Dict[str, Any]:
+    """Read emulator ports and the default project from the Firebase config"""
+    config = {'firestore_port': 8080, 'project_id': 'uptrendr-jp'}
+    try:
+        with open(os.path.join(REPO_ROOT, 'firebase.json')) as f:
+            config['firestore_port'] = json.load(f)['emulators']['firestore']['port']
+        with open(os.path.join(REPO_ROOT, '.firebaserc')) as f:
+            config['project_id'] = json.load(f)['projects']['default']
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"⚠️ Using default emulator config: {e}")
+    return config
+
+
+class OperationCounter:
+    """Accumulates Firestore reads/writes and GCS bytes for the active stage"""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.gcs_bytes = 0
+        self.query_shapes: List[Dict[str, Any]] = []  # Whole run, not reset per stage
+
+    def record_query(self, query) -> None:
+        shape = firestore_indexes.shape_from_query(query)
+        if shape:
+            self.query_shapes.append(shape)
+
+    def reset(self) -> None:
+        self.reads = 0
+        self.writes = 0
+        self.gcs_bytes = 0
+
+
+class CountingProxy:
+    """Transparent proxy over Firestore client objects that counts billed operations.
+
+    Queries count one read per returned document (minimum one per query, as
+    Firestore bills), document writes count once each, and batch writes are
+    counted when the batch commits.
+    """
+
+    _WRITE_METHODS = {'set', 'update', 'create', 'delete'}
+
+    def __init__(self, target, counter: OperationCounter):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_counter', counter)
+        object.__setattr__(self, '_pending_writes', 0)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            result = attr(*args, **kwargs)
+            return self._account(name, result)
+
+        return wrapper
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __iter__(self):
+        return iter(self._target)
+
+    def _account(self, name: str, result):
+        kind = type(self._target).__name__
+        counter = self._counter
+
+        if 'Batch' in kind or 'BulkWriter' in kind:
+            if name in self._WRITE_METHODS:
+                object.__setattr__(self, '_pending_writes', self._pending_writes + 1)
+            elif name in ('commit', 'flush', 'close'):
+                counter.writes += self._pending_writes
+                object.__setattr__(self, '_pending_writes', 0)
+            return _wrap(result, counter)
+
+        if kind == 'DocumentReference':
+            if name == 'get':
+                counter.reads += 1
+            elif name in self._WRITE_METHODS:
+                counter.writes += 1
+            return _wrap(result, counter)
+
+        if name == 'stream':
+            counter.record_query(self._target)
+            return self._count_stream(result)
+        if 'Aggregation' in kind and name == 'get':
+            counter.record_query(self._target)
+            counter.reads += 1
+            return result
+        if name == 'get' and isinstance(result, list):
+            counter.record_query(self._target)
+            counter.reads += max(1, len(result))
+            return result
+
+        return _wrap(result, counter)
+
+    def _count_stream(self, stream):
+        returned = 0
+        for doc in stream:
+            returned += 1
+            self._counter.reads += 1
+            yield doc
+        if returned == 0:
+            self._counter.reads += 1
+
+
+def _wrap(value, counter: OperationCounter):
+    """Wrap Firestore client objects so chained calls keep being counted"""
+    module = type(value).__module__ or ''
+    if module.startswith('google.cloud.firestore') and not type(value).__name__.endswith('Snapshot'):
+        return CountingProxy(value, counter)
+    return value
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, CountingProxy) else value
+
+
+class LocalBlob:
+    """Filesystem-backed stand-in for google.cloud.storage.Blob"""
+
+    def __init__(self, path: str, counter: OperationCounter):
+        self.path = path
+        self.name = path
+        self._counter = counter
+
+    def upload_from_file(self, file_obj, content_type: Optional[str] = None) -> None:
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def upload_from_string(self, data, content_type: Optional[str] = None) -> None:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        self._counter.gcs_bytes += len(data)
+
+    def download_as_bytes(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self._counter.gcs_bytes += len(data)
+        return data
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+
+class LocalBucket:
+    def __init__(self, root: str, counter: OperationCounter):
+        self.root = root
+        self._counter = counter
+
+    def blob(self, blob_name: str) -> LocalBlob:
+        return LocalBlob(os.path.join(self.root, blob_name), self._counter)
+
+
+class LocalStorageClient:
+    """Directory-backed stand-in for google.cloud.storage.Client"""
+
+    def __init__(self, root: str, counter: OperationCounter):
+        self.root = root
+        self._counter = counter
+
+    def bucket(self, bucket_name: str) -> LocalBucket:
+        return LocalBucket(os.path.join(self.root, bucket_name), self._counter)
+
+
+class HarnessBackend:
+    """Training coordinator backend that calls the harness's redirected entry points in-process"""
+
+    def __init__(self, harness: 'PipelineHarness'):
+        self.harness = harness
+
+    def invoke(self, horizon: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            module = self.harness.load_training_module(horizon)
+            entry_point = getattr(module, f"train_{horizon.lower()}_models")
+            return entry_point(SimpleNamespace(get_json=lambda silent=True: payload))
+        except Exception as e:
+            return {"error": str(e)}
+
+    def run(self, tasks) -> List[Dict[str, Any]]:
+        return [self.invoke(task.horizon, task.payload()) for task in tasks]
+
+
+class PipelineHarness:
+    """Runs pipeline stages against the emulator and records per-stage metrics"""
+
+    def __init__(self, symbols: int, days: int, seed: int, storage_root: str):
+        config = _load_emulator_config()
+        os.environ.setdefault('FIRESTORE_EMULATOR_HOST', f"localhost:{config['firestore_port']}")
+        os.environ.setdefault('GOOGLE_CLOUD_PROJECT', config['project_id'])
+        self.emulator_host = os.environ['FIRESTORE_EMULATOR_HOST']
+        self.project_id = os.environ['GOOGLE_CLOUD_PROJECT']
+
+        from google.cloud import firestore
+        self.counter = OperationCounter()
+        self.raw_db = firestore.Client(project=self.project_id)
+        self.db = CountingProxy(self.raw_db, self.counter)
+        self.storage_client = LocalStorageClient(storage_root, self.counter)
+
+        self.symbols = self._build_universe(symbols)
+        self.days = days
+        self.seed = seed
+        self.results: List[Dict[str, Any]] = []
+        self._training_modules: Dict[str, Any] = {}
+
+    @staticmethod
+    def _build_universe(count: int) -> List[str]:
+        universe = list(BASE_SYMBOLS[:count])
+        universe += [f"SYN{i:04d}" for i in range(max(0, count - len(BASE_SYMBOLS)))]
+        return universe
+
+    def reset_emulator(self) -> None:
+        """Wipe all documents in the emulator database"""
+        url = (f"http://{self.emulator_host}/emulator/v1/projects/{self.project_id}"
+               f"/databases/(default)/documents")
+        request = urllib.request.Request(url, method='DELETE')
+        urllib.request.urlopen(request, timeout=30).close()
+        logger.info(f"🧹 Cleared Firestore emulator at {self.emulator_host}")
+
+    def run_stage(self, name: str, func, *args, **kwargs) -> Any:
+        """Run one stage and record reads, writes and latency"""
+        logger.info(f"▶️ Stage: {name}")
+        self.counter.reset()
+        started = time.perf_counter()
+        status = 'completed'
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            if isinstance(result, dict) and 'error' in result:
+                status = 'failed'
+        except Exception as e:
+            logger.error(f"❌ Stage {name} failed: {e}")
+            status = 'failed'
+            result = {'error': str(e)}
+        elapsed = time.perf_counter() - started
+
+        self.results.append({
+            'stage': name,
+            'status': status,
+            'reads': self.counter.reads,
+            'writes': self.counter.writes,
+            'gcs_bytes': self.counter.gcs_bytes,
+            'latency_seconds': round(elapsed, 3)
+        })
+        return result
+
+    # ------------------------------------------------------------------ stages
+
+    def seed_market_data(self) -> int:
+        """Write a deterministic synthetic price history in the market_data schema"""
+        rng = np.random.RandomState(self.seed)
+        end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        dates = [end - timedelta(days=self.days - 1 - i) for i in range(self.days)]
+
+        batch = self.db.batch()
+        batch_count = 0
+        written = 0
+
+        for symbol in self.symbols:
+            start_price = rng.uniform(20, 500)
+            log_returns = rng.normal(0.0003, 0.015, self.days)
+            closes = start_price * np.exp(np.cumsum(log_returns))
+            opens = closes * (1 + rng.normal(0, 0.003, self.days))
+            highs = np.maximum(opens, closes) * (1 + np.abs(rng.normal(0, 0.004, self.days)))
+            lows = np.minimum(opens, closes) * (1 - np.abs(rng.normal(0, 0.004, self.days)))
+            volumes = rng.randint(100000, 5000000, self.days)
+            volatility = float(np.std(np.diff(np.log(closes))) * 100 * np.sqrt(252))
+            fundamental_score = float(np.clip(rng.normal(0.5, 0.15), 0, 1))
+
+            for i, date in enumerate(dates):
+                doc = {
+                    'symbol': symbol,
+                    'price': float(closes[i]),
+                    'open': float(opens[i]),
+                    'high': float(highs[i]),
+                    'low': float(lows[i]),
+                    'volume': int(volumes[i]),
+                    'current_price': float(closes[i]),
+                    'close_price': float(closes[i]),
+                    'volatility': volatility,
+                    'fundamental_score': fundamental_score,
+                    'technical_score': float(np.clip(0.5 + log_returns[max(0, i - 5):i + 1].sum() * 5, 0, 1)),
+                    'timestamp': date,
+                    'source': 'pipeline_harness'
+                }
+                doc_ref = self.db.collection('market_data').document(f"{symbol}_{int(date.timestamp())}")
+                batch.set(doc_ref, doc)
+                batch_count += 1
+                written += 1
+
+                if batch_count >= 400:
+                    batch.commit()
+                    batch = self.db.batch()
+                    batch_count = 0
+
+        if batch_count > 0:
+            batch.commit()
+
+        logger.info(f"🌱 Seeded {written} market_data documents for {len(self.symbols)} symbols")
+        return written
+
+    def create_factors(self) -> int:
+        """Run the production factor creation against the emulator"""
+        sys.path.insert(0, REPO_ROOT)
+        import fix_ml_data_pipeline
+        return fix_ml_data_pipeline.create_real_historical_factors(self.db, storage_client=self.storage_client)
+
+    def load_training_module(self, horizon: str):
+        """Import a horizon's Cloud Function with Firestore and GCS redirected locally"""
+        if horizon in self._training_modules:
+            return self._training_modules[horizon]
+
+        path = os.path.join(REPO_ROOT, f"cloud_functions_{horizon.lower()}", 'main.py')
+        spec = importlib.util.spec_from_file_location(f"uptrendr_train_{horizon.lower()}", path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered so process-pool workers (sharded training) can pickle module functions
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+
+        module.db = self.db
+        module.storage = SimpleNamespace(Client=lambda *args, **kwargs: self.storage_client)
+        self._training_modules[horizon] = module
+        return module
+
+    def train_horizon(self, horizon: str) -> Dict[str, Any]:
+        module = self.load_training_module(horizon)
+        entry_point = getattr(module, f"train_{horizon.lower()}_models")
+        return entry_point(SimpleNamespace(get_json=lambda silent=True: {}))
+
+    def train_distributed(self, shard_by: str = 'pooled') -> Dict[str, Any]:
+        """Fan training out through the coordinator; any failed model-group task fails the stage"""
+        sys.path.insert(0, REPO_ROOT)
+        from training_coordinator import TrainingCoordinator
+        coordinator = TrainingCoordinator(HarnessBackend(self), db=self.db, storage_client=self.storage_client)
+        summary = coordinator.run(HORIZONS, shard_by)
+        failed_tasks = [task for outcome in summary['horizons'].values() for task in outcome['failed_tasks']]
+        if failed_tasks:
+            return {**summary, 'error': f"{len(failed_tasks)} training tasks failed: {failed_tasks}"}
+        return summary
+
+    def predict_horizon(self, horizon: str) -> Dict[str, Any]:
+        """Publish market_predictions through the horizon's batch prediction entry point"""
+        module = self.load_training_module(horizon)
+        entry_point = getattr(module, f"predict_{horizon.lower()}_models")
+        return entry_point(SimpleNamespace(get_json=lambda silent=True: {}))
+
+    # ----------------------------------------------------------------- driver
+
+    def run(self, reset: bool = True, distributed: bool = False, shard_by: str = 'pooled') -> List[Dict[str, Any]]:
+        if reset:
+            self.reset_emulator()
+
+        self.run_stage('ingest', self.seed_market_data)
+        self.run_stage('factors', self.create_factors)
+        for horizon in HORIZONS:
+            self.run_stage(f"train_{horizon}", self.train_horizon, horizon)
+        if distributed:
+            self.run_stage('train_fanout', self.train_distributed, shard_by)
+        for horizon in HORIZONS:
+            self.run_stage(f"predict_{horizon}", self.predict_horizon, horizon)
+        return self.results
+
+    def check_indexes(self) -> List[str]:
+        """Query shapes seen during the run that firestore.indexes.json would not serve in production"""
+        with open(firestore_indexes.INDEX_FILE) as f:
+            config = json.load(f)
+        shapes = list({firestore_indexes._shape_key(shape): shape for shape in self.counter.query_shapes}.values())
+        for shape in firestore_indexes.unregistered(shapes):
+            logger.warning(f"⚠️ Query not in QUERY_REGISTRY: {shape['collection']} {shape['filters']} "
+                           f"order_by {shape['order_by']}")
+        problems = firestore_indexes.find_unindexed(shapes, config)
+        for problem in problems:
+            logger.error(f"❌ Unindexed query: {problem}")
+        logger.info(f"🗂️ Checked {len(shapes)} distinct query shapes against {os.path.basename(firestore_indexes.INDEX_FILE)}")
+        return problems
+
+    def print_report(self) -> None:
+        print("\n" + "=" * 72)
+        print(f"📊 PIPELINE HARNESS REPORT ({len(self.symbols)} symbols × {self.days} days, seed {self.seed})")
+        print("=" * 72)
+        print(f"{'stage':<14}{'status':<11}{'reads':>9}{'writes':>9}{'gcs_kb':>10}{'latency_s':>12}")
+        print("-" * 72)
+        for row in self.results:
+            print(f"{row['stage']:<14}{row['status']:<11}{row['reads']:>9}{row['writes']:>9}"
+                  f"{row['gcs_bytes'] / 1024:>10.1f}{row['latency_seconds']:>12.3f}")
+        print("-" * 72)
+        print(f"{'total':<25}{sum(r['reads'] for r in self.results):>9}"
+              f"{sum(r['writes'] for r in self.results):>9}"
+              f"{sum(r['gcs_bytes'] for r in self.results) / 1024:>10.1f}"
+              f"{sum(r['latency_seconds'] for r in self.results):>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Uptrendr pipeline against the Firestore emulator")
+    parser.add_argument('--symbols', type=int, default=len(BASE_SYMBOLS), help="Number of symbols to seed")
+    parser.add_argument('--days', type=int, default=60, help="Days of daily bars per symbol")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for synthetic prices")
+    parser.add_argument('--storage-root', default=os.path.join(REPO_ROOT, '.harness_gcs'),
+                        help="Directory used as the local GCS stand-in")
+    parser.add_argument('--no-reset', action='store_true', help="Keep existing emulator data")
+    parser.add_argument('--json', help="Write the stage metrics to this JSON file")
+    parser.add_argument('--distributed', action='store_true',
+                        help="Also train through the coordinator's model-group fan-out")
+    parser.add_argument('--shard-by', choices=['pooled', 'asset_class', 'symbol'], default='pooled',
+                        help="Shard mode for the --distributed stage")
+    parser.add_argument('--check-indexes', action='store_true',
+                        help="Fail if a query the stages issued is not served by firestore.indexes.json")
+    args = parser.parse_args()
+
+    harness = PipelineHarness(args.symbols, args.days, args.seed, args.storage_root)
+    results = harness.run(reset=not args.no_reset, distributed=args.distributed, shard_by=args.shard_by)
+    harness.print_report()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"💾 Wrote stage metrics to {args.json}")
+
+    unindexed = harness.check_indexes() if args.check_indexes else []
+
+    if any(row['status'] != 'completed' for row in results) or unindexed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ sys.path.append('/Users/sohntsang/Desktop/Uptrendr/Uptrendr')
 
 from google.cloud import firestore
 import firebase_admin
+from firestore_bulk_delete import BulkDeleter
 
 try:
     app = firebase_admin.get_app()
@@ -19,16 +20,10 @@ db = firestore.Client()
 print("🗑️ Removing 'stocks' collection...")
 
 try:
-    # Delete all documents in the stocks collection
-    collection_ref = db.collection('stocks')
-    docs = list(collection_ref.stream())
-    
-    if docs:
-        batch = db.batch()
-        for doc in docs:
-            batch.delete(doc.reference)
-        batch.commit()
-        print(f"✅ Deleted {len(docs)} documents from stocks collection")
+    # Keys-only, partitioned and concurrent, including any subcollections
+    deleted = BulkDeleter(db).delete_collection('stocks')
+    if deleted:
+        print(f"✅ Deleted {deleted} documents from stocks collection")
     else:
         print("✅ Stocks collection was empty")
     
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+HEADLINE SENTIMENT SCORING
+==========================
+
+Scores japanese_news headlines on CPU and feeds per-symbol daily sentiment
+into historical_factors:
+
+1. Score      - a finance lexicon (Japanese and English terms, with
+                negation) compiled into one regex alternation, so a batch
+                of headlines is a single pass of finditer per headline
+2. Cache      - scores are keyed by a hash of the NFKC-normalized headline
+                and the lexicon version. Re-ingested headlines hit the
+                in-process cache, and news docs already carrying the current
+                hash are neither re-scored nor rewritten
+3. Aggregate  - mean score per symbol per UTC day (via symbols_mentioned),
+                written to sentiment_analysis/{symbol}_{YYYYMMDD}, which the
+                factor builder joins on symbol and date
+
+Scores are in [0, 1] with 0.5 neutral, the range of the other factor columns.
+
+Usage:
+    python sentiment_scoring.py --days 30       # score news, write daily aggregates
+    python sentiment_scoring.py --benchmark     # check NEGATION_CASES, then headlines per second on this CPU
+    python sentiment_scoring.py --check         # check NEGATION_CASES only
+"""
+
+import re
+import math
+import time
+import hashlib
+import argparse
+import unicodedata
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEXICON_VERSION = 'fin-lex-1'
+BATCH_LIMIT = 400
+CACHE_LIMIT = 200_000
+NEUTRAL = 0.5
+
+# Term -> polarity weight. Longer terms win over their substrings (上方修正 over 修正)
+LEXICON = {
+    # Japanese
+    '上昇': 1.0, '急騰': 1.5, '続伸': 1.0, '反発': 0.8, '高値': 0.8, '最高値': 1.2, '上場来高値': 1.2,
+    '上方修正': 1.5, '増益': 1.2, '最高益': 1.5, '増収': 0.8, '黒字': 1.0, '黒字転換': 1.5, '好調': 1.0,
+    '好決算': 1.5, '堅調': 0.8, '回復': 0.8, '改善': 0.8, '増配': 1.2, '自社株買い': 1.0, '買い越し': 0.6,
+    '利下げ': 0.5, '格上げ': 1.2, '拡大': 0.5, '成長': 0.6,
+    '下落': -1.0, '急落': -1.5, '続落': -1.0, '反落': -0.8, '安値': -0.8, '最安値': -1.2, '年初来安値': -1.2,
+    '下方修正': -1.5, '減益': -1.2, '減収': -0.8, '赤字': -1.0, '赤字転落': -1.5, '不振': -1.0, '低迷': -1.0,
+    '悪化': -1.0, '懸念': -0.8, '減配': -1.2, '無配': -1.2, '売り越し': -0.6, '利上げ': -0.5, '格下げ': -1.2,
+    '景気後退': -1.2, '倒産': -1.5, '損失': -1.0, '不正': -1.2, '縮小': -0.5, '警戒': -0.6,
+    # English
+    'surge': 1.2, 'surges': 1.2, 'soar': 1.2, 'soars': 1.2, 'rally': 1.0, 'rallies': 1.0, 'jump': 1.0,
+    'jumps': 1.0, 'gain': 0.8, 'gains': 0.8, 'rise': 0.8, 'rises': 0.8, 'beat': 1.0, 'beats': 1.0,
+    'upgrade': 1.2, 'upgraded': 1.2, 'record high': 1.2, 'strong': 0.8, 'profit': 0.6, 'growth': 0.6,
+    'bullish': 1.0, 'outperform': 1.0, 'rebound': 0.8, 'raises guidance': 1.5, 'buyback': 0.8,
+    'plunge': -1.5, 'plunges': -1.5, 'slump': -1.2, 'slumps': -1.2, 'fall': -0.8, 'falls': -0.8,
+    'drop': -0.8, 'drops': -0.8, 'miss': -1.0, 'misses': -1.0, 'downgrade': -1.2, 'downgraded': -1.2,
+    'loss': -1.0, 'losses': -1.0, 'weak': -0.8, 'bearish': -1.0, 'recession': -1.2, 'default': -1.2,
+    'bankruptcy': -1.5, 'lawsuit': -0.8, 'probe': -0.6, 'cuts guidance': -1.5, 'warning': -0.8,
+    'record low': -1.2, 'underperform': -1.0
+}
+
+# A negator reaches the nearest term up to three words on; the scope stops at clause
+# punctuation (only word characters and spaces are skipped) and at a contrasting conjunction
+_EN_NEGATION = (r"(?P<neg>\b(?:not|no|never|without|fail(?:s|ed)? to|(?:does|did|do|is|was|were|are|wo)n't)\s+"
+                r"(?:(?!(?:but|yet|while|though|although)\b)\w+\s+){0,3}?)?")
+_JA_NEGATION = r"(?P<jneg>(?:は|が|も)?(?:せず|しない|しなかった|ならず|できず|なし))?"
+
+
+def _term_pattern(term: str) -> str:
+    escaped = re.escape(term)
+    return rf"\b{escaped}\b" if term.isascii() else escaped
+
+
+TERM_REGEX = re.compile(
+    _EN_NEGATION
+    + '(?P<term>' + '|'.join(_term_pattern(t) for t in sorted(LEXICON, key=len, reverse=True)) + ')'
+    + _JA_NEGATION
+)
+
+
+def normalize(headline: str) -> str:
+    """NFKC (full-width → half-width), lowercase, single spaces"""
+    return ' '.join(unicodedata.normalize('NFKC', headline).lower().split())
+
+
+def headline_hash(headline: str, version: str = LEXICON_VERSION) -> str:
+    return hashlib.blake2b(f"{version}\x00{normalize(headline)}".encode('utf-8'), digest_size=12).hexdigest()
+
+
+class LexiconModel:
+    """Polarity lexicon scorer; version is part of every cache key"""
+
+    version = LEXICON_VERSION
+
+    def score(self, text: str) -> float:
+        total, hits = 0.0, 0
+        for match in TERM_REGEX.finditer(text):
+            weight = LEXICON[match.group('term')]
+            total += -weight if match.group('neg') or match.group('jneg') else weight
+            hits += 1
+        if not hits:
+            return NEUTRAL
+        # Damp headlines that stack many terms, then squash into [0, 1]
+        return round(NEUTRAL + 0.5 * math.tanh(total / math.sqrt(hits)), 4)
+
+    def score_batch(self, texts: List[str]) -> List[float]:
+        return [self.score(text) for text in texts]
+
+
+class SentimentScorer:
+    """Batched headline scoring with a hash-keyed cache in front of the model"""
+
+    def __init__(self, model=None, cache_limit: int = CACHE_LIMIT):
+        self.model = model or LexiconModel()
+        self.cache: Dict[str, float] = {}
+        self.cache_limit = cache_limit
+        self.stats = {'scored': 0, 'cache_hits': 0}
+
+    def score_headlines(self, headlines: List[str]) -> List[Tuple[str, float]]:
+        """(hash, score) per headline; each distinct headline reaches the model at most once"""
+        hashes = [headline_hash(h, self.model.version) for h in headlines]
+        pending = {}
+        for digest, headline in zip(hashes, headlines):
+            if digest not in self.cache and digest not in pending:
+                pending[digest] = normalize(headline)
+
+        if pending:
+            if len(self.cache) + len(pending) > self.cache_limit:
+                self.cache.clear()
+            self.cache.update(zip(pending, self.model.score_batch(list(pending.values()))))
+        self.stats['scored'] += len(pending)
+        self.stats['cache_hits'] += len(headlines) - len(pending)
+        return [(digest, self.cache[digest]) for digest in hashes]
+
+
+# Shared across calls so warm Cloud Function instances keep their cache
+default_scorer = SentimentScorer()
+
+
+def _day_start(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def aggregate_daily(rows: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, datetime], Dict[str, Any]]:
+    """(symbol, UTC day) -> mean sentiment and headline counts, from scored news rows"""
+    daily = {}
+    for row in rows:
+        day = _day_start(row['timestamp'])
+        for symbol in row.get('symbols_mentioned') or []:
+            entry = daily.setdefault((symbol, day), {'total': 0.0, 'headlines': 0, 'positive': 0, 'negative': 0})
+            entry['total'] += row['sentiment']
+            entry['headlines'] += 1
+            entry['positive'] += row['sentiment'] > 0.55
+            entry['negative'] += row['sentiment'] < 0.45
+    return {
+        key: {'sentiment': round(e['total'] / e['headlines'], 4), 'headline_count': e['headlines'],
+              'positive_headlines': e['positive'], 'negative_headlines': e['negative']}
+        for key, e in daily.items()
+    }
+
+
+def _commit_in_batches(db, operations: List[tuple]) -> None:
+    for start in range(0, len(operations), BATCH_LIMIT):
+        batch = db.batch()
+        for kind, ref, body in operations[start:start + BATCH_LIMIT]:
+            if kind == 'update':
+                batch.update(ref, body)
+            else:
+                batch.set(ref, body)
+        batch.commit()
+
+
+def score_news(db, since: datetime, scorer: Optional[SentimentScorer] = None) -> Dict[str, Any]:
+    """Score japanese_news since `since` and write per-symbol daily aggregates to sentiment_analysis"""
+    scorer = scorer or default_scorer
+    started = time.perf_counter()
+    docs = list(db.collection('japanese_news').where('timestamp', '>=', since).stream())
+    rows = [(doc.reference, doc.to_dict()) for doc in docs]
+    rows = [(ref, row) for ref, row in rows if row.get('headline') and row.get('timestamp')]
+
+    # Scores already stored under the current hash (which includes the model version) are reused as is
+    for _, row in rows:
+        if row.get('sentiment_hash') and 'sentiment' in row:
+            scorer.cache.setdefault(row['sentiment_hash'], row['sentiment'])
+
+    scored = scorer.score_headlines([row['headline'] for _, row in rows])
+    updates = []
+    for (ref, row), (digest, score) in zip(rows, scored):
+        if row.get('sentiment_hash') != digest or row.get('sentiment') != score:
+            updates.append(('update', ref, {'sentiment': score, 'sentiment_hash': digest,
+                                            'sentiment_model': scorer.model.version}))
+        row['sentiment'] = score
+
+    daily = aggregate_daily(row for _, row in rows)
+    now = datetime.now(timezone.utc)
+    aggregates = [
+        ('set', db.collection('sentiment_analysis').document(f"{symbol}_{day:%Y%m%d}"), {
+            'symbol': symbol,
+            'date': day.date().isoformat(),
+            **stats,
+            'timestamp': day,
+            'source': 'headline_sentiment',
+            'sentiment_model': scorer.model.version,
+            'updated_at': now
+        })
+        for (symbol, day), stats in daily.items()
+    ]
+    _commit_in_batches(db, updates + aggregates)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"📰 Scored {len(rows)} headlines ({scorer.stats['cache_hits']} cached, "
+                f"{len(updates)} docs updated) into {len(aggregates)} symbol-days in {elapsed:.2f}s")
+    return {'headlines': len(rows), 'docs_updated': len(updates), 'symbol_days': len(aggregates),
+            'cache_hits': scorer.stats['cache_hits'], 'elapsed_s': round(elapsed, 3)}
+
+
+# (headline, expected direction): 1 bullish, -1 bearish
+NEGATION_CASES = [
+    ('SoftBank does not expect further losses', 1),   # Two-word gap
+    ('Exporters did not see any gains', -1),          # Two-word gap
+    ('Shares did not fall', 1),
+    ('No comment from management, shares fall', -1),  # Comma ends the scope
+    ('Company did not comment but losses mount', -1), # 'but' ends the scope
+    ('株価は上昇せず', -1)
+]
+
+
+def check_negation(model: Optional[LexiconModel] = None) -> None:
+    """Raise AssertionError if a NEGATION_CASES headline scores on the wrong side of neutral"""
+    model = model or LexiconModel()
+    for headline, direction in NEGATION_CASES:
+        score = model.score(normalize(headline))
+        assert (score - NEUTRAL) * direction > 0, f"{headline!r} scored {score}, expected {'bullish' if direction > 0 else 'bearish'}"
+
+
+def benchmark(count: int = 20000) -> float:
+    check_negation()
+    samples = [
+        'トヨタ、通期業績を上方修正 最高益を更新へ', '日経平均が続落、円高進行で輸出株に売り',
+        'ソニーG、半導体事業が好調で増益', '三菱UFJ、減益も増配を発表', '日銀の利上げ観測で銀行株が反発',
+        'Nikkei rallies as exporters gain on weaker yen', 'Toyota shares plunge after recall probe',
+        'SoftBank does not expect further losses', 'Fast Retailing beats estimates, raises guidance',
+        '任天堂、新作不振で下方修正 株価は年初来安値'
+    ]
+    headlines = [f"{samples[i % len(samples)]} ({i})" for i in range(count)]  # Distinct, so nothing is cached
+    scorer = SentimentScorer()
+    started = time.perf_counter()
+    scorer.score_headlines(headlines)
+    rate = count / (time.perf_counter() - started)
+    logger.info(f"⚡ {rate:,.0f} headlines/s on one CPU ({rate * 60:,.0f}/min)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score japanese_news headlines and aggregate daily sentiment")
+    parser.add_argument('--days', type=int, default=30, help="Score news from the last N days")
+    parser.add_argument('--benchmark', action='store_true', help="Measure scoring throughput and exit")
+    parser.add_argument('--check', action='store_true', help="Check the negation cases and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        check_negation()
+        logger.info(f"✅ {len(NEGATION_CASES)} negation cases score on the expected side")
+        return
+    if args.benchmark:
+        benchmark()
+        return
+
+    from google.cloud import firestore
+    print(score_news(firestore.Client(), datetime.now(timezone.utc) - timedelta(days=args.days)))
+
+
+if __name__ == "__main__":
+    main()
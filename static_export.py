@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+UPTRENDR STATIC SNAPSHOT EXPORT
+===============================
+
+Renders the latest market_predictions and upcoming calendar days into static
+JSON under Firebase Hosting, so read-heavy app traffic is served from the CDN
+instead of billed Firestore reads:
+
+    public/data/v{n}/predictions_{1W,1M,6M}.json   every category of a horizon
+    public/data/v{n}/calendar.json                 the next CALENDAR_DAYS days
+    public/data/latest.json                        pointer to the current version
+
+Each file is also written as .json.gz (and .json.br when the brotli package
+is installed). A version directory is written in full before latest.json is
+swapped in with an atomic rename. Version directories are immutable and
+cached for a year, while the pointer is cached for a minute (see the
+hosting headers in firebase.json). A new version is only cut when the
+rendered content changes. The previous KEEP_VERSIONS stay on disk so
+clients holding an older pointer can still fetch them.
+
+Usage:
+    python static_export.py                 # export into public/data
+    python static_export.py --deploy        # export, then firebase deploy --only hosting
+"""
+
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime, date, timezone, timedelta
+from typing import Dict, List, Any, Optional
+import logging
+
+from google.cloud import firestore
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROJECT_ID = "uptrendr-jp"
+HORIZONS = ['1W', '1M', '6M']
+CATEGORIES = ['global_indices', 'fx_pairs', 'us_sectors', 'japanese_sectors']
+CALENDAR_DAYS = 14
+KEEP_VERSIONS = 3
+EXPORT_ROOT = os.path.join('public', 'data')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def render(payload: Any) -> bytes:
+    """Canonical JSON: stable key order so unchanged content hashes the same"""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                      default=_json_default).encode('utf-8')
+
+
+def encodings(body: bytes) -> Dict[str, bytes]:
+    """Suffix -> file contents for the plain and precompressed variants"""
+    variants = {'': body, '.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class StaticExporter:
+    """Exports Firestore prediction and calendar snapshots as versioned static files"""
+
+    def __init__(self, db=None, root: str = EXPORT_ROOT, keep_versions: int = KEEP_VERSIONS):
+        self.db = db or firestore.Client()
+        self.root = root
+        self.keep_versions = keep_versions
+
+    def load_predictions(self) -> Dict[str, Dict[str, Any]]:
+        """Manifest version and category docs of every horizon, fetched in one round trip"""
+        refs, keys = [], {}
+        for h in HORIZONS:
+            horizon_ref = self.db.collection('market_predictions').document(h)
+            for c, ref in [(None, horizon_ref)] + [(c, horizon_ref.collection(c).document('latest')) for c in CATEGORIES]:
+                refs.append(ref)
+                keys[ref.path] = (h, c)
+
+        horizons = {h: {'horizon': h, 'version': None, 'categories': {}} for h in HORIZONS}
+        for snapshot in self.db.get_all(refs):
+            if not snapshot.exists:
+                continue
+            h, c = keys[snapshot.reference.path]
+            if c is None:
+                horizons[h]['version'] = snapshot.to_dict().get('version')
+            else:
+                horizons[h]['categories'][c] = snapshot.to_dict()
+        return {h: payload for h, payload in horizons.items() if payload['categories']}
+
+    def load_calendar(self, start: Optional[date] = None, days: int = CALENDAR_DAYS) -> Dict[str, Any]:
+        start = start or datetime.now(timezone.utc).date()
+        day_ids = [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+        refs = [self.db.collection('calendar').document(day_id) for day_id in day_ids]
+        entries = {snapshot.id: snapshot.to_dict() for snapshot in self.db.get_all(refs) if snapshot.exists}
+        return {'start': day_ids[0], 'days': days, 'dates': entries}
+
+    def read_pointer(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.root, 'latest.json'), 'rb') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def existing_versions(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(match.group(1)) for name in os.listdir(self.root)
+                      if (match := re.fullmatch(r'v(\d+)', name)))
+
+    def prune(self, current: int) -> List[int]:
+        """Drop version directories older than the newest keep_versions"""
+        versions = self.existing_versions()
+        keep = set(versions[-self.keep_versions:]) | {current}
+        stale = [v for v in versions if v not in keep]
+        for version in stale:
+            shutil.rmtree(os.path.join(self.root, f'v{version}'))
+        return stale
+
+    def export(self, force: bool = False) -> Dict[str, Any]:
+        files = {f'predictions_{h}': payload for h, payload in self.load_predictions().items()}
+        if not files:
+            return {"error": "No published predictions to export"}
+        files['calendar'] = self.load_calendar()
+
+        rendered = {name: render(payload) for name, payload in files.items()}
+        content_hash = hashlib.sha256(b''.join(name.encode('utf-8') + body for name, body in sorted(rendered.items()))).hexdigest()[:16]
+        pointer = self.read_pointer()
+        if not force and pointer.get('content_hash') == content_hash:
+            logger.info(f"⏭️ Snapshot content unchanged, keeping v{pointer['version']}")
+            return {"success": True, "skipped": True, "version": pointer['version'], "content_hash": content_hash}
+
+        # Write the whole version directory, then switch the pointer with one rename
+        version = max([pointer.get('version', 0), *self.existing_versions()]) + 1
+        version_dir = os.path.join(self.root, f'v{version}')
+        staging_dir = f"{version_dir}.staging"
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        sizes = {}
+        for name, body in rendered.items():
+            for suffix, data in encodings(body).items():
+                with open(os.path.join(staging_dir, f'{name}.json{suffix}'), 'wb') as f:
+                    f.write(data)
+                sizes[f'{name}.json{suffix}'] = len(data)
+        os.replace(staging_dir, version_dir)
+
+        new_pointer = {
+            'version': version,
+            'content_hash': content_hash,
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'sources': {name: payload['version'] for name, payload in files.items() if name.startswith('predictions_')},
+            'files': {name: f'v{version}/{name}.json' for name in rendered},
+            'encodings': ['gzip', 'br'] if brotli is not None else ['gzip']
+        }
+        _write_atomic(os.path.join(self.root, 'latest.json'), render(new_pointer))
+        pruned = self.prune(version)
+
+        logger.info(f"✅ Exported v{version} ({sum(len(b) for b in rendered.values())} bytes raw, "
+                    f"{sum(size for name, size in sizes.items() if name.endswith('.gz'))} bytes gzip)")
+        if brotli is None:
+            logger.warning("brotli is not installed; only gzip variants were written")
+        return {"success": True, "version": version, "content_hash": content_hash,
+                "files": sizes, "pruned_versions": pruned}
+
+
+def deploy_hosting(project: str = PROJECT_ID) -> None:
+    subprocess.run(['firebase', 'deploy', '--only', 'hosting', '--project', project], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export prediction and calendar snapshots as static Hosting JSON")
+    parser.add_argument('--root', default=EXPORT_ROOT, help="Output directory inside the Hosting public dir")
+    parser.add_argument('--keep-versions', type=int, default=KEEP_VERSIONS)
+    parser.add_argument('--force', action='store_true', help="Cut a new version even if the content is unchanged")
+    parser.add_argument('--deploy', action='store_true', help="Run firebase deploy --only hosting after exporting")
+    parser.add_argument('--project', default=PROJECT_ID)
+    args = parser.parse_args()
+
+    summary = StaticExporter(root=args.root, keep_versions=args.keep_versions).export(force=args.force)
+    print(json.dumps(summary, indent=2))
+    if args.deploy and summary.get('success') and not summary.get('skipped'):
+        deploy_hosting(args.project)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+UPTRENDR TRAINING COORDINATOR
+=============================
+
+Fans model training out across Cloud Function instances instead of fitting
+every model of a horizon inside one 2GB / 540s invocation:
+
+1. Plan      - ask each horizon function for its shard routing (sharded mode only)
+2. Dispatch  - one task per horizon x model group x shard, sent as an HTTP
+               invocation of the existing train_{1w,1m,6m}_models entry point
+3. Merge     - download the partial artifacts of every (horizon, shard), union
+               their models into one artifact and publish trained_models with
+               the input fingerprint probed before dispatch, so the next run
+               of the horizon function can skip unchanged inputs
+
+The local backend runs the same tasks through a process pool against the
+entry points imported from cloud_functions_*/main.py, so a fan-out can be
+tested end-to-end with the Firestore emulator.
+
+Usage:
+    python training_coordinator.py --backend http --base-url https://asia-northeast1-uptrendr-jp.cloudfunctions.net
+    python training_coordinator.py --backend local --horizons 1W 1M --shard-by asset_class
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import importlib.util
+import multiprocessing
+from io import BytesIO
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+import logging
+
+import numpy as np
+import requests
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+BUCKET_NAME = 'uptrendr-models'
+
+HORIZON_FUNCTIONS = {
+    '1W': 'train_1w_models',
+    '1M': 'train_1m_models',
+    '6M': 'train_6m_models'
+}
+
+# Each horizon's roster split into groups of comparable cost; one task per group
+MODEL_GROUPS = {
+    '1W': [
+        ['random_forest', 'gradient_boosting'],
+        ['xgboost', 'ridge', 'lasso', 'elastic_net']
+    ],
+    '1M': [
+        ['random_forest', 'gradient_boosting'],
+        ['xgboost', 'lightgbm'],
+        ['neural_network', 'ridge', 'lasso', 'elastic_net', 'bayesian_ridge']
+    ],
+    '6M': [
+        ['random_forest', 'gradient_boosting'],
+        ['xgboost', 'lightgbm'],
+        ['neural_network', 'huber', 'svr'],
+        ['ridge', 'lasso', 'elastic_net', 'bayesian_ridge']
+    ]
+}
+
+
+@dataclass
+class TrainingTask:
+    """One invocation of a horizon's training entry point"""
+    horizon: str
+    models: List[str]
+    shard_by: str = 'pooled'
+    shard: Optional[str] = None
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def task_id(self) -> str:
+        shard = self.shard or 'pooled'
+        return f"{self.horizon}/{shard}/{'+'.join(self.models)}"
+
+    def payload(self) -> Dict[str, Any]:
+        payload = {**self.options, 'models': self.models, 'shard_by': self.shard_by, 'publish': False,
+                   'task_id': '+'.join(self.models)}
+        if self.shard:
+            payload['shards'] = [self.shard]
+        return payload
+
+
+class HttpBackend:
+    """Dispatches tasks as concurrent HTTP invocations of the deployed functions"""
+
+    def __init__(self, base_url: str, token: Optional[str] = None, timeout: int = 540, max_workers: int = 32):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    def invoke(self, horizon: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        try:
+            response = requests.post(f"{self.base_url}/{HORIZON_FUNCTIONS[horizon]}",
+                                     json=payload, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            return {"error": str(e)}
+
+    def run(self, tasks: List[TrainingTask]) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tasks)))) as pool:
+            return list(pool.map(lambda task: self.invoke(task.horizon, task.payload()), tasks))
+
+
+class _LocalRequest:
+    """Minimal stand-in for the flask request handed to functions_framework entry points"""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+
+    def get_json(self, silent=True):
+        return self.payload
+
+
+_local_modules: Dict[str, Any] = {}
+
+
+def _load_horizon_module(horizon: str):
+    """Import a horizon's Cloud Function module once per process"""
+    name = f"uptrendr_train_{horizon.lower()}"
+    if horizon not in _local_modules and name in sys.modules:
+        # Already imported (and possibly redirected) by the caller, e.g. the pipeline harness
+        _local_modules[horizon] = sys.modules[name]
+    if horizon not in _local_modules:
+        path = os.path.join(REPO_ROOT, f"cloud_functions_{horizon.lower()}", 'main.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered so the module's own shard pool can pickle its functions; deployed
+        # artifacts pickle CompiledTrees from the function's own module, 'main'
+        sys.modules[spec.name] = module
+        sys.modules.setdefault('main', module)
+        spec.loader.exec_module(module)
+        _local_modules[horizon] = module
+    return _local_modules[horizon]
+
+
+def _run_local_task(horizon: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Process-pool worker: call the entry point in-process"""
+    try:
+        module = _load_horizon_module(horizon)
+        return getattr(module, HORIZON_FUNCTIONS[horizon])(_LocalRequest(payload))
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class LocalBackend:
+    """Runs tasks in a local process pool; Firestore/GCS follow the usual emulator env vars"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def invoke(self, horizon: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return _run_local_task(horizon, payload)
+
+    def run(self, tasks: List[TrainingTask]) -> List[Dict[str, Any]]:
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=max(1, min(self.max_workers, len(tasks))),
+                                 mp_context=multiprocessing.get_context(start_method)) as pool:
+            return list(pool.map(_run_local_task, [task.horizon for task in tasks],
+                                 [task.payload() for task in tasks]))
+
+
+def _probe_factor_inputs(query) -> Dict[str, Any]:
+    """Same probe as the training functions' probe_factor_inputs"""
+    row_count = query.count().get()[0][0].value
+    newest = list(query.order_by('timestamp', direction='DESCENDING').limit(1).stream())
+    last_write = list(query.order_by('updated_at', direction='DESCENDING').limit(1).stream())
+    return {'row_count': int(row_count), 'max_timestamp': newest[0].get('timestamp') if newest else None,
+            'max_updated_at': last_write[0].get('updated_at') if last_write else None}
+
+
+class TrainingCoordinator:
+    """Plans, dispatches and merges a fan-out training run"""
+
+    def __init__(self, backend, db=None, storage_client=None):
+        self.backend = backend
+        if db is None or storage_client is None:
+            from google.cloud import firestore, storage
+            db = db or firestore.Client()
+            storage_client = storage_client or storage.Client()
+        self.db = db
+        self.bucket = storage_client.bucket(BUCKET_NAME)
+
+    def input_fingerprint(self, horizon: str, shard_by: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """The fingerprint a full in-process run with these options would store, minus the content hash"""
+        factors = self.db.collection('historical_factors')
+        probe = _probe_factor_inputs(factors.where('horizon', '==', horizon))
+        probe = {'scope': horizon, **probe} if probe['row_count'] else {'scope': 'all', **_probe_factor_inputs(factors)}
+        return {
+            **probe,
+            'config': {'shard_by': shard_by, 'selection_scorer': options.get('selection_scorer', 'f_regression'),
+                       'quantiles': options.get('quantiles', False), 'models': None}
+        }
+
+    def plan(self, horizons: List[str], shard_by: str = 'pooled',
+             options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the task list, asking each function for its shard routing when sharding"""
+        options = options or {}
+        routing, tasks, fingerprints = {}, [], {}
+        for horizon in horizons:
+            # Probed before any task reads rows, so rows landing mid-run force the next run to check
+            fingerprints[horizon] = self.input_fingerprint(horizon, shard_by, options)
+            shards = [None]
+            if shard_by != 'pooled':
+                routing[horizon] = self.backend.invoke(horizon, {**options, 'shard_by': shard_by, 'plan_only': True})
+                if 'error' in routing[horizon]:
+                    logger.error(f"❌ Could not plan {horizon} shards: {routing[horizon]['error']}")
+                    continue
+                shards = routing[horizon]['shards']
+            for shard in shards:
+                for index, models in enumerate(MODEL_GROUPS[horizon]):
+                    # The quantile booster is independent of the roster, so one task fits it
+                    task_options = {**options, 'quantiles': bool(options.get('quantiles')) and index == 0}
+                    tasks.append(TrainingTask(horizon, models, shard_by, shard, task_options))
+        return {'tasks': tasks, 'routing': routing, 'fingerprints': fingerprints}
+
+    def _partials(self, tasks: List[TrainingTask], results: List[Dict[str, Any]]) -> Dict[tuple, List[Dict[str, Any]]]:
+        """Flatten task responses into per-(horizon, shard) partial artifacts"""
+        partials = {}
+        for task, result in zip(tasks, results):
+            if 'error' in result:
+                logger.warning(f"⚠️ Task {task.task_id} failed: {result['error']}")
+                continue
+            if task.shard_by == 'pooled':
+                partials.setdefault((task.horizon, None), []).append({
+                    'gcs_blob_name': result['gcs_blob'],
+                    'model_performances': result['model_performances'],
+                    'training_samples': result['samples_processed'],
+                    'data_through': result['data_through'],
+                    'content_hash': result.get('content_hash')
+                })
+                continue
+            for shard, detail in result['shards'].items():
+                partials.setdefault((task.horizon, shard), []).append({
+                    **detail, 'data_through': result['data_through'], 'content_hash': result.get('content_hash')
+                })
+        return partials
+
+    def _merge_artifacts(self, horizon: str, shard: Optional[str], partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Union the models of partial artifacts trained on identical features and scaling"""
+        module = _load_horizon_module(horizon)
+        artifacts = [pickle.loads(self.bucket.blob(p['gcs_blob_name']).download_as_bytes()) for p in partials]
+        performances = {}
+        for partial in partials:
+            for name, performance in partial['model_performances'].items():
+                if name not in performances or performance['r2'] > performances[name]['r2']:
+                    performances[name] = performance
+
+        base = artifacts[0]
+        compatible = all(
+            artifact['selected_features'] == base['selected_features']
+            and np.allclose(artifact['scaler'].mean_, base['scaler'].mean_)
+            for artifact in artifacts[1:]
+        )
+        if not compatible:
+            # Tasks saw different data (rows arrived mid-run): keep the best single artifact
+            best = max(range(len(partials)), key=lambda i: max(p['r2'] for p in partials[i]['model_performances'].values()))
+            logger.warning(f"⚠️ {horizon}/{shard or 'pooled'} partials disagree on features, keeping one artifact")
+            return {**partials[best], 'best_model_name': artifacts[best]['training_state']['best_model'],
+                    'model_performance': partials[best]['model_performances'][artifacts[best]['training_state']['best_model']],
+                    'models_trained': list(artifacts[best]['trained_models'])}
+
+        trained_models, owners = {}, {}
+        for artifact, partial in zip(artifacts, partials):
+            for name, model in artifact['trained_models'].items():
+                if performances.get(name) is partial['model_performances'].get(name):
+                    trained_models[name] = model
+                    owners[name] = artifact
+        best_model_name = max(trained_models, key=lambda name: performances[name]['r2'])
+
+        # Calibration and reference error come from the artifact that trained the best model
+        merged = {
+            **base,
+            'trained_models': trained_models,
+            'training_state': {**owners[best_model_name]['training_state'], 'best_model': best_model_name},
+            'quantile_model': next((a['quantile_model'] for a in artifacts if a.get('quantile_model')), None),
+            # Each partial compiled only its own roster, so the merged one is compiled afresh
+            'compiled_trees': module.compile_tree_models(trained_models),
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        buffer = BytesIO()
+        pickle.dump(merged, buffer)
+        buffer.seek(0)
+
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+        blob_name = f"models/{horizon}/{shard}/{timestamp}.pkl" if shard else f"models/{horizon}_{timestamp}.pkl"
+        self.bucket.blob(blob_name).upload_from_file(buffer, content_type='application/octet-stream')
+        logger.info(f"✅ Merged {len(partials)} partial artifacts into gs://{BUCKET_NAME}/{blob_name}")
+
+        return {
+            'gcs_blob_name': blob_name,
+            'best_model_name': best_model_name,
+            'model_performance': performances[best_model_name],
+            'models_trained': list(trained_models),
+            'training_samples': partials[0]['training_samples'],
+            'data_through': max(p['data_through'] for p in partials),
+            'symbols': partials[0].get('symbols', [])
+        }
+
+    def publish(self, horizon: str, shard_by: str, merged: Dict[Optional[str], Dict[str, Any]],
+                routing: Dict[str, Any], tasks: int, fingerprint: Dict[str, Any]) -> None:
+        """Write the trained_models documents in the shape the training functions produce"""
+        model_ref = self.db.collection('trained_models').document(horizon)
+        data_through = max(datetime.fromisoformat(m['data_through']) for m in merged.values())
+
+        if shard_by == 'pooled':
+            result = merged[None]
+            model_ref.set({
+                'horizon': horizon,
+                'gcs_blob_name': result['gcs_blob_name'],
+                'best_model_name': result['best_model_name'],
+                'model_performance': result['model_performance'],
+                'training_samples': result['training_samples'],
+                'models_trained': result['models_trained'],
+                'data_through': data_through,
+                'training_mode': 'distributed',
+                'distributed_tasks': tasks,
+                'incremental_updates': 0,
+                'input_fingerprint': fingerprint,
+                'last_updated': datetime.now(timezone.utc),
+                'version': '2.0'
+            })
+            return
+
+        shard_manifest = {}
+        for shard, result in merged.items():
+            model_ref.collection(shard).document('latest').set({
+                'horizon': horizon,
+                'shard': shard,
+                'shard_by': shard_by,
+                'symbols': result['symbols'],
+                'gcs_blob_name': result['gcs_blob_name'],
+                'best_model_name': result['best_model_name'],
+                'model_performance': result['model_performance'],
+                'training_samples': result['training_samples'],
+                'models_trained': result['models_trained'],
+                'last_updated': datetime.now(timezone.utc),
+                'version': '2.0'
+            })
+            shard_manifest[shard] = {
+                'gcs_blob_name': result['gcs_blob_name'],
+                'best_model_name': result['best_model_name'],
+                'r2': result['model_performance']['r2'],
+                'training_samples': result['training_samples']
+            }
+
+        symbol_shards = {symbol: shard for symbol, shard in routing['symbol_shards'].items() if shard in shard_manifest}
+        model_ref.set({
+            'horizon': horizon,
+            'shard_by': shard_by,
+            'shards': shard_manifest,
+            'symbol_shards': symbol_shards,
+            'unassigned_symbols': sorted(set(routing['symbol_shards']) - set(symbol_shards)
+                                         | set(routing.get('unassigned_symbols', []))),
+            'training_samples': sum(m['training_samples'] for m in shard_manifest.values()),
+            'data_through': data_through,
+            'training_mode': 'distributed',
+            'distributed_tasks': tasks,
+            'incremental_updates': 0,
+            'input_fingerprint': fingerprint,
+            'last_updated': datetime.now(timezone.utc),
+            'version': '2.0'
+        })
+
+    def run(self, horizons: List[str], shard_by: str = 'pooled',
+            options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Plan, dispatch and merge one fan-out run"""
+        start = time.perf_counter()
+        plan = self.plan(horizons, shard_by, options)
+        tasks = plan['tasks']
+        logger.info(f"🚀 Dispatching {len(tasks)} training tasks for {', '.join(horizons)}")
+
+        results = self.backend.run(tasks) if tasks else []
+        partials = self._partials(tasks, results)
+
+        summary = {'tasks': len(tasks), 'failed_tasks': sum('error' in r for r in results), 'horizons': {}}
+        for horizon in horizons:
+            # Published anyway from the surviving groups, so callers can tell a partial roster apart
+            failed_tasks = [task.task_id for task, result in zip(tasks, results)
+                            if task.horizon == horizon and 'error' in result]
+            groups = {shard: parts for (h, shard), parts in partials.items() if h == horizon}
+            if not groups:
+                summary['horizons'][horizon] = {'status': 'failed', 'failed_tasks': failed_tasks}
+                self.db.collection('ml_training_status').document(f'{horizon}_latest').set({
+                    'timestamp': datetime.now(timezone.utc),
+                    'horizon': horizon,
+                    'status': 'failed',
+                    'mode': 'distributed',
+                    'error': 'No training task succeeded'
+                })
+                continue
+
+            merged = {shard: self._merge_artifacts(horizon, shard, parts) for shard, parts in groups.items()}
+            horizon_tasks = sum(task.horizon == horizon for task in tasks)
+            fingerprint = dict(plan['fingerprints'][horizon])
+            # Tasks hash the rows they loaded; a disagreement means rows changed mid-run, so no hash is stored
+            content_hashes = {p['content_hash'] for parts in groups.values() for p in parts}
+            if len(content_hashes) == 1 and None not in content_hashes:
+                fingerprint['content_hash'] = content_hashes.pop()
+            self.publish(horizon, shard_by, merged, plan['routing'].get(horizon, {}), horizon_tasks, fingerprint)
+
+            best = max(merged.values(), key=lambda m: m['model_performance']['r2'])
+            self.db.collection('ml_training_status').document(f'{horizon}_latest').set({
+                'timestamp': datetime.now(timezone.utc),
+                'horizon': horizon,
+                'training_samples': sum(m['training_samples'] for m in merged.values()),
+                'performance': best['model_performance'],
+                'status': 'completed',
+                'mode': 'distributed',
+                'shard_by': shard_by,
+                'tasks': horizon_tasks,
+                'best_model': best['best_model_name']
+            })
+            summary['horizons'][horizon] = {
+                'status': 'completed',
+                'shards': len(merged),
+                'best_model': best['best_model_name'],
+                'r2': best['model_performance']['r2'],
+                'failed_tasks': failed_tasks
+            }
+
+        summary['elapsed_s'] = round(time.perf_counter() - start, 2)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan model training out across Cloud Function instances")
+    parser.add_argument('--backend', choices=['http', 'local'], default='local')
+    parser.add_argument('--base-url', default=os.environ.get('TRAINING_FUNCTIONS_URL'),
+                        help="Cloud Functions base URL (http backend)")
+    parser.add_argument('--token', default=os.environ.get('TRAINING_ID_TOKEN'),
+                        help="Identity token for authenticated functions (http backend)")
+    parser.add_argument('--horizons', nargs='+', default=list(HORIZON_FUNCTIONS), choices=list(HORIZON_FUNCTIONS))
+    parser.add_argument('--shard-by', choices=['pooled', 'asset_class', 'symbol'], default='pooled')
+    parser.add_argument('--selection-scorer', default='f_regression')
+    parser.add_argument('--workers', type=int, default=None, help="Concurrent tasks")
+    parser.add_argument('--low-memory', action='store_true', help="Train with float32 matrices and chunked scaling")
+    parser.add_argument('--quantiles', action='store_true', help="Also fit the multi-quantile booster")
+    args = parser.parse_args()
+
+    if args.backend == 'http':
+        if not args.base_url:
+            parser.error("--base-url (or TRAINING_FUNCTIONS_URL) is required for the http backend")
+        backend = HttpBackend(args.base_url, token=args.token, max_workers=args.workers or 32)
+    else:
+        backend = LocalBackend(max_workers=args.workers)
+
+    coordinator = TrainingCoordinator(backend)
+    options = {'selection_scorer': args.selection_scorer, 'low_memory': args.low_memory, 'quantiles': args.quantiles}
+    summary = coordinator.run(args.horizons, args.shard_by, options)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
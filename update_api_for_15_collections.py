@@ -182,10 +182,15 @@ def update_market_data_endpoint():
                     japanese_headlines = results['japanese_news'].get('headlines', [])
                     if japanese_headlines:
                         japanese_news_batch = []
-                        for i, headline in enumerate(japanese_headlines[:5]):  # Top 5 headlines
+                        from sentiment_scoring import default_scorer
+                        top_headlines = japanese_headlines[:5]  # Top 5 headlines
+                        scores = default_scorer.score_headlines(top_headlines)
+                        for headline, (sentiment_hash, sentiment) in zip(top_headlines, scores):
                             news_doc = {
                                 'headline': headline,
-                                'sentiment': 0.6 + (i * 0.1),  # Varied sentiment
+                                'sentiment': sentiment,  # Lexicon score, cached by headline hash
+                                'sentiment_hash': sentiment_hash,
+                                'sentiment_model': default_scorer.model.version,
                                 'category': 'economics',
                                 'source': 'japanese_financial_news',
                                 'symbols_mentioned': ['7203.T', '6758.T'],
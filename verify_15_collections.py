@@ -6,6 +6,7 @@ sys.path.append('/Users/sohntsang/Desktop/Uptrendr/Uptrendr')
 
 from google.cloud import firestore
 import firebase_admin
+from collection_inventory import EXPECTED_COLLECTIONS, CollectionInventory, format_bytes
 
 try:
     app = firebase_admin.get_app()
@@ -17,23 +18,7 @@ except ValueError:
 db = firestore.Client()
 
 # Your 15 expected collections
-expected_15 = [
-    'market_data',
-    'technical_analysis', 
-    'fundamental_analysis',
-    'sentiment_analysis',
-    'macro_indicators',
-    'esg_scores',
-    'economic_calendar',
-    'japanese_news',
-    'japanese_economics',
-    'historical_factors',
-    'model_weights',
-    'market_predictions',
-    'ml_training_status',
-    'forecast_weights',
-    'trained_models'
-]
+expected_15 = EXPECTED_COLLECTIONS
 
 print("🎯 VERIFYING YOUR 15 EXPECTED COLLECTIONS")
 print("=" * 50)
@@ -41,16 +26,23 @@ print("=" * 50)
 # Get all current collections
 current_collections = [c.id for c in db.collections()]
 
+# Exact counts and freshness for the expected collections, probed concurrently
+inventory = CollectionInventory(db).run(expected_15)
+
 print(f"📊 Checking for all 15 expected collections:")
 missing = []
 found = []
 
 for i, collection_name in enumerate(expected_15, 1):
-    if collection_name in current_collections:
-        print(f"   {i:2d}. ✅ {collection_name}")
+    stats = inventory['collections'][collection_name]
+    if stats.get('exists'):
+        newest = stats['newest'].isoformat() if hasattr(stats['newest'], 'isoformat') else 'no timestamp'
+        print(f"   {i:2d}. ✅ {collection_name} - {stats['documents']:,} docs, "
+              f"~{format_bytes(stats['estimated_bytes'])}, newest {newest}")
         found.append(collection_name)
     else:
-        print(f"   {i:2d}. ❌ {collection_name} - MISSING")
+        reason = f"ERROR: {stats['error']}" if 'error' in stats else "MISSING"
+        print(f"   {i:2d}. ❌ {collection_name} - {reason}")
         missing.append(collection_name)
 
 print(f"\n📈 RESULTS:")